@@ -0,0 +1,461 @@
+import redis
+import redis.asyncio as aioredis
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import os
+from dotenv import load_dotenv
+
+from models import ChatMessage, ChatSession
+from message_codec import get_codec
+from redis_client import (
+    RedisClient, SESSION_INDEX_KEY, SESSION_INDEX_BUILT_KEY, GLOBAL_STATS_KEY, EXPIRY_SWEEP_BATCH,
+    SEARCH_INDEX_BUILT_KEY, INDEX_BUILT_KEY, search_postings_key, index_entries_key
+)
+from search_index import query_terms
+from secondary_index import facet_filters, time_bounds
+from session_stats import counter_fields, stats_from_counters, overview_from_counters
+
+# Load environment variables
+load_dotenv()
+
+
+class AsyncRedisClient(RedisClient):
+    """Asyncio Redis client with a shared connection pool
+    
+    Mirrors the RedisClient API with awaitable methods so FastAPI handlers never
+    block the event loop on a Redis round-trip. Key layout, serialization and
+    pipeline construction are inherited from RedisClient.
+    """
+    
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, db: Optional[int] = None):
+        """Initialize the asyncio connection pool (REDIS_HOST/REDIS_PORT/REDIS_DB unless given)"""
+        self.pool = aioredis.BlockingConnectionPool(
+            host=host or os.getenv('REDIS_HOST', 'localhost'),
+            port=port or int(os.getenv('REDIS_PORT', 6379)),
+            db=int(os.getenv('REDIS_DB', 0)) if db is None else db,
+            max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+            timeout=float(os.getenv('REDIS_POOL_TIMEOUT', 5)),
+            decode_responses=True
+        )
+        self.redis_client = aioredis.Redis(connection_pool=self.pool)
+        self.codec = get_codec()
+        self.session_ttl = int(float(os.getenv('SESSION_TTL_SECONDS', 0)))
+        self._session_index_checked = False
+        self._search_index_checked = False
+        self._message_index_checked = False
+        self.invalidation_channel = None
+        self.invalidation_origin = ''
+    
+    async def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a chat message in one MULTI/EXEC round-trip and return the session's created/updated timestamps"""
+        try:
+            now = datetime.now()
+            pipe = self.redis_client.pipeline(transaction=True)
+            self._queue_store_message(pipe, message, now)
+            results = await pipe.execute()
+            return self._store_result(results, now)
+        except Exception as e:
+            print(f"Error storing message: {e}")
+            return None
+    
+    async def _new_messages(self, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """Messages of a batch that are not stored yet, in one pipelined round-trip"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        candidates, checked = self._queue_exists_checks(pipe, messages)
+        replies = await pipe.execute() if checked else []
+        return self._unstored_messages(candidates, checked, replies)
+    
+    async def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch of messages in one MULTI/EXEC round-trip and return how many were stored (known ids skipped)"""
+        try:
+            messages = await self._new_messages(messages)
+            if not messages:
+                return 0
+            
+            now = datetime.now()
+            pipe = self.redis_client.pipeline(transaction=True)
+            for message in messages:
+                self._queue_store_message(pipe, message, now)
+            await pipe.execute()
+            return len(messages)
+        except Exception as e:
+            print(f"Error storing messages: {e}")
+            return None
+
+    async def _fetch_messages(self, session_id: str, message_ids: List[str]) -> List[ChatMessage]:
+        """Fetch message payloads for the given ids in a single pipelined round-trip"""
+        if not message_ids:
+            return []
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_fetch_messages(pipe, session_id, message_ids)
+        return self._decode_fetched(await pipe.execute())
+    
+    async def _window_message_ids(self, session_id: str, offset: int, limit: Optional[int],
+                                  since_message_id: Optional[str], since_ts: Optional[datetime]) -> Optional[List[str]]:
+        """Resolve a window to chronological message ids in at most two round-trips (None: unknown cursor)"""
+        session_key = f"session:{session_id}"
+        
+        if since_message_id:
+            position = await self.redis_client.lpos(session_key, since_message_id)
+            if position is not None:
+                if position == 0:
+                    return []
+                start, end = self._after_position_bounds(position, limit)
+                message_ids = await self.redis_client.lrange(session_key, start, end)
+                message_ids.reverse()
+                return message_ids
+            if since_ts is None:
+                return None
+        
+        if since_ts is not None:
+            return await self.redis_client.zrangebyscore(
+                f"session_times:{session_id}", f"({since_ts.timestamp()}", "+inf",
+                start=0 if limit is not None else None, num=limit
+            )
+        
+        start, end = self._window_bounds(offset, limit)
+        message_ids = await self.redis_client.lrange(session_key, start, end)
+        message_ids.reverse()
+        return message_ids
+    
+    async def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                                   since_message_id: Optional[str] = None,
+                                   since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages in chronological order, optionally windowed (None: unknown cursor)"""
+        try:
+            if limit is not None and limit <= 0:
+                return []
+            message_ids = await self._window_message_ids(session_id, offset, limit, since_message_id, since_ts)
+            if message_ids is None:
+                return None
+            return await self._fetch_messages(session_id, message_ids)
+        except Exception as e:
+            print(f"Error retrieving session messages: {e}")
+            return []
+    
+    async def get_session(self, session_id: str) -> Optional[ChatSession]:
+        """Retrieve a complete chat session"""
+        try:
+            messages = await self.get_session_messages(session_id)
+            if not messages:
+                return None
+            
+            metadata = await self.redis_client.hgetall(f"session_metadata:{session_id}")
+            return self._build_session(session_id, messages, metadata)
+        except Exception as e:
+            print(f"Error retrieving session: {e}")
+            return None
+    
+    async def rebuild_session_index(self) -> int:
+        """Rebuild the session index from session metadata using SCAN (for pre-index data)"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            session_ids = []
+            async for key in self.redis_client.scan_iter(match="session_metadata:*", count=1000):
+                session_ids.append(key.split(':', 1)[1])
+                pipe.hget(key, 'updated_at')
+            
+            scores = self._index_scores(session_ids, await pipe.execute())
+            if scores:
+                await self.redis_client.zadd(SESSION_INDEX_KEY, scores)
+            await self.redis_client.set(SESSION_INDEX_BUILT_KEY, datetime.now().isoformat())
+            return len(scores)
+        except Exception as e:
+            print(f"Error rebuilding session index: {e}")
+            return 0
+    
+    async def expire_sessions(self) -> int:
+        """Remove up to EXPIRY_SWEEP_BATCH sessions idle for longer than the TTL"""
+        if not self.session_ttl:
+            return 0
+        session_ids = await self.redis_client.zrangebyscore(
+            SESSION_INDEX_KEY, "-inf", self._expiry_cutoff(), start=0, num=EXPIRY_SWEEP_BATCH
+        )
+        for session_id in session_ids:
+            await self.delete_session(session_id)
+        return len(session_ids)
+    
+    async def _prepare_session_index(self):
+        """Sweep expired sessions and backfill the index once per process"""
+        await self.expire_sessions()
+        if not self._session_index_checked:
+            if not await self.redis_client.exists(SESSION_INDEX_BUILT_KEY):
+                await self.rebuild_session_index()
+            self._session_index_checked = True
+    
+    async def list_sessions(self, cursor: int = 0, limit: Optional[int] = None, order: str = "desc") -> List[str]:
+        """List session IDs by last update (newest first by default), starting at rank `cursor`"""
+        try:
+            await self._prepare_session_index()
+            end = -1 if limit is None else cursor + limit - 1
+            if order == "asc":
+                return await self.redis_client.zrange(SESSION_INDEX_KEY, cursor, end)
+            return await self.redis_client.zrevrange(SESSION_INDEX_KEY, cursor, end)
+        except Exception as e:
+            print(f"Error listing sessions: {e}")
+            return []
+    
+    async def list_sessions_scored(self, cursor: int = 0, limit: Optional[int] = None,
+                                   order: str = "desc") -> List[Tuple[str, float]]:
+        """Like list_sessions, with each session's updated_at epoch (for merging across shards)"""
+        try:
+            await self._prepare_session_index()
+            end = -1 if limit is None else cursor + limit - 1
+            if order == "asc":
+                return await self.redis_client.zrange(SESSION_INDEX_KEY, cursor, end, withscores=True)
+            return await self.redis_client.zrevrange(SESSION_INDEX_KEY, cursor, end, withscores=True)
+        except Exception as e:
+            print(f"Error listing sessions: {e}")
+            return []
+    
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session and all its messages"""
+        try:
+            session_key = f"session:{session_id}"
+            metadata_key = f"session_metadata:{session_id}"
+            
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        await pipe.watch(session_key, metadata_key)
+                        message_ids = await pipe.lrange(session_key, 0, -1)
+                        counters = await pipe.hgetall(metadata_key)
+                        postings = await pipe.smembers(search_postings_key(session_id))
+                        entries = await pipe.smembers(index_entries_key(session_id))
+                        
+                        pipe.multi()
+                        self._queue_delete_session(pipe, session_id, message_ids, counters, postings, entries)
+                        await pipe.execute()
+                        break
+                    except redis.WatchError:
+                        continue
+            
+            return True
+        except Exception as e:
+            print(f"Error deleting session: {e}")
+            return False
+    
+    async def get_session_stats(self, session_id: str) -> Dict[str, Any]:
+        """Get statistics for a session from its write-time counters"""
+        try:
+            metadata_key = f"session_metadata:{session_id}"
+            counters = await self.redis_client.hgetall(metadata_key)
+            if counters and 'total_messages' not in counters:
+                counters = self._backfill_session_stats(await self.get_session_messages(session_id))
+                if counters:
+                    await self.redis_client.hset(metadata_key, mapping=counters)
+            
+            return stats_from_counters(session_id, counters)
+        except Exception as e:
+            print(f"Error getting session stats: {e}")
+            return {}
+    
+    async def rebuild_global_stats(self) -> Dict[str, float]:
+        """Recompute the global rollup from per-session counters (one-time migration)"""
+        totals: Dict[str, float] = {}
+        for session_id in await self.list_sessions():
+            await self.get_session_stats(session_id)
+            counters = await self.redis_client.hgetall(f"session_metadata:{session_id}")
+            for field, value in counter_fields(counters).items():
+                totals[field] = totals.get(field, 0) + value
+        
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(GLOBAL_STATS_KEY)
+        pipe.hset(GLOBAL_STATS_KEY, mapping={**totals, 'built_at': datetime.now().isoformat()})
+        await pipe.execute()
+        return totals
+    
+    async def overview_counters(self) -> Tuple[int, Dict[str, Any]]:
+        """Session count and global rollup counters, rebuilding the rollup if it was never built"""
+        await self.expire_sessions()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zcard(SESSION_INDEX_KEY)
+        pipe.hgetall(GLOBAL_STATS_KEY)
+        total_sessions, counters = await pipe.execute()
+        
+        if 'built_at' not in counters:
+            counters = await self.rebuild_global_stats()
+            total_sessions = await self.redis_client.zcard(SESSION_INDEX_KEY)
+        return total_sessions, counters
+    
+    async def get_overview_stats(self) -> Dict[str, Any]:
+        """Get overview statistics for all sessions from the global rollup counters"""
+        try:
+            return overview_from_counters(*await self.overview_counters())
+        except Exception as e:
+            print(f"Error getting overview stats: {e}")
+            return {}
+    
+    async def _reindex_session(self, session_id: str) -> int:
+        """Replace a session's postings with freshly computed ones; return the messages indexed"""
+        metadata_key = f"session_metadata:{session_id}"
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(metadata_key)
+                    counters = await pipe.hgetall(metadata_key)
+                    postings = await pipe.smembers(search_postings_key(session_id))
+                    messages = await self.get_session_messages(session_id)
+                    
+                    pipe.multi()
+                    self._queue_search_removal(pipe, session_id, postings, counters)
+                    pipe.hdel(metadata_key, 'search_docs', 'search_tokens')
+                    for message in messages:
+                        self._queue_search_index(pipe, message)
+                    await pipe.execute()
+                    return len(messages)
+                except redis.WatchError:
+                    continue
+    
+    async def rebuild_search_index(self) -> int:
+        """Re-index every session's messages (for data stored before search existed)"""
+        try:
+            total = 0
+            for session_id in await self.list_sessions():
+                total += await self._reindex_session(session_id)
+            await self.redis_client.set(SEARCH_INDEX_BUILT_KEY, datetime.now().isoformat())
+            return total
+        except Exception as e:
+            print(f"Error rebuilding search index: {e}")
+            return 0
+    
+    async def _prepare_search_index(self):
+        """Backfill the search index once, the first time this deployment is searched"""
+        if not self._search_index_checked:
+            if not await self.redis_client.exists(SEARCH_INDEX_BUILT_KEY):
+                await self.rebuild_search_index()
+            self._search_index_checked = True
+    
+    async def search_messages(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Messages matching a full-text query, ranked by BM25 over a bounded candidate set (see RedisClient)"""
+        try:
+            terms = query_terms(query)
+            if not terms or limit <= 0:
+                return {'total': 0, 'results': []}
+            await self._prepare_search_index()
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_search_candidates(pipe, terms)
+            idfs, avg_length, candidates = self._search_candidates(terms, await pipe.execute())
+            if not candidates:
+                return {'total': 0, 'results': []}
+            
+            if len(idfs) > 1:
+                members = list(candidates)
+                pipe = self.redis_client.pipeline(transaction=False)
+                self._queue_candidate_scores(pipe, idfs, members)
+                self._note_candidate_scores(idfs, candidates, members, await pipe.execute())
+            total = len(candidates)
+            hits = self._rank_candidates(idfs, avg_length, candidates, offset, limit)
+            if not hits:
+                return {'total': total, 'results': []}
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_fetch_hits(pipe, hits)
+            return self._search_results(total, hits, self._decode_hits(await pipe.execute()))
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    async def _reindex_session_facets(self, session_id: str) -> int:
+        """Replace a session's secondary index entries with fresh ones; return the messages indexed"""
+        metadata_key = f"session_metadata:{session_id}"
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(metadata_key)
+                    entries = await pipe.smembers(index_entries_key(session_id))
+                    messages = await self.get_session_messages(session_id)
+                    
+                    pipe.multi()
+                    self._queue_index_removal(pipe, session_id, entries)
+                    for message in messages:
+                        self._queue_message_index(pipe, message)
+                    await pipe.execute()
+                    return len(messages)
+                except redis.WatchError:
+                    continue
+    
+    async def rebuild_message_index(self) -> int:
+        """Re-index every session's messages by bucket, topic and sentiment (for data stored before the indexes)"""
+        try:
+            total = 0
+            for session_id in await self.list_sessions():
+                total += await self._reindex_session_facets(session_id)
+            await self.redis_client.set(INDEX_BUILT_KEY, datetime.now().isoformat())
+            return total
+        except Exception as e:
+            print(f"Error rebuilding message index: {e}")
+            return 0
+    
+    async def _prepare_message_index(self):
+        """Backfill the secondary indexes once, the first time this deployment queries them"""
+        if not self._message_index_checked:
+            if not await self.redis_client.exists(INDEX_BUILT_KEY):
+                await self.rebuild_message_index()
+            self._message_index_checked = True
+    
+    async def query_messages(self, topic: Optional[str] = None, sentiment: Optional[str] = None,
+                             since: Optional[datetime] = None, until: Optional[datetime] = None,
+                             offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """Messages matching a topic and/or sentiment within [since, until], newest first, with the total"""
+        try:
+            if limit <= 0:
+                return {'total': 0, 'results': []}
+            await self._prepare_message_index()
+            facets = facet_filters(topic, sentiment)
+            low, high = time_bounds(since, until)
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_query_buckets(pipe, low, high)
+            buckets = (await pipe.execute())[0]
+            if not buckets:
+                return {'total': 0, 'results': []}
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            keys, temporary = self._queue_query_counts(pipe, buckets, facets, low, high)
+            counts = (await pipe.execute())[-len(keys):]
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            queued = self._queue_query_page(pipe, keys, counts, low, high, offset, limit)
+            if temporary:
+                pipe.delete(*temporary)
+            hits = self._query_hits((await pipe.execute())[:queued])
+            if not hits:
+                return {'total': sum(counts), 'results': []}
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_fetch_hits(pipe, hits)
+            return self._query_results(sum(counts), hits, self._decode_hits(await pipe.execute()))
+        except Exception as e:
+            print(f"Error querying messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    async def memory_usage(self) -> Dict[str, Any]:
+        """Redis memory accounting and retention settings, for sizing"""
+        try:
+            sessions = await self.redis_client.zcard(SESSION_INDEX_KEY)
+            keys = await self.redis_client.dbsize()
+            try:
+                info = await self.redis_client.info('memory')
+            except redis.ResponseError:
+                info = {}
+            return self._memory_report(sessions, keys, info)
+        except Exception as e:
+            print(f"Error getting memory usage: {e}")
+            return {}
+    
+    async def health_check(self) -> bool:
+        """Check Redis connection health"""
+        try:
+            await self.redis_client.ping()
+            return True
+        except Exception as e:
+            print(f"Redis health check failed: {e}")
+            return False
+    
+    async def close(self):
+        """Release all pooled connections"""
+        await self.redis_client.close()
+        await self.pool.disconnect()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Message codec micro-benchmark for Chat Summarizer
+Compares payload size and (de)serialization speed of the legacy JSON path,
+the JSON codec and the binary codec over a realistic chat corpus
+
+Usage:
+    python benchmark_codec.py
+    python benchmark_codec.py --messages 50000 --redis   # also report Redis MEMORY USAGE
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from models import ChatMessage, Role, Sentiment, TopicCategory
+from message_codec import CODECS, decode_message
+
+USER_LINES = [
+    "Hi, my order #{n} still hasn't arrived and it's been two weeks.",
+    "Can you tell me whether the premium plan includes priority support?",
+    "thanks!",
+    "ok",
+    "I was charged twice for the same subscription this month, please refund one of them.",
+    "The app keeps crashing when I open the settings page on Android 14.",
+    "I'd like to buy three more licenses for my team. What's the price?",
+    "Great service, the issue was fixed in minutes 🙌",
+    "Wo ist meine Rechnung? Ich brauche sie für die Buchhaltung.",
+]
+ASSISTANT_LINES = [
+    "Hello! I'm sorry to hear that. Could you share your order number so I can check the shipment status?",
+    "Yes, the premium plan includes 24/7 priority support with a dedicated account manager.",
+    "You're welcome! Is there anything else I can help you with today?",
+    "I've issued a refund for the duplicate charge; it should appear in 3-5 business days.",
+    "Thanks for reporting this. Could you try clearing the app cache and let me know if the crash persists?",
+]
+
+
+def build_corpus(size: int, seed: int = 7) -> List[ChatMessage]:
+    """Generate a realistic mix of user/assistant messages with analysis results"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 9, 0, 0)
+    corpus = []
+    for i in range(size):
+        is_user = i % 2 == 0
+        line = rng.choice(USER_LINES if is_user else ASSISTANT_LINES).format(n=rng.randint(10000, 99999))
+        sentiment = rng.choice(list(Sentiment))
+        corpus.append(ChatMessage(
+            session_id=f"session_{1700000000000 + i // 20}",
+            role=Role.USER if is_user else Role.ASSISTANT,
+            content=line,
+            timestamp=start + timedelta(seconds=i * 7, microseconds=rng.randint(0, 999999)),
+            message_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            sentiment=sentiment,
+            sentiment_score=round(rng.uniform(-1, 1), 4),
+            topic=rng.choice(list(TopicCategory))
+        ))
+    return corpus
+
+
+def legacy_encode(message: ChatMessage) -> str:
+    """Previous _serialize_message (no sentiment_score)"""
+    return json.dumps({
+        'session_id': message.session_id,
+        'role': message.role.value,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+        'message_id': message.message_id,
+        'sentiment': message.sentiment.value if message.sentiment else None,
+        'topic': message.topic.value if message.topic else None
+    })
+
+
+def legacy_decode(message_data: str) -> ChatMessage:
+    """Previous _deserialize_message, including pydantic validation"""
+    data = json.loads(message_data)
+    return ChatMessage(
+        session_id=data['session_id'],
+        role=Role(data['role']),
+        content=data['content'],
+        timestamp=datetime.fromisoformat(data['timestamp']),
+        message_id=data['message_id'],
+        sentiment=data['sentiment'],
+        topic=data['topic']
+    )
+
+
+def best_of(repeat: int, func: Callable[[], object]) -> float:
+    """Best wall-clock time in seconds over `repeat` runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def redis_memory_usage(encode: Callable[[ChatMessage], object], corpus: List[ChatMessage]) -> float:
+    """Average Redis MEMORY USAGE (bytes) per message key for an encoding"""
+    from redis_client import RedisClient
+    client = RedisClient().redis_client
+    prefix = f"codec_bench:{uuid.uuid4().hex[:8]}"
+    pipe = client.pipeline(transaction=False)
+    for i, message in enumerate(corpus):
+        pipe.set(f"{prefix}:{i}", encode(message))
+    pipe.execute()
+    
+    pipe = client.pipeline(transaction=False)
+    for i in range(len(corpus)):
+        pipe.memory_usage(f"{prefix}:{i}")
+    usage = pipe.execute()
+    
+    client.delete(*[f"{prefix}:{i}" for i in range(len(corpus))])
+    return sum(usage) / len(corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark message codecs")
+    parser.add_argument('--messages', type=int, default=20000, help="Corpus size")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed repetitions")
+    parser.add_argument('--redis', action='store_true', help="Also measure Redis MEMORY USAGE per key")
+    args = parser.parse_args()
+    
+    corpus = build_corpus(args.messages)
+    variants = [("legacy json", legacy_encode, legacy_decode)]
+    variants += [(name, codec.encode, decode_message) for name, codec in CODECS.items()]
+    
+    print(f"Corpus: {len(corpus)} messages")
+    header = f"{'codec':>12} {'bytes/msg':>10} {'enc us/msg':>11} {'dec us/msg':>11}"
+    if args.redis:
+        header += f" {'redis B/key':>12}"
+    print(header)
+    
+    for name, encode, decode in variants:
+        payloads = [encode(message) for message in corpus]
+        decoded = [decode(payload) for payload in payloads]
+        assert [m.content for m in decoded] == [m.content for m in corpus], f"{name} round-trip mismatch"
+        assert [m.timestamp for m in decoded] == [m.timestamp for m in corpus], f"{name} timestamp mismatch"
+        
+        size = sum(len(p) for p in payloads) / len(payloads)
+        encode_s = best_of(args.repeat, lambda: [encode(m) for m in corpus])
+        decode_s = best_of(args.repeat, lambda: [decode(p) for p in payloads])
+        
+        row = f"{name:>12} {size:>10.1f} {encode_s * 1e6 / len(corpus):>11.2f} {decode_s * 1e6 / len(corpus):>11.2f}"
+        if args.redis:
+            row += f" {redis_memory_usage(encode, corpus):>12.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
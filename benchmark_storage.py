@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark for Chat Summarizer
+Measures Redis round-trips and latency of session reads and message writes,
+and request throughput of the sync vs asyncio clients under concurrency
+
+Usage:
+    python benchmark_storage.py                 # against REDIS_HOST/REDIS_PORT
+    python benchmark_storage.py --fake          # against fakeredis (no server needed)
+    python benchmark_storage.py --sizes 10 100 2000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, List
+
+import redis
+from redis.client import NEVER_DECODE
+
+from models import ChatMessage, Role
+from redis_client import RedisClient
+from async_redis_client import AsyncRedisClient
+
+
+class RoundTripCounter:
+    """Counts network round-trips issued through a redis client"""
+
+    def __init__(self, client: redis.Redis):
+        self.count = 0
+        self._client = client
+        self._execute_command = client.execute_command
+        self._pipeline_execute = redis.client.Pipeline.execute
+
+    def __enter__(self):
+        counter = self
+
+        def execute_command(*args, **options):
+            counter.count += 1
+            return counter._execute_command(*args, **options)
+
+        def pipeline_execute(pipe, *args, **kwargs):
+            counter.count += 1
+            return counter._pipeline_execute(pipe, *args, **kwargs)
+
+        self._client.execute_command = execute_command
+        redis.client.Pipeline.execute = pipeline_execute
+        return self
+
+    def __exit__(self, *exc):
+        self._client.execute_command = self._execute_command
+        redis.client.Pipeline.execute = self._pipeline_execute
+        return False
+
+
+def legacy_get_session_messages(client: RedisClient, session_id: str) -> List[ChatMessage]:
+    """Previous read path: one LRANGE plus one GET per message, sorted in Python"""
+    message_ids = client.redis_client.lrange(f"session:{session_id}", 0, -1)
+    messages = []
+    for msg_id in message_ids:
+        message_data = client.redis_client.execute_command(
+            'GET', f"message:{session_id}:{msg_id}", **{NEVER_DECODE: []}
+        )
+        if message_data:
+            messages.append(client._deserialize_message(message_data))
+    messages.sort(key=lambda x: x.timestamp)
+    return messages
+
+
+def legacy_store_message(client: RedisClient, message: ChatMessage) -> bool:
+    """Previous write path: SET, LPUSH, EXISTS and two HSETs as separate round-trips"""
+    message.message_id = message.message_id or str(uuid.uuid4())
+    client.redis_client.set(f"message:{message.session_id}:{message.message_id}",
+                            client._serialize_message(message))
+    client.redis_client.lpush(f"session:{message.session_id}", message.message_id)
+    metadata_key = f"session_metadata:{message.session_id}"
+    now = datetime.now().isoformat()
+    if not client.redis_client.exists(metadata_key):
+        client.redis_client.hset(metadata_key, 'created_at', now)
+    client.redis_client.hset(metadata_key, 'updated_at', now)
+    return True
+
+
+def make_message(session_id: str, i: int) -> ChatMessage:
+    """Build a benchmark message"""
+    return ChatMessage(
+        session_id=session_id,
+        role=Role.USER if i % 2 == 0 else Role.ASSISTANT,
+        content=f"Benchmark message {i} about an order that has not arrived yet."
+    )
+
+
+def populate_session(client: RedisClient, size: int) -> str:
+    """Create a session with the given number of messages"""
+    session_id = f"bench_{uuid.uuid4().hex[:12]}"
+    for i in range(size):
+        client.store_message(make_message(session_id, i))
+    return session_id
+
+
+def measure(client: RedisClient, read: Callable[[], List[ChatMessage]], repeat: int):
+    """Return (round_trips, best_latency_ms, message_count) for a read function"""
+    with RoundTripCounter(client.redis_client) as counter:
+        messages = read()
+    round_trips = counter.count
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round_trips, min(timings), len(messages)
+
+
+def run_read_benchmark(client: RedisClient, sizes: List[int], repeat: int):
+    """Compare the legacy and bulk session read paths"""
+    print("Session read: round-trips and best-of latency")
+    print(f"{'messages':>10} {'legacy rt':>10} {'legacy ms':>10} {'bulk rt':>10} {'bulk ms':>10} {'speedup':>8}")
+
+    for size in sizes:
+        session_id = populate_session(client, size)
+        try:
+            legacy_rt, legacy_ms, legacy_count = measure(
+                client, lambda: legacy_get_session_messages(client, session_id), repeat
+            )
+            bulk_rt, bulk_ms, bulk_count = measure(
+                client, lambda: client.get_session_messages(session_id), repeat
+            )
+            assert legacy_count == bulk_count == size, "read paths disagree on message count"
+
+            speedup = legacy_ms / bulk_ms if bulk_ms else float('inf')
+            print(f"{size:>10} {legacy_rt:>10} {legacy_ms:>10.2f} {bulk_rt:>10} {bulk_ms:>10.2f} {speedup:>7.1f}x")
+        finally:
+            client.delete_session(session_id)
+
+
+def run_write_benchmark(client: RedisClient, count: int):
+    """Compare round-trips and latency per stored message"""
+    print(f"\nMessage write: round-trips and mean latency over {count} messages")
+    print(f"{'path':>10} {'rt/msg':>10} {'ms/msg':>10}")
+
+    for name, store in (("legacy", lambda m: legacy_store_message(client, m)),
+                        ("atomic", client.store_message)):
+        session_id = f"bench_{uuid.uuid4().hex[:12]}"
+        try:
+            with RoundTripCounter(client.redis_client) as counter:
+                store(make_message(session_id, 0))
+            start = time.perf_counter()
+            for i in range(1, count + 1):
+                store(make_message(session_id, i))
+            mean_ms = (time.perf_counter() - start) * 1000 / count
+            print(f"{name:>10} {counter.count:>10} {mean_ms:>10.3f}")
+        finally:
+            client.delete_session(session_id)
+
+
+async def _sync_request(client: RedisClient, session_id: str, i: int):
+    """One /chat/send + /chat/session worth of storage calls, blocking the loop"""
+    client.store_message(make_message(session_id, i))
+    client.get_session_messages(session_id)
+
+
+async def _async_request(client: AsyncRedisClient, session_id: str, i: int):
+    """One /chat/send + /chat/session worth of storage calls, awaited"""
+    await client.store_message(make_message(session_id, i))
+    await client.get_session_messages(session_id)
+
+
+async def _throughput(request, client, concurrency: int, total: int) -> float:
+    """Run `total` requests with `concurrency` in flight; return requests/second"""
+    semaphore = asyncio.Semaphore(concurrency)
+    session_ids = [f"bench_{uuid.uuid4().hex[:12]}" for _ in range(concurrency)]
+
+    async def worker(i: int):
+        async with semaphore:
+            await request(client, session_ids[i % concurrency], i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(total)])
+    elapsed = time.perf_counter() - start
+
+    for session_id in session_ids:
+        result = client.delete_session(session_id)
+        if asyncio.iscoroutine(result):
+            await result
+    return total / elapsed
+
+
+def run_concurrency_benchmark(sync_client: RedisClient, async_client: AsyncRedisClient,
+                              levels: List[int], total: int):
+    """Compare event-loop throughput of the sync and asyncio clients"""
+    print(f"\nConcurrent store+read: requests/second over {total} requests")
+    print(f"{'in flight':>10} {'sync':>10} {'async':>10}")
+
+    async def run():
+        for level in levels:
+            sync_rps = await _throughput(_sync_request, sync_client, level, total)
+            async_rps = await _throughput(_async_request, async_client, level, total)
+            print(f"{level:>10} {sync_rps:>10.0f} {async_rps:>10.0f}")
+        await async_client.close()
+
+    asyncio.run(run())
+
+
+def create_async_client(fake: bool) -> AsyncRedisClient:
+    """Create an AsyncRedisClient, optionally backed by fakeredis"""
+    client = AsyncRedisClient()
+    if fake:
+        import fakeredis
+        client.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return client
+
+
+def create_client(fake: bool) -> RedisClient:
+    """Create a RedisClient, optionally backed by fakeredis"""
+    client = RedisClient()
+    if fake:
+        import fakeredis
+        client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat storage")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500, 2000],
+                        help="Session sizes (messages) to benchmark")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed repetitions per size")
+    parser.add_argument('--writes', type=int, default=500, help="Messages stored by the write benchmark")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128],
+                        help="In-flight request levels for the concurrency benchmark")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per concurrency level")
+    parser.add_argument('--fake', action='store_true', help="Use fakeredis instead of a Redis server")
+    args = parser.parse_args()
+
+    client = create_client(args.fake)
+    if not client.health_check():
+        print("❌ Redis is not reachable. Start redis-server or pass --fake")
+        return
+
+    run_read_benchmark(client, args.sizes, args.repeat)
+    run_write_benchmark(client, args.writes)
+    run_concurrency_benchmark(client, create_async_client(args.fake), args.concurrency, args.requests)
+
+
+if __name__ == "__main__":
+    main()
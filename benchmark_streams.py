@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Redis layout comparison for Chat Summarizer
+Loads the same corpus through the list layout (RedisClient) and the Streams
+layout (StreamRedisClient) and compares Redis memory, key count and the
+latency of writes, full-session reads, tail windows and deletes
+
+Usage:
+    python benchmark_streams.py                          # against REDIS_HOST/REDIS_PORT
+    python benchmark_streams.py --sessions 500 --messages-per-session 200
+    python benchmark_streams.py --fake                   # fakeredis: latency and keys only
+"""
+
+import argparse
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import redis
+
+from benchmark_codec import build_corpus
+from models import ChatMessage
+from redis_client import RedisClient
+from redis_stream_client import StreamRedisClient
+
+
+def used_memory(client: redis.Redis) -> Optional[int]:
+    """Redis used_memory in bytes, or None where INFO is unavailable (fakeredis)"""
+    try:
+        return client.info('memory')['used_memory']
+    except redis.ResponseError:
+        return None
+
+
+def count_keys(client: redis.Redis, prefix: str) -> int:
+    """Number of data and metadata keys belonging to the benchmark's sessions"""
+    return sum(1 for _ in client.scan_iter(match=f"*{prefix}*", count=1000))
+
+
+def mean_us(func: Callable[[str], object], session_ids: List[str]) -> float:
+    """Mean latency in microseconds of func over every session"""
+    start = time.perf_counter()
+    for session_id in session_ids:
+        func(session_id)
+    return (time.perf_counter() - start) * 1e6 / len(session_ids)
+
+
+def run_layout(client: RedisClient, corpus: List[ChatMessage], tail: int) -> Dict[str, object]:
+    """Load the corpus through one layout, measure it and delete it again"""
+    prefix = f"bench{uuid.uuid4().hex[:8]}_"
+    before = used_memory(client.redis_client)
+    
+    start = time.perf_counter()
+    for message in corpus:
+        client.store_message(message.model_copy(update={'session_id': prefix + message.session_id}))
+    write_us = (time.perf_counter() - start) * 1e6 / len(corpus)
+    
+    after = used_memory(client.redis_client)
+    session_ids = sorted({prefix + message.session_id for message in corpus})
+    result = {
+        'keys': count_keys(client.redis_client, prefix),
+        'bytes/msg': (after - before) / len(corpus) if before is not None and after is not None else None,
+        'write us': write_us,
+        'full read us': mean_us(client.get_session_messages, session_ids),
+        f'tail {tail} us': mean_us(lambda sid: client.get_session_messages(sid, offset=-tail, limit=tail), session_ids),
+    }
+    result['delete us'] = mean_us(client.delete_session, session_ids)
+    return result
+
+
+def create_clients(fake: bool):
+    """Both layouts on one connection (fakeredis shares a single in-process server)"""
+    legacy = RedisClient()
+    streams = StreamRedisClient()
+    if fake:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        legacy.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        streams.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return legacy, streams
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the list and Streams Redis layouts")
+    parser.add_argument('--sessions', type=int, default=200, help="Number of sessions")
+    parser.add_argument('--messages-per-session', type=int, default=100, help="Messages per session")
+    parser.add_argument('--tail', type=int, default=50, help="Tail window size for the windowed read")
+    parser.add_argument('--fake', action='store_true', help="Use fakeredis instead of a Redis server")
+    args = parser.parse_args()
+    
+    legacy, streams = create_clients(args.fake)
+    if not legacy.health_check():
+        print("❌ Redis is not reachable. Start redis-server or pass --fake")
+        return
+    
+    # build_corpus puts 20 consecutive messages in a session; regroup to the requested size
+    corpus = build_corpus(args.sessions * args.messages_per_session)
+    for i, message in enumerate(corpus):
+        message.session_id = f"session_{i % args.sessions}"
+    
+    print(f"Corpus: {len(corpus)} messages in {args.sessions} sessions")
+    results = {"list": run_layout(legacy, corpus, args.tail), "streams": run_layout(streams, corpus, args.tail)}
+    
+    print(f"{'metric':>14} {'list':>12} {'streams':>12}")
+    for metric in results["list"]:
+        row = f"{metric:>14}"
+        for layout in ("list", "streams"):
+            value = results[layout][metric]
+            row += f" {'n/a':>12}" if value is None else f" {value:>12.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
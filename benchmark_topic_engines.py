@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Topic engine comparison on a labeled sample
+Measures accuracy, batch throughput and single-text latency of the zero-shot
+NLI engine (TopicClassifier) and the embedding-similarity engine
+(EmbeddingTopicClassifier) on hand-labeled chat messages
+
+Usage:
+    python benchmark_topic_engines.py
+    python benchmark_topic_engines.py --engines embedding --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from models import TopicCategory
+
+# Labeled chat messages (none of them are embedding prototypes)
+LABELED_SAMPLE: List[Tuple[str, TopicCategory]] = [
+    ("My package arrived damaged and the box was soaked.", TopicCategory.COMPLAINT),
+    ("This is the third time the delivery is late, I'm fed up.", TopicCategory.COMPLAINT),
+    ("You billed me for a plan I cancelled last month.", TopicCategory.COMPLAINT),
+    ("The support agent was rude and hung up on me.", TopicCategory.COMPLAINT),
+    ("Your latest update deleted all my saved drafts, awful.", TopicCategory.COMPLAINT),
+    ("Is there a student discount available?", TopicCategory.QUESTION),
+    ("Which countries do you ship to?", TopicCategory.QUESTION),
+    ("How long does a refund usually take to process?", TopicCategory.QUESTION),
+    ("Do you offer an API for exporting reports?", TopicCategory.QUESTION),
+    ("What's the difference between the basic and pro tiers?", TopicCategory.QUESTION),
+    ("I can't log in, it says my token expired. Can you help?", TopicCategory.SUPPORT_REQUEST),
+    ("The sync keeps failing with error 503, please look into it.", TopicCategory.SUPPORT_REQUEST),
+    ("Please help me migrate my data to the new workspace.", TopicCategory.SUPPORT_REQUEST),
+    ("My two-factor codes stopped arriving, I'm locked out.", TopicCategory.SUPPORT_REQUEST),
+    ("The printer driver won't install on Windows 11, need assistance.", TopicCategory.SUPPORT_REQUEST),
+    ("I'd like to upgrade to the annual plan today.", TopicCategory.PURCHASE_INTENT),
+    ("Can I get a quote for 50 seats?", TopicCategory.PURCHASE_INTENT),
+    ("We're ready to buy, send me the invoice.", TopicCategory.PURCHASE_INTENT),
+    ("I want to add the analytics add-on to my order.", TopicCategory.PURCHASE_INTENT),
+    ("Put me down for two of the blue ones please.", TopicCategory.PURCHASE_INTENT),
+    ("The new checkout flow is so much faster, nice job.", TopicCategory.FEEDBACK),
+    ("Suggestion: let us pin favourite reports to the top.", TopicCategory.FEEDBACK),
+    ("Really happy with how quickly the team responded.", TopicCategory.FEEDBACK),
+    ("The mobile app feels cluttered, maybe simplify the menu.", TopicCategory.FEEDBACK),
+    ("Five stars, the onboarding guide was very clear.", TopicCategory.FEEDBACK),
+    ("cool", TopicCategory.OTHER),
+    ("good morning!", TopicCategory.OTHER),
+    ("one sec, brb", TopicCategory.OTHER),
+    ("👍", TopicCategory.OTHER),
+    ("see you tomorrow", TopicCategory.OTHER),
+]
+
+
+def load_engine(name: str):
+    """Topic classifier for an engine, reusing the global instance when classifier.py already built it"""
+    if name == 'embedding':
+        from classifier_embedding import topic_classifier
+        return topic_classifier
+    import classifier
+    if isinstance(classifier.topic_classifier, classifier.TopicClassifier):
+        return classifier.topic_classifier
+    return classifier.TopicClassifier()
+
+
+def evaluate(engine, repeat: int) -> Dict[str, float]:
+    """Accuracy, batch throughput and single-text latency over the labeled sample"""
+    texts = [text for text, _ in LABELED_SAMPLE]
+    engine.classify_batch(texts[:4])  # warm-up
+    
+    # Each timed pass starts from an empty result cache so the model is measured
+    batch_seconds = []
+    for _ in range(repeat):
+        engine.cache.clear()
+        start = time.perf_counter()
+        results = engine.classify_batch(texts)
+        batch_seconds.append(time.perf_counter() - start)
+    
+    engine.cache.clear()
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        engine.classify_topic(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    correct = sum(result.topic == label for result, (_, label) in zip(results, LABELED_SAMPLE))
+    return {
+        'accuracy': correct / len(texts),
+        'texts_per_second': len(texts) / min(batch_seconds),
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': statistics.quantiles(latencies, n=20)[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare topic engines on a labeled sample")
+    parser.add_argument('--engines', default="zero_shot,embedding", help="Comma-separated engines to compare")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed batch repetitions")
+    args = parser.parse_args()
+    
+    print(f"Labeled sample: {len(LABELED_SAMPLE)} messages, {len(TopicCategory)} topics")
+    print(f"{'engine':>10} {'accuracy':>9} {'texts/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name in args.engines.split(','):
+        engine = load_engine(name)
+        if getattr(engine, 'classifier', None) is None and getattr(engine, 'model', None) is None:
+            print(f"{name:>10} ❌ model not available")
+            continue
+        result = evaluate(engine, args.repeat)
+        print(f"{name:>10} {result['accuracy']:>9.0%} {result['texts_per_second']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
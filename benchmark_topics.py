@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Zero-shot topic classification throughput benchmark
+Compares classifying texts one at a time (one pipeline call, i.e. one unbatched
+NLI pass per candidate label, per text) with TopicClassifier.classify_batch,
+which pads text x label pairs from many texts into each forward pass
+
+Usage:
+    python benchmark_topics.py
+    python benchmark_topics.py --texts 200 --batch-sizes 8,32,64
+"""
+
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+from benchmark_codec import build_corpus
+from classifier import TopicClassifier, topic_classifier
+
+
+def timed(func: Callable[[], List]) -> Tuple[float, List]:
+    """Wall-clock seconds and result of one run, starting from an empty result cache"""
+    topic_classifier.cache.clear()
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched zero-shot topic classification")
+    parser.add_argument('--texts', type=int, default=100, help="Number of texts to classify")
+    parser.add_argument('--batch-sizes', default="8,16,32,64", help="Comma-separated classify_batch batch sizes")
+    args = parser.parse_args()
+    
+    if not isinstance(topic_classifier, TopicClassifier) or not topic_classifier.classifier:
+        print("❌ Zero-shot topic model is not available (run with TOPIC_ENGINE=zero_shot)")
+        return
+    
+    texts = [message.content for message in build_corpus(args.texts)]
+    pairs = len(texts) * len(topic_classifier.candidate_labels)
+    print(f"Model: {topic_classifier.model_name}")
+    print(f"{len(texts)} texts x {len(topic_classifier.candidate_labels)} labels = {pairs} NLI pairs")
+    
+    # Warm-up so the first measurement doesn't pay for lazy initialization
+    topic_classifier.classify_batch(texts[:4])
+    
+    print(f"{'mode':>14} {'seconds':>8} {'texts/s':>8} {'speedup':>8} {'agree':>6}")
+    baseline_s, baseline = timed(lambda: [topic_classifier.classify_topic(text) for text in texts])
+    print(f"{'loop':>14} {baseline_s:>8.2f} {len(texts) / baseline_s:>8.1f} {1.0:>8.2f} {'-':>6}")
+    
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        seconds, results = timed(lambda: topic_classifier.classify_batch(texts, batch_size))
+        # Padding can shift scores slightly; count texts whose top topic is unchanged
+        agree = sum(a.topic == b.topic for a, b in zip(baseline, results)) / len(texts)
+        print(f"{'batch ' + str(batch_size):>14} {seconds:>8.2f} {len(texts) / seconds:>8.1f} "
+              f"{baseline_s / seconds:>8.2f} {agree:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Streaming NDJSON export of chat sessions
+
+Walks the session index page by page (newest update first) and each session's
+messages page by page with a message-id cursor, so memory use stays constant
+whatever the number or size of sessions. Every line is one message in the
+format bulk_import.py reads back. Output can be gzip-compressed as it is
+written, and filtered by message time range, topic and sentiment.
+
+Sessions written or deleted while an export runs shift the index: such a
+session can appear twice or, if one before it is deleted, be skipped.
+
+Usage:
+    python bulk_export.py > export.ndjson
+    python bulk_export.py --output export.ndjson.gz       # gzip from the extension
+    python bulk_export.py --since 2026-01-01 --until 2026-02-01 --topic complaint
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from models import ChatMessage, Sentiment, TopicCategory
+from secondary_index import facet_filters, message_facets
+from storage import get_storage
+
+# Load environment variables
+load_dotenv()
+
+# Sessions listed, and messages read per session, in one storage call
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 500))
+
+# Approximate bytes of NDJSON gathered into one chunk of a streamed response
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+class ExportFilter:
+    """Message time range and facet values an export keeps"""
+    
+    def __init__(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 topic: Optional[str] = None, sentiment: Optional[str] = None):
+        """Keep messages with since <= timestamp <= until and the given topic/sentiment"""
+        self.since = since
+        self.until = until
+        self.facets = facet_filters(topic, sentiment)
+    
+    def first_page(self, page_size: int) -> Dict[str, Any]:
+        """Arguments of a session's first page read: from `since` when set (an indexed seek on every backend)"""
+        if self.since is None:
+            return {'offset': 0, 'limit': page_size}
+        # since_ts is exclusive; step back a microsecond so `since` itself is kept
+        return {'limit': page_size, 'since_ts': self.since - timedelta(microseconds=1)}
+    
+    def past_end(self, message: ChatMessage) -> bool:
+        """Whether a message (and every later one in its session) is after `until`"""
+        return self.until is not None and message.timestamp.timestamp() > self.until.timestamp()
+    
+    def keeps(self, message: ChatMessage) -> bool:
+        """Whether a message within the time range matches the facets"""
+        facets = message_facets(message)
+        return all(facets.get(facet) == value for facet, value in self.facets.items())
+
+
+def session_messages(storage, session_id: str, export_filter: ExportFilter,
+                     page_size: int = EXPORT_PAGE_SIZE) -> Iterator[ChatMessage]:
+    """A session's matching messages in chronological order, one page in memory at a time"""
+    page = storage.get_session_messages(session_id, **export_filter.first_page(page_size))
+    while page:
+        for message in page:
+            if export_filter.past_end(message):
+                return
+            if export_filter.keeps(message):
+                yield message
+        if len(page) < page_size:
+            return
+        # None (the last message was deleted or expired meanwhile) ends the session
+        page = storage.get_session_messages(session_id, limit=page_size, since_message_id=page[-1].message_id)
+
+
+def export_messages(storage, export_filter: ExportFilter, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[ChatMessage]:
+    """Every matching message, sessions by last update (newest first)"""
+    cursor = 0
+    while True:
+        session_ids = storage.list_sessions(cursor=cursor, limit=page_size)
+        for session_id in session_ids:
+            yield from session_messages(storage, session_id, export_filter, page_size)
+        if len(session_ids) < page_size:
+            return
+        cursor += len(session_ids)
+
+
+async def session_messages_async(storage, session_id: str, export_filter: ExportFilter,
+                                 page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[ChatMessage]:
+    """Awaitable-storage variant of session_messages"""
+    page = await storage.get_session_messages(session_id, **export_filter.first_page(page_size))
+    while page:
+        for message in page:
+            if export_filter.past_end(message):
+                return
+            if export_filter.keeps(message):
+                yield message
+        if len(page) < page_size:
+            return
+        # None (the last message was deleted or expired meanwhile) ends the session
+        page = await storage.get_session_messages(session_id, limit=page_size, since_message_id=page[-1].message_id)
+
+
+async def export_messages_async(storage, export_filter: ExportFilter,
+                                page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[ChatMessage]:
+    """Awaitable-storage variant of export_messages"""
+    cursor = 0
+    while True:
+        session_ids = await storage.list_sessions(cursor=cursor, limit=page_size)
+        for session_id in session_ids:
+            async for message in session_messages_async(storage, session_id, export_filter, page_size):
+                yield message
+        if len(session_ids) < page_size:
+            return
+        cursor += len(session_ids)
+
+
+def ndjson_line(message: ChatMessage) -> bytes:
+    """One message as a line of NDJSON"""
+    return message.model_dump_json(exclude_none=True).encode('utf-8') + b"\n"
+
+
+def gzip_compressor():
+    """Streaming compressor producing a gzip member (flush() ends it)"""
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+
+def write_export(messages: Iterable[ChatMessage], output, compress: bool) -> int:
+    """Write messages as (optionally gzipped) NDJSON to a binary stream; return how many were written"""
+    compressor = gzip_compressor() if compress else None
+    count = 0
+    for message in messages:
+        line = ndjson_line(message)
+        output.write(compressor.compress(line) if compressor else line)
+        count += 1
+    if compressor:
+        output.write(compressor.flush())
+    return count
+
+
+async def ndjson_chunks(messages: AsyncIterator[ChatMessage], compress: bool) -> AsyncIterator[bytes]:
+    """Messages as (optionally gzipped) NDJSON in chunks of about EXPORT_CHUNK_BYTES"""
+    compressor = gzip_compressor() if compress else None
+    buffer = bytearray()
+    async for message in messages:
+        buffer += ndjson_line(message)
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if chunk:
+                yield chunk
+    
+    chunk = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+    if chunk:
+        yield chunk
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """ISO 8601 date or datetime argument"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export chat messages as NDJSON")
+    parser.add_argument('--output', default=None, help="Output file (default: stdout); .gz implies --gzip")
+    parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip")
+    parser.add_argument('--since', default=None, help="Only messages at or after this ISO date/time")
+    parser.add_argument('--until', default=None, help="Only messages at or before this ISO date/time")
+    parser.add_argument('--topic', choices=[topic.value for topic in TopicCategory], default=None)
+    parser.add_argument('--sentiment', choices=[sentiment.value for sentiment in Sentiment], default=None)
+    parser.add_argument('--page-size', type=int, default=EXPORT_PAGE_SIZE, help="Sessions/messages per storage read")
+    args = parser.parse_args()
+    
+    # The export may own stdout; storage diagnostics go to stderr instead
+    output = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        storage = get_storage()
+        if not storage.health_check():
+            print("❌ Storage backend is not reachable")
+            return
+        
+        export_filter = ExportFilter(parse_time(args.since), parse_time(args.until), args.topic, args.sentiment)
+        compress = args.gzip or bool(args.output and args.output.endswith('.gz'))
+        messages = export_messages(storage, export_filter, args.page_size)
+        if args.output:
+            with open(args.output, 'wb') as f:
+                count = write_export(messages, f, compress)
+        else:
+            count = write_export(messages, output, compress)
+            output.flush()
+        print(f"✅ Exported {count} messages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Bulk import of historical chat logs
+
+Streams JSONL (one message object per line) or CSV (with a header row) input,
+runs sentiment and topic inference one batch at a time and writes each batch
+with the storage backend's pipelined store_messages. Parsing and inference of
+the next batch run on a background thread while the current batch is written.
+Progress is printed as the import runs and the number of records committed is
+kept in a checkpoint file, so a failed import continues where it stopped with
+--resume (at most the batch in flight when it failed is written twice).
+
+Each record needs session_id, role and content; timestamp (ISO 8601),
+message_id, sentiment, sentiment_score and topic are optional. Records that
+already carry a sentiment or topic skip that inference. Records whose
+message_id is already stored are skipped (and counted), so importing the same
+dump twice stores each message once.
+
+Backends keep each session in storage order and rely on it being
+chronological, so out-of-order input is rejected rather than inserted in
+place: each batch is sorted by timestamp, and a record older than the newest
+message already stored for its session is skipped. Sort historical input by
+timestamp (exports already are) so nothing is skipped.
+
+Usage:
+    python bulk_import.py transcripts.jsonl
+    python bulk_import.py export.csv --batch-size 512 --resume
+    python bulk_import.py transcripts.jsonl --no-analysis     # store without sentiment/topic
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+
+from models import ChatMessage, Sentiment
+from session_stats import signed_sentiment_score
+from storage import get_storage
+
+# Load environment variables
+load_dotenv()
+
+# Messages parsed, analyzed and written together
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 256))
+
+# Seconds between progress lines printed by the CLI
+PROGRESS_INTERVAL = 5.0
+
+# Errors kept for the final report; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# Sessions whose newest timestamp is remembered; others are looked up again
+ORDER_CACHE_SESSIONS = 100000
+
+
+def detect_format(filename: str) -> str:
+    """Input format from a file name: csv for .csv, otherwise jsonl"""
+    return 'csv' if filename.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(lines: Iterable[str], fmt: str) -> Iterator[Union[str, Dict[str, str]]]:
+    """Raw records in input order: JSONL lines (parsed later, so one bad line is one failed record) or CSV rows"""
+    if fmt == 'csv':
+        for row in csv.DictReader(lines):
+            yield {field: value for field, value in row.items() if field and value not in ('', None)}
+        return
+    for line in lines:
+        if line.strip():
+            yield line
+
+
+def parse_record(record: Union[str, Dict[str, Any]]) -> ChatMessage:
+    """Validate one raw record as a ChatMessage"""
+    fields = json.loads(record) if isinstance(record, str) else dict(record)
+    if fields.get('sentiment') and fields.get('sentiment_score') is None:
+        fields['sentiment_score'] = signed_sentiment_score(Sentiment(fields['sentiment']))
+    return ChatMessage(**fields)
+
+
+def apply_sentiments(messages: List[ChatMessage], results: List[Any]):
+    """Set sentiment and signed score from sentiment results, in order"""
+    for message, result in zip(messages, results):
+        message.sentiment = result.sentiment
+        message.sentiment_score = signed_sentiment_score(result.sentiment, result.confidence)
+
+
+def apply_topics(messages: List[ChatMessage], results: List[Any]):
+    """Set topic from topic results, in order"""
+    for message, result in zip(messages, results):
+        message.topic = result.topic
+
+
+def annotate(messages: List[ChatMessage], sentiment_analyzer, topic_classifier):
+    """Fill in missing sentiments and topics with one batched call to each model"""
+    pending = [message for message in messages if message.sentiment is None]
+    if pending:
+        apply_sentiments(pending, sentiment_analyzer.analyze_batch([message.content for message in pending]))
+    
+    pending = [message for message in messages if message.topic is None]
+    if pending:
+        apply_topics(pending, topic_classifier.classify_batch([message.content for message in pending]))
+
+
+async def annotate_async(messages: List[ChatMessage], analyze_sentiment: Optional[Callable[[str], Awaitable[Any]]],
+                         classify_topic: Optional[Callable[[str], Awaitable[Any]]]):
+    """Fill in missing sentiments and topics through per-text awaitables, e.g. the API's MicroBatcher.submit
+    
+    The API uses this so import inference shares the inference pool's
+    workers, batch limits and timeouts with live traffic; asyncio.TimeoutError
+    propagates after the remaining requests are cancelled. A missing callable
+    leaves that field unset.
+    """
+    sentiment_pending = [message for message in messages if message.sentiment is None] if analyze_sentiment else []
+    topic_pending = [message for message in messages if message.topic is None] if classify_topic else []
+    requests = [asyncio.ensure_future(analyze_sentiment(message.content)) for message in sentiment_pending]
+    requests += [asyncio.ensure_future(classify_topic(message.content)) for message in topic_pending]
+    try:
+        results = await asyncio.gather(*requests)
+    except BaseException:
+        # Withdraw the batch's other requests so they are not computed for nothing
+        for request in requests:
+            request.cancel()
+        raise
+    apply_sentiments(sentiment_pending, results[:len(sentiment_pending)])
+    apply_topics(topic_pending, results[len(sentiment_pending):])
+
+
+def prepare_batches(lines: Iterable[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE, skip: int = 0,
+                    analyzers: Optional[Tuple[Any, Any]] = None) -> Iterator[Tuple[int, List[ChatMessage], List[str]]]:
+    """Parsed (and with `analyzers`, annotated) batches after the first `skip` records
+    
+    Yields (records consumed so far, messages, errors); the first value is what
+    a checkpoint stores once the batch is written.
+    """
+    position = 0
+    messages: List[ChatMessage] = []
+    errors: List[str] = []
+    for record in read_records(lines, fmt):
+        position += 1
+        if position <= skip:
+            continue
+        try:
+            messages.append(parse_record(record))
+        except Exception as e:
+            errors.append(f"record {position}: {e}")
+        if len(messages) + len(errors) >= batch_size:
+            if analyzers:
+                annotate(messages, *analyzers)
+            yield position, messages, errors
+            messages, errors = [], []
+    
+    if messages or errors:
+        if analyzers:
+            annotate(messages, *analyzers)
+        yield position, messages, errors
+
+
+def prefetch(iterator: Iterator[Any], depth: int = 2) -> Iterator[Any]:
+    """Run an iterator on a background thread, up to `depth` items ahead of the consumer"""
+    items: queue.Queue = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()  # set when the consumer goes away early
+    
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+    
+    threading.Thread(target=produce, daemon=True, name="import-prefetch").start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class SessionOrder:
+    """Keeps imported messages chronological per session (see the module docstring)
+    
+    Remembers the newest timestamp written to each recently seen session; a
+    session not remembered is looked up in storage first (see `unseen`).
+    """
+    
+    def __init__(self, max_sessions: int = ORDER_CACHE_SESSIONS):
+        """Remember at most `max_sessions` sessions, least recently seen dropped first"""
+        self.max_sessions = max_sessions
+        self.newest = OrderedDict()  # session_id -> newest timestamp (epoch seconds) or None
+    
+    def unseen(self, messages: List[ChatMessage]) -> List[str]:
+        """Sessions of a batch whose newest stored message must be looked up (offset=-1, limit=1)"""
+        return [session_id for session_id in dict.fromkeys(message.session_id for message in messages)
+                if session_id not in self.newest]
+    
+    def note(self, session_id: str, newest: List[ChatMessage]):
+        """Record a session's newest stored message (an empty list for a new session)"""
+        self.newest[session_id] = newest[-1].timestamp.timestamp() if newest else None
+    
+    def keep(self, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """The batch sorted by timestamp, without messages older than their session's newest one"""
+        kept = []
+        for message in sorted(messages, key=lambda message: message.timestamp.timestamp()):
+            ts = message.timestamp.timestamp()
+            newest = self.newest.get(message.session_id)
+            if newest is not None and ts < newest:
+                continue
+            self.newest[message.session_id] = ts
+            self.newest.move_to_end(message.session_id)
+            kept.append(message)
+        while len(self.newest) > self.max_sessions:
+            self.newest.popitem(last=False)
+        return kept
+
+
+class ImportProgress:
+    """Counters and throughput of a running import"""
+    
+    def __init__(self, resumed: int = 0):
+        """Start counting after `resumed` already imported records"""
+        self.started = time.perf_counter()
+        self.records = resumed
+        self.stored = 0
+        self.skipped = 0  # valid records not written: already stored, or older than their session's newest message
+        self.failed = 0
+        self.errors: List[str] = []
+    
+    def update(self, position: int, parsed: int, stored: int, errors: List[str]):
+        """Account for one written batch of `parsed` messages"""
+        self.records = position
+        self.stored += stored
+        self.skipped += parsed - stored
+        self.failed += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Progress snapshot; `records` is the value to resume from"""
+        seconds = time.perf_counter() - self.started
+        return {
+            'records': self.records,
+            'stored': self.stored,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'seconds': round(seconds, 1),
+            'messages_per_minute': round(self.stored * 60 / seconds) if seconds else None
+        }
+
+
+class Checkpoint:
+    """Number of input records already committed, kept in a small JSON file"""
+    
+    def __init__(self, path: str):
+        """Use the checkpoint file at `path`"""
+        self.path = path
+    
+    def load(self, source: str) -> int:
+        """Records committed by an earlier run over the same source (0 if none)"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        return int(state.get('records', 0)) if state.get('source') == source else 0
+    
+    def save(self, source: str, records: int):
+        """Record progress atomically (write then rename)"""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'source': source, 'records': records}, f)
+        os.replace(temporary, self.path)
+    
+    def clear(self):
+        """Forget the checkpoint once an import completed"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load_analyzers():
+    """Sentiment and topic models, falling back to the lightweight ones like main_simple"""
+    try:
+        from sentiment import sentiment_analyzer
+        from classifier import topic_classifier
+    except ImportError:
+        from sentiment_simple import sentiment_analyzer
+        from classifier_simple import topic_classifier
+    return sentiment_analyzer, topic_classifier
+
+
+def run_import(path: str, storage, fmt: str, batch_size: int, checkpoint: Checkpoint, resume: bool,
+               analyzers: Optional[Tuple[Any, Any]]) -> ImportProgress:
+    """Import one file, saving the checkpoint after every written batch"""
+    source = os.path.abspath(path)
+    skip = checkpoint.load(source) if resume else 0
+    if skip:
+        print(f"⏩ Resuming after record {skip}")
+    
+    progress = ImportProgress(skip)
+    order = SessionOrder()
+    last_report = time.perf_counter()
+    with open(path, encoding='utf-8', newline='') as f:
+        for position, messages, errors in prefetch(prepare_batches(f, fmt, batch_size, skip, analyzers)):
+            for session_id in order.unseen(messages):
+                order.note(session_id, storage.get_session_messages(session_id, offset=-1, limit=1))
+            stored = storage.store_messages(order.keep(messages))
+            if stored is None:
+                raise RuntimeError(f"storage failed to write the batch ending at record {position}")
+            progress.update(position, len(messages), stored, errors)
+            checkpoint.save(source, position)
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                state = progress.as_dict()
+                print(f"   {state['records']} records, {state['stored']} stored, {state['skipped']} skipped, "
+                      f"{state['failed']} failed, {state['messages_per_minute']} messages/min")
+                last_report = time.perf_counter()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import chat messages from JSONL or CSV")
+    parser.add_argument('path', help="Input file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default=None,
+                        help="Input format (default: from the extension)")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="Messages per batch")
+    parser.add_argument('--checkpoint', default=None, help="Checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument('--resume', action='store_true', help="Skip the records committed by an earlier run")
+    parser.add_argument('--no-analysis', action='store_true', help="Store messages without sentiment/topic inference")
+    args = parser.parse_args()
+    
+    storage = get_storage()
+    if not storage.health_check():
+        print("❌ Storage backend is not reachable")
+        return
+    
+    analyzers = None if args.no_analysis else load_analyzers()
+    checkpoint = Checkpoint(args.checkpoint or f"{args.path}.checkpoint")
+    try:
+        progress = run_import(args.path, storage, args.format or detect_format(args.path), args.batch_size,
+                              checkpoint, args.resume, analyzers)
+    except Exception as e:
+        print(f"❌ Import failed: {e}")
+        print("Run again with --resume to continue from the last committed batch")
+        return
+    
+    checkpoint.clear()
+    state = progress.as_dict()
+    for error in progress.errors:
+        print(f"   ⚠️ {error}")
+    print(f"✅ Imported {state['stored']} messages ({state['skipped']} skipped, {state['failed']} failed) "
+          f"in {state['seconds']}s, {state['messages_per_minute']} messages/min")
+
+
+if __name__ == "__main__":
+    main()
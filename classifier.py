@@ -5,17 +5,25 @@ import os
 from dotenv import load_dotenv
 
 from models import TopicCategory, TopicClassificationResponse
+from inference_cache import InferenceCache
 
 # Load environment variables
 load_dotenv()
 
+# (text, label) pairs padded into one NLI forward pass by classify_batch
+TOPIC_BATCH_SIZE = int(os.getenv('TOPIC_BATCH_SIZE', 16))
+
+# Topic engine behind the global topic_classifier: `zero_shot` (NLI) or `embedding` (sentence similarity)
+TOPIC_ENGINE = os.getenv('TOPIC_ENGINE', 'zero_shot')
+
 
 class TopicClassifier:
     """Topic classification using zero-shot classification"""
     
-    def __init__(self, model_name: str = "facebook/bart-large-mnli"):
+    def __init__(self, model_name: str = "facebook/bart-large-mnli", batch_size: int = TOPIC_BATCH_SIZE):
         """Initialize topic classifier with specified model"""
         self.model_name = model_name
+        self.batch_size = batch_size
         self.classifier = None
         self.candidate_labels = [
             "complaint",
@@ -25,7 +33,12 @@ class TopicClassifier:
             "feedback",
             "other"
         ]
+        self.loaded_model_name = None  # model_name, or the fallback model if that failed to load
         self._load_model()
+        # Results for repeated texts, keyed by normalized text, the loaded model and the candidate labels
+        self.cache = InferenceCache(
+            'topic', f"zero_shot:{self.loaded_model_name}:{'|'.join(self.candidate_labels)}", TopicClassificationResponse
+        )
     
     def _load_model(self):
         """Load the zero-shot classification model"""
@@ -38,6 +51,7 @@ class TopicClassifier:
                 device=0 if torch.cuda.is_available() else -1
             )
             
+            self.loaded_model_name = self.model_name
             print("Topic classification model loaded successfully")
         except Exception as e:
             print(f"Error loading topic classification model: {e}")
@@ -48,6 +62,7 @@ class TopicClassifier:
                     model="microsoft/DialoGPT-medium",
                     device=0 if torch.cuda.is_available() else -1
                 )
+                self.loaded_model_name = "microsoft/DialoGPT-medium"
                 print("Fallback topic classification model loaded")
             except Exception as e2:
                 print(f"Error loading fallback model: {e2}")
@@ -80,25 +95,8 @@ class TopicClassifier:
             )
         
         try:
-            # Perform zero-shot classification
-            result = self.classifier(
-                text,
-                candidate_labels=self.candidate_labels,
-                hypothesis_template="This text is about {}."
-            )
-            
-            # Get the best label and confidence
-            best_label = result['labels'][0]
-            confidence = result['scores'][0]
-            
-            # Map to our topic category
-            topic = self._map_label_to_topic(best_label)
-            
-            return TopicClassificationResponse(
-                text=text,
-                topic=topic,
-                confidence=confidence
-            )
+            # Perform zero-shot classification (repeated texts are served from the cache)
+            return self.cache.lookup([text], self._classify)[0]
             
         except Exception as e:
             print(f"Error in topic classification: {e}")
@@ -108,8 +106,15 @@ class TopicClassifier:
                 confidence=0.0
             )
     
-    def classify_batch(self, texts: List[str]) -> List[TopicClassificationResponse]:
-        """Classify topics for multiple texts"""
+    def classify_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[TopicClassificationResponse]:
+        """Classify topics for multiple texts
+        
+        Every text expands into one NLI pair per candidate label; the pipeline
+        pads `batch_size` pairs (default: self.batch_size) into each forward
+        pass across texts, instead of running them one at a time.
+        """
+        if not texts:
+            return []
         if not self.classifier:
             return [
                 TopicClassificationResponse(
@@ -120,12 +125,8 @@ class TopicClassifier:
             ]
         
         try:
-            responses = []
-            for text in texts:
-                response = self.classify_topic(text)
-                responses.append(response)
-            
-            return responses
+            # Cached texts are skipped; the rest share padded NLI batches
+            return self.cache.lookup(list(texts), lambda missing: self._classify(missing, batch_size))
             
         except Exception as e:
             print(f"Error in batch topic classification: {e}")
@@ -137,9 +138,28 @@ class TopicClassifier:
                 ) for text in texts
             ]
     
-    def get_topic_distribution(self, texts: List[str]) -> Dict[str, int]:
+    def _classify(self, texts: List[str], batch_size: Optional[int] = None) -> List[TopicClassificationResponse]:
+        """Run zero-shot classification over texts and map each best label to a topic"""
+        results = self.classifier(
+            texts,
+            candidate_labels=self.candidate_labels,
+            hypothesis_template="This text is about {}.",
+            batch_size=batch_size or self.batch_size
+        )
+        if isinstance(results, dict):  # some pipeline versions unwrap a one-text list
+            results = [results]
+        
+        return [
+            TopicClassificationResponse(
+                text=text,
+                topic=self._map_label_to_topic(result['labels'][0]),
+                confidence=result['scores'][0]
+            ) for text, result in zip(texts, results)
+        ]
+    
+    def get_topic_distribution(self, texts: List[str], batch_size: Optional[int] = None) -> Dict[str, int]:
         """Get distribution of topics across multiple texts"""
-        responses = self.classify_batch(texts)
+        responses = self.classify_batch(texts, batch_size)
         
         distribution = {}
         for response in responses:
@@ -177,5 +197,8 @@ class TopicClassifier:
             return False
 
 
-# Global topic classifier instance
-topic_classifier = TopicClassifier() 
\ No newline at end of file
+# Global topic classifier instance: zero-shot NLI, or embedding similarity with TOPIC_ENGINE=embedding
+if TOPIC_ENGINE == 'embedding':
+    from classifier_embedding import topic_classifier
+else:
+    topic_classifier = TopicClassifier()
@@ -0,0 +1,242 @@
+from transformers import AutoModel, AutoTokenizer
+import torch
+import numpy as np
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+from typing import List, Dict, Optional
+import os
+from dotenv import load_dotenv
+
+from models import TopicCategory, TopicClassificationResponse
+from inference_cache import InferenceCache
+
+# Load environment variables
+load_dotenv()
+
+# Sentence encoder embedding texts and topic prototypes (mean-pooled token states)
+TOPIC_EMBEDDING_MODEL = os.getenv('TOPIC_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+
+# Texts padded into one encoder forward pass
+TOPIC_EMBEDDING_BATCH_SIZE = int(os.getenv('TOPIC_EMBEDDING_BATCH_SIZE', 64))
+
+# Softmax temperature turning cosine similarities into confidences that sum to 1
+SIMILARITY_TEMPERATURE = 0.05
+
+# Custom label embeddings kept for classify_with_custom_labels
+LABEL_CACHE_SIZE = 1024
+
+# Example phrasings per topic; a topic's vector is the normalized mean of their embeddings
+TOPIC_PROTOTYPES = {
+    TopicCategory.COMPLAINT: [
+        "This text is about a complaint.",
+        "I'm really unhappy with this, it's unacceptable.",
+        "I was charged twice and nobody has fixed it.",
+        "Your product broke after a week, terrible quality.",
+    ],
+    TopicCategory.QUESTION: [
+        "This text is about a question.",
+        "Can you tell me how this feature works?",
+        "What are your opening hours?",
+        "Does the plan include priority support?",
+    ],
+    TopicCategory.SUPPORT_REQUEST: [
+        "This text is about a support request.",
+        "I need help, the app crashes when I log in.",
+        "Please reset my password, I can't access my account.",
+        "Could someone help me set up the integration?",
+    ],
+    TopicCategory.PURCHASE_INTENT: [
+        "This text is about purchase intent.",
+        "I'd like to buy three more licenses for my team.",
+        "How much does the premium subscription cost?",
+        "I want to order the larger package.",
+    ],
+    TopicCategory.FEEDBACK: [
+        "This text is about feedback.",
+        "Great service, the issue was fixed in minutes.",
+        "It would be nice if the dashboard had a dark mode.",
+        "I love the new update, well done.",
+    ],
+    TopicCategory.OTHER: [
+        "This text is about something else.",
+        "ok",
+        "thanks, bye",
+        "hello there",
+    ],
+}
+
+
+def softmax(scores: np.ndarray) -> np.ndarray:
+    """Row-wise softmax of temperature-scaled similarities"""
+    scaled = scores / SIMILARITY_TEMPERATURE
+    scaled -= scaled.max(axis=1, keepdims=True)
+    weights = np.exp(scaled)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+class EmbeddingTopicClassifier:
+    """Topic classification by cosine similarity between sentence embeddings and topic prototypes
+    
+    Each text is embedded once by a small encoder and compared with all topic
+    vectors in one matrix product, instead of one NLI pass per (text, label)
+    pair as in zero-shot classification. Same interface as TopicClassifier.
+    """
+    
+    def __init__(self, model_name: str = TOPIC_EMBEDDING_MODEL, batch_size: int = TOPIC_EMBEDDING_BATCH_SIZE,
+                 prototypes: Optional[Dict[TopicCategory, List[str]]] = None):
+        """Initialize the classifier with the specified encoder and topic prototypes"""
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.prototypes = prototypes or TOPIC_PROTOTYPES
+        self.topics = list(self.prototypes)
+        self.tokenizer = None
+        self.model = None
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.topic_vectors: Optional[np.ndarray] = None  # one normalized row per topic
+        self.label_vectors = OrderedDict()  # custom label -> normalized embedding, least recently used first
+        self.lock = threading.Lock()  # inference pool threads share the label cache
+        self._load_model()
+        # Results for repeated texts, keyed by normalized text, the encoder and the prototypes
+        prototypes_digest = hashlib.blake2b(
+            json.dumps({topic.value: phrases for topic, phrases in self.prototypes.items()}, sort_keys=True).encode(),
+            digest_size=8
+        ).hexdigest()
+        self.cache = InferenceCache(
+            'topic_embedding', f"embedding:{self.model_name}:{prototypes_digest}", TopicClassificationResponse
+        )
+    
+    def _load_model(self):
+        """Load the sentence encoder and embed the topic prototypes"""
+        try:
+            print(f"Loading topic embedding model: {self.model_name}")
+            
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.model = AutoModel.from_pretrained(self.model_name).to(self.device).eval()
+            
+            centroids = [self._embed(self.prototypes[topic]).mean(axis=0) for topic in self.topics]
+            self.topic_vectors = self._normalize(np.vstack(centroids))
+            
+            print("Topic embedding model loaded successfully")
+        except Exception as e:
+            print(f"Error loading topic embedding model: {e}")
+            self.model = None
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Scale rows to unit length so dot products are cosine similarities"""
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    
+    def _embed(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Normalized mean-pooled embeddings, `batch_size` texts per forward pass"""
+        batch_size = batch_size or self.batch_size
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True, max_length=256, return_tensors='pt'
+            ).to(self.device)
+            with torch.no_grad():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            vectors.append(pooled.cpu().numpy())
+        return self._normalize(np.vstack(vectors))
+    
+    def _label_vectors(self, labels: List[str]) -> np.ndarray:
+        """Embeddings of custom labels (as zero-shot hypotheses), embedding only the uncached ones"""
+        with self.lock:
+            missing = [label for label in dict.fromkeys(labels) if label not in self.label_vectors]
+        embedded = self._embed([f"This text is about {label}." for label in missing]) if missing else []
+        
+        with self.lock:
+            self.label_vectors.update(zip(missing, embedded))
+            vectors = np.vstack([self.label_vectors[label] for label in labels])
+            for label in labels:
+                self.label_vectors.move_to_end(label)
+            while len(self.label_vectors) > LABEL_CACHE_SIZE:
+                self.label_vectors.popitem(last=False)
+        return vectors
+    
+    def classify_topic(self, text: str) -> TopicClassificationResponse:
+        """Classify topic of given text"""
+        return self.classify_batch([text])[0]
+    
+    def classify_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[TopicClassificationResponse]:
+        """Classify topics for multiple texts: one embedding per text, one similarity matrix for all"""
+        if not texts:
+            return []
+        if not self.model:
+            return [
+                TopicClassificationResponse(
+                    text=text,
+                    topic=TopicCategory.OTHER,
+                    confidence=0.0
+                ) for text in texts
+            ]
+        
+        try:
+            # Cached texts are skipped; the rest are embedded together
+            return self.cache.lookup(list(texts), lambda missing: self._classify(missing, batch_size))
+        
+        except Exception as e:
+            print(f"Error in batch topic classification: {e}")
+            return [
+                TopicClassificationResponse(
+                    text=text,
+                    topic=TopicCategory.OTHER,
+                    confidence=0.0
+                ) for text in texts
+            ]
+    
+    def _classify(self, texts: List[str], batch_size: Optional[int] = None) -> List[TopicClassificationResponse]:
+        """Embed texts and pick the most similar topic for each"""
+        probabilities = softmax(self._embed(texts, batch_size) @ self.topic_vectors.T)
+        best = probabilities.argmax(axis=1)
+        
+        return [
+            TopicClassificationResponse(
+                text=text,
+                topic=self.topics[index],
+                confidence=float(row[index])
+            ) for text, index, row in zip(texts, best, probabilities)
+        ]
+    
+    def get_topic_distribution(self, texts: List[str], batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Get distribution of topics across multiple texts"""
+        responses = self.classify_batch(texts, batch_size)
+        
+        distribution = {}
+        for response in responses:
+            topic = response.topic.value
+            distribution[topic] = distribution.get(topic, 0) + 1
+        
+        return distribution
+    
+    def classify_with_custom_labels(self, text: str, custom_labels: List[str]) -> Dict[str, float]:
+        """Classify text with custom labels, best first"""
+        if not self.model or not custom_labels:
+            return {label: 0.0 for label in custom_labels}
+        
+        try:
+            scores = softmax(self._embed([text]) @ self._label_vectors(custom_labels).T)[0]
+            ranked = sorted(zip(custom_labels, scores.tolist()), key=lambda pair: pair[1], reverse=True)
+            return dict(ranked)
+        
+        except Exception as e:
+            print(f"Error in custom classification: {e}")
+            return {label: 0.0 for label in custom_labels}
+    
+    def health_check(self) -> bool:
+        """Check if topic classifier is working"""
+        try:
+            test_text = "I have a question about your product"
+            result = self.classify_topic(test_text)
+            return result.topic in [TopicCategory.QUESTION, TopicCategory.OTHER]
+        except Exception as e:
+            print(f"Topic classifier health check failed: {e}")
+            return False
+
+
+# Global embedding topic classifier instance (used by classifier.py when TOPIC_ENGINE=embedding)
+topic_classifier = EmbeddingTopicClassifier()
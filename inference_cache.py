@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Type
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+# Load environment variables
+load_dotenv()
+
+# Results kept per model in the in-process LRU tier (0 disables caching)
+INFERENCE_CACHE_SIZE = int(os.getenv('INFERENCE_CACHE_SIZE', 10000))
+
+# Share results between workers through Redis (REDIS_HOST/REDIS_PORT/REDIS_DB) as a second tier
+INFERENCE_CACHE_REDIS = os.getenv('INFERENCE_CACHE_REDIS', 'false').lower() == 'true'
+
+# Seconds a result stays in the Redis tier
+INFERENCE_CACHE_TTL = int(os.getenv('INFERENCE_CACHE_TTL', 7 * 24 * 3600))
+
+# Bumped when result mapping changes so stale Redis entries are ignored
+CACHE_FORMAT_VERSION = 1
+
+# Seconds before a failed Redis tier is tried again
+REDIS_RETRY_SECONDS = 30.0
+
+WHITESPACE = re.compile(r"\s+")
+
+# Caches created in this process by name, for stats reporting
+CACHES: Dict[str, "InferenceCache"] = {}
+
+
+def normalize_text(text: str) -> str:
+    """Text as cached: Unicode NFC with whitespace runs collapsed and trimmed (case is kept; models are cased)"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class InferenceCache:
+    """Bounded LRU of model results keyed by a hash of the normalized text and the model
+    
+    Lookups go to the in-process tier, then (when enabled) to Redis, and only
+    the remaining texts are computed, in one batched call with duplicates
+    removed. Results are stored without their text and returned as copies
+    carrying the caller's text, so callers may modify them.
+    """
+    
+    def __init__(self, name: str, model_key: str, result_type: Type[BaseModel],
+                 max_entries: int = INFERENCE_CACHE_SIZE, use_redis: bool = INFERENCE_CACHE_REDIS,
+                 ttl: int = INFERENCE_CACHE_TTL):
+        """Cache results of `result_type` for model `model_key` (model name plus anything that changes results)"""
+        self.name = name
+        self.result_type = result_type
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = hashlib.blake2b(f"{CACHE_FORMAT_VERSION}:{name}:{model_key}".encode(), digest_size=8).hexdigest()
+        self.entries = OrderedDict()  # key -> result fields without text, least recently used first
+        self.lock = threading.Lock()  # pool threads share the cache
+        self.redis = None
+        self.redis_retry_at = 0.0 if use_redis else None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.computed_seconds = 0.0
+        CACHES[name] = self
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached at all"""
+        return self.max_entries > 0
+    
+    def key(self, text: str) -> str:
+        """Cache key of a text for this model"""
+        digest = hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).hexdigest()
+        return f"{self.prefix}:{digest}"
+    
+    def _redis(self):
+        """Redis connection of the second tier, or None while disabled or after a recent failure"""
+        if self.redis is not None or self.redis_retry_at is None or time.monotonic() < self.redis_retry_at:
+            return self.redis
+        import redis
+        self.redis = redis.Redis(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', 6379)),
+            db=int(os.getenv('REDIS_DB', 0)),
+            decode_responses=True
+        )
+        return self.redis
+    
+    def _redis_failed(self, e: Exception):
+        """Skip the Redis tier for a while instead of failing inference"""
+        print(f"Inference cache Redis tier unavailable: {e}")
+        self.redis = None
+        self.redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+    
+    def _get_local(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Results found in the in-process tier"""
+        found = {}
+        with self.lock:
+            for key in keys:
+                payload = self.entries.get(key)
+                if payload is not None:
+                    self.entries.move_to_end(key)
+                    found[key] = payload
+        return found
+    
+    def _put_local(self, payloads: Dict[str, Dict[str, Any]]):
+        """Add results to the in-process tier, evicting least recently used entries"""
+        with self.lock:
+            for key, payload in payloads.items():
+                self.entries[key] = payload
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def _get_redis(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Results found in the Redis tier"""
+        client = self._redis()
+        if client is None or not keys:
+            return {}
+        try:
+            return {key: json.loads(payload) for key, payload in zip(keys, client.mget(keys)) if payload is not None}
+        except Exception as e:
+            self._redis_failed(e)
+            return {}
+    
+    def _put_redis(self, payloads: Dict[str, Dict[str, Any]]):
+        """Add results to the Redis tier with the cache TTL"""
+        client = self._redis()
+        if client is None or not payloads:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, payload in payloads.items():
+                pipe.set(key, json.dumps(payload), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+    
+    def lookup(self, texts: List[str], compute: Callable[[List[str]], List[BaseModel]]) -> List[BaseModel]:
+        """Results for `texts`, calling `compute` once for those in neither tier (errors propagate, uncached)"""
+        if not self.enabled:
+            return compute(texts)
+        
+        keys = [self.key(text) for text in texts]
+        unique = list(dict.fromkeys(keys))
+        payloads = self._get_local(unique)
+        remote = self._get_redis([key for key in unique if key not in payloads])
+        if remote:
+            self._put_local(remote)
+            payloads.update(remote)
+        
+        # One representative text per missing key, computed in a single batch
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in payloads:
+                pending.setdefault(key, text)
+        if pending:
+            started = time.perf_counter()
+            results = compute(list(pending.values()))
+            elapsed = time.perf_counter() - started
+            computed = {key: result.model_dump(mode='json', exclude={'text', 'session_id'})
+                        for key, result in zip(pending, results)}
+            self._put_local(computed)
+            self._put_redis(computed)
+            payloads.update(computed)
+        else:
+            elapsed = 0.0
+        
+        # Per text: the first occurrence of a computed key is a miss; repeats in the batch are hits
+        counted = set()
+        with self.lock:
+            for key in keys:
+                if key in pending and key not in counted:
+                    counted.add(key)
+                    self.misses += 1
+                elif key in remote:
+                    self.redis_hits += 1
+                else:
+                    self.hits += 1
+            self.computed_seconds += elapsed
+        return [self.result_type.model_validate({**payloads[key], 'text': text}) for key, text in zip(keys, texts)]
+    
+    def clear(self):
+        """Drop the in-process tier (Redis entries expire by TTL), e.g. so benchmarks time the model"""
+        with self.lock:
+            self.entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio per tier and inference time saved (hits x average computed time per text)"""
+        with self.lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            per_text = self.computed_seconds / self.misses if self.misses else None
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'redis': self.redis_retry_at is not None,
+                'hits': self.hits,
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.redis_hits) / lookups if lookups else None,
+                'computed_seconds': round(self.computed_seconds, 3),
+                'saved_seconds': round(per_text * (self.hits + self.redis_hits), 3) if per_text is not None else 0.0
+            }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every inference cache in this process"""
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -0,0 +1,147 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Executor running model calls: `thread` (shares the loaded models) or `process` (one copy of the models per worker)
+INFERENCE_POOL = os.getenv('INFERENCE_POOL', 'thread')
+
+# Model calls running at once
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 2))
+
+# Seconds a caller waits for a model call, including time queued for a worker (0 = no limit)
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv('INFERENCE_TIMEOUT_SECONDS', 30))
+
+
+class ModelMethod:
+    """Picklable reference to a method of a module-level model instance
+    
+    Calling it resolves the instance by import, so in a worker process the
+    model is loaded once on first use; in a thread it is the already loaded one.
+    """
+    
+    def __init__(self, model: Any, method: str):
+        """Reference `method` of `model`, which must be a global of the module defining its class"""
+        module = sys.modules[type(model).__module__]
+        self.module = module.__name__
+        self.name = next(name for name, value in vars(module).items() if value is model)
+        self.method = method
+    
+    def __call__(self, *args: Any) -> Any:
+        """Call the method in the current process"""
+        model = getattr(importlib.import_module(self.module), self.name)
+        return getattr(model, self.method)(*args)
+    
+    def __repr__(self) -> str:
+        return f"{self.module}.{self.name}.{self.method}"
+
+
+class InferencePool:
+    """Dedicated executor for blocking model calls, awaited from the event loop with a timeout
+    
+    A caller that times out or is cancelled (e.g. its client disconnected) stops
+    waiting at once. A call still queued is dropped; one already running can't
+    be interrupted and keeps its worker until it returns, counted in `in_flight`.
+    """
+    
+    def __init__(self, kind: str = INFERENCE_POOL, workers: int = INFERENCE_WORKERS,
+                 timeout: float = INFERENCE_TIMEOUT_SECONDS):
+        """Create a `thread` or `process` pool of `workers` workers"""
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown inference pool kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.lock = threading.Lock()  # done callbacks run on executor threads
+        self.executor = self._create_executor()
+        self.submitted = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.restarts = 0
+    
+    def _create_executor(self) -> Executor:
+        """New executor of the configured kind"""
+        if self.kind == 'process':
+            # spawn rather than fork: forking a process with loaded models and threads can deadlock
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+    
+    def _finished(self, future: Future):
+        """Account for a call that left the executor"""
+        with self.lock:
+            self.in_flight -= 1
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+    
+    def _restart(self, broken: Executor):
+        """Replace an executor whose worker process died (later calls would all fail)"""
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = self._create_executor()
+            self.restarts += 1
+        broken.shutdown(wait=False)
+    
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """fn(*args) on the pool; raises asyncio.TimeoutError after `timeout` seconds (None = pool default, 0 = none)"""
+        timeout = self.timeout if timeout is None else timeout
+        executor = self.executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenExecutor:
+            self._restart(executor)
+            future = self.executor.submit(fn, *args)
+        with self.lock:
+            self.submitted += 1
+            self.in_flight += 1
+        future.add_done_callback(self._finished)
+        
+        try:
+            # Cancelling the wrapper cancels the pool future, which drops it if not yet started
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+        except asyncio.TimeoutError:
+            with self.lock:
+                self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            with self.lock:
+                self.cancelled += 1
+            raise
+        except BrokenExecutor:
+            self._restart(executor)
+            raise
+    
+    def shutdown(self):
+        """Stop accepting calls and drop queued ones; running calls finish in the background"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Pool settings and call counters"""
+        with self.lock:
+            return {
+                'kind': self.kind,
+                'workers': self.workers,
+                'timeout_seconds': self.timeout,
+                'submitted': self.submitted,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'cancelled': self.cancelled,
+                'restarts': self.restarts
+            }
@@ -1,20 +1,32 @@
-from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request, Form, Query, File, UploadFile
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import io
+import json
 import uuid
 import os
+from datetime import datetime
 from typing import List, Optional
 from dotenv import load_dotenv
 
 from models import (
-    ChatMessage, Role, SummaryRequest, SummaryResponse,
+    ChatMessage, Role, Sentiment, TopicCategory, SummaryRequest, SummaryResponse,
     SentimentAnalysisRequest, SentimentAnalysisResponse,
     TopicClassificationRequest, TopicClassificationResponse,
     ChatStats
 )
-from redis_client import RedisClient
+from storage import get_async_storage
+from session_stats import signed_sentiment_score
+from bulk_import import (
+    IMPORT_BATCH_SIZE, ImportProgress, SessionOrder, annotate_async, detect_format, prepare_batches, prefetch
+)
+from bulk_export import ExportFilter, export_messages_async, ndjson_chunks
+from micro_batcher import MicroBatcher
+from inference_pool import InferencePool, ModelMethod
+from inference_cache import cache_stats
 from summarizer import chat_summarizer
 
 # Import simple versions instead of full ML versions
@@ -52,17 +64,46 @@ app.add_middleware(
 )
 
 # Initialize components
-redis_client = RedisClient()
+redis_client = get_async_storage()
 templates = Jinja2Templates(directory="templates")
 
+# Blocking model calls run on a dedicated pool, off the event loop
+inference_pool = InferencePool()
+sentiment_batch_call = ModelMethod(sentiment_analyzer, 'analyze_batch') if sentiment_analyzer else None
+topic_batch_call = ModelMethod(topic_classifier, 'classify_batch') if topic_classifier else None
+
+# Concurrent single-text inference is coalesced into batched model calls
+sentiment_batcher = MicroBatcher(sentiment_batch_call, name="sentiment", pool=inference_pool) if sentiment_analyzer else None
+topic_batcher = MicroBatcher(topic_batch_call, name="topic", pool=inference_pool) if topic_classifier else None
+inference_batchers = {name: batcher for name, batcher in (("sentiment", sentiment_batcher), ("topic", topic_batcher)) if batcher}
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+def check_time(name: str, value: Optional[datetime]) -> Optional[datetime]:
+    """Reject (400) a time parameter with no epoch value; storage compares times as epoch seconds"""
+    if value is not None:
+        try:
+            value.timestamp()
+        except (OverflowError, ValueError, OSError):
+            raise HTTPException(status_code=400, detail=f"Invalid {name}: {value.isoformat()}")
+    return value
+
+
+@app.on_event("shutdown")
+async def close_storage():
+    """Release storage connections and inference workers on shutdown"""
+    await redis_client.close()
+    for batcher in inference_batchers.values():
+        await batcher.close()
+    inference_pool.shutdown()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Main chat interface"""
-    sessions = redis_client.list_sessions()
+    sessions = await redis_client.list_sessions()
     return templates.TemplateResponse("index.html", {"request": request, "sessions": sessions})
 
 
@@ -85,25 +126,28 @@ async def send_message(
             content=content
         )
         
-        # Analyze sentiment and topic (if analyzers are available)
-        sentiment_result = None
-        topic_result = None
+        # Analyze sentiment and topic (if analyzers are available), batched with concurrent requests
+        sentiment_result, topic_result = await asyncio.gather(*[
+            batcher.submit(content) if batcher else asyncio.sleep(0)  # None without an analyzer
+            for batcher in (sentiment_batcher, topic_batcher)
+        ])
         
-        if sentiment_analyzer:
-            sentiment_result = sentiment_analyzer.analyze_sentiment(content)
+        if sentiment_result:
             message.sentiment = sentiment_result.sentiment
+            message.sentiment_score = signed_sentiment_score(sentiment_result.sentiment, sentiment_result.confidence)
         
-        if topic_classifier:
-            topic_result = topic_classifier.classify_topic(content)
+        if topic_result:
             message.topic = topic_result.topic
         
         # Store in Redis
-        success = redis_client.store_message(message)
-        if not success:
+        session_times = await redis_client.store_message(message)
+        if not session_times:
             raise HTTPException(status_code=500, detail="Failed to store message")
         
         response_data = {
             "message_id": message.message_id,
+            "session_created_at": session_times['created_at'],
+            "session_updated_at": session_times['updated_at'],
         }
         
         if sentiment_result:
@@ -117,36 +161,167 @@ async def send_message(
             response_data["confidence"]["topic"] = topic_result.confidence
         
         return response_data
-        
+    
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/chat/session/{session_id}")
-async def get_session(session_id: str):
-    """Get all messages for a session"""
+async def get_session(
+    session_id: str,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    since_ts: Optional[datetime] = Query(None)
+):
+    """Get session messages: all, the newest `limit`, or those after `cursor`/`since_ts`
+    
+    A cursor message that no longer exists (deleted, evicted or expired) gives
+    410 unless `since_ts` is also set; clients then reload the whole session.
+    """
     try:
-        messages = redis_client.get_session_messages(session_id)
-        return {"session_id": session_id, "messages": messages}
+        check_time("since_ts", since_ts)
+        if cursor or since_ts:
+            messages = await redis_client.get_session_messages(
+                session_id, limit=limit, since_message_id=cursor, since_ts=since_ts
+            )
+            if messages is None:
+                raise HTTPException(status_code=410, detail="Cursor message no longer exists; reload the session")
+        else:
+            messages = await redis_client.get_session_messages(
+                session_id, offset=-limit if limit else 0, limit=limit
+            )
+        next_cursor = messages[-1].message_id if messages else cursor
+        return {"session_id": session_id, "messages": messages, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/chat/sessions")
-async def list_sessions():
-    """List all chat sessions"""
+async def list_sessions(
+    cursor: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    order: str = Query("desc", pattern="^(asc|desc)$")
+):
+    """List chat sessions by last activity, newest first, with cursor pagination"""
+    try:
+        sessions = await redis_client.list_sessions(cursor=cursor, limit=limit, order=order)
+        next_cursor = cursor + len(sessions) if limit is not None and len(sessions) == limit else None
+        return {"sessions": sessions, "next_cursor": next_cursor}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1),
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Full-text search over message content, best BM25 match first, with cursor pagination"""
     try:
-        sessions = redis_client.list_sessions()
-        return {"sessions": sessions}
+        found = await redis_client.search_messages(q, offset=cursor, limit=limit)
+        next_cursor = cursor + limit if cursor + limit < found['total'] else None
+        return {"query": q, "total": found['total'], "results": found['results'], "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/messages")
+async def query_messages(
+    topic: Optional[TopicCategory] = Query(None),
+    sentiment: Optional[Sentiment] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Messages by topic and/or sentiment within a time range, newest first, with cursor pagination"""
+    try:
+        found = await redis_client.query_messages(
+            topic, sentiment, check_time("since", since), check_time("until", until), offset=cursor, limit=limit
+        )
+        next_cursor = cursor + limit if cursor + limit < found['total'] else None
+        return {"total": found['total'], "results": found['results'], "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/import")
+async def import_messages(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(jsonl|csv)$"),
+    skip: int = Query(0, ge=0),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    analyze: bool = Query(True)
+):
+    """Bulk-import a JSONL/CSV upload in batches, streaming one NDJSON progress line per batch
+    
+    Each line's `records` counts the input records committed so far; after a
+    failure, upload the same file again with `skip` set to it to resume.
+    """
+    lines = io.TextIOWrapper(file.file, encoding='utf-8', newline='')
+    fmt = format or detect_format(file.filename or '')
+    batches = prefetch(prepare_batches(lines, fmt, batch_size, skip))
+    
+    async def progress_lines():
+        progress = ImportProgress(skip)
+        order = SessionOrder()
+        while True:
+            # Parsing stays off the event loop; inference goes through the shared batchers and pool
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            position, messages, errors = batch
+            try:
+                if analyze:
+                    await annotate_async(messages, sentiment_batcher and sentiment_batcher.submit,
+                                         topic_batcher and topic_batcher.submit)
+                for session_id in order.unseen(messages):
+                    order.note(session_id, await redis_client.get_session_messages(session_id, offset=-1, limit=1))
+                stored = await redis_client.store_messages(order.keep(messages))
+                if stored is None:
+                    raise RuntimeError(f"storage failed to write the batch ending at record {position}")
+            except asyncio.TimeoutError:
+                yield json.dumps({**progress.as_dict(), "error": "Inference timed out"}) + "\n"
+                return
+            except Exception as e:
+                yield json.dumps({**progress.as_dict(), "error": str(e)}) + "\n"
+                return
+            progress.update(position, len(messages), stored, errors)
+            yield json.dumps(progress.as_dict()) + "\n"
+        yield json.dumps({**progress.as_dict(), "done": True, "errors": progress.errors}) + "\n"
+    
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
+
+
+@app.get("/export")
+async def export_sessions(
+    topic: Optional[TopicCategory] = Query(None),
+    sentiment: Optional[Sentiment] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    gzip: bool = Query(False)
+):
+    """Stream every matching message as NDJSON (gzip-compressed with `gzip=true`), reading storage a page at a time"""
+    export_filter = ExportFilter(check_time("since", since), check_time("until", until), topic, sentiment)
+    chunks = ndjson_chunks(export_messages_async(redis_client, export_filter), gzip)
+    if gzip:
+        headers = {"Content-Disposition": 'attachment; filename="export.ndjson.gz"'}
+        return StreamingResponse(chunks, media_type="application/gzip", headers=headers)
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
+
+
 @app.delete("/chat/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a chat session"""
     try:
-        success = redis_client.delete_session(session_id)
+        success = await redis_client.delete_session(session_id)
         if not success:
             raise HTTPException(status_code=404, detail="Session not found")
         return {"message": "Session deleted successfully"}
@@ -194,9 +369,11 @@ async def analyze_sentiment(request: SentimentAnalysisRequest):
         raise HTTPException(status_code=503, detail="Sentiment analyzer not available")
     
     try:
-        result = sentiment_analyzer.analyze_sentiment(request.text)
+        result = await sentiment_batcher.submit(request.text)
         result.session_id = request.session_id
         return result
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -208,8 +385,10 @@ async def analyze_sentiment_batch(texts: List[str]):
         raise HTTPException(status_code=503, detail="Sentiment analyzer not available")
     
     try:
-        results = sentiment_analyzer.analyze_batch(texts)
+        results = await inference_pool.run(sentiment_batch_call, texts)
         return {"results": results}
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -221,9 +400,11 @@ async def classify_topic(request: TopicClassificationRequest):
         raise HTTPException(status_code=503, detail="Topic classifier not available")
     
     try:
-        result = topic_classifier.classify_topic(request.text)
+        result = await topic_batcher.submit(request.text)
         result.session_id = request.session_id
         return result
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -235,8 +416,10 @@ async def classify_topic_batch(texts: List[str]):
         raise HTTPException(status_code=503, detail="Topic classifier not available")
     
     try:
-        results = topic_classifier.classify_batch(texts)
+        results = await inference_pool.run(topic_batch_call, texts)
         return {"results": results}
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -245,7 +428,7 @@ async def classify_topic_batch(texts: List[str]):
 async def get_session_stats(session_id: str):
     """Get statistics for a session"""
     try:
-        stats = redis_client.get_session_stats(session_id)
+        stats = await redis_client.get_session_stats(session_id)
         if not stats:
             raise HTTPException(status_code=404, detail="Session not found")
         return stats
@@ -257,38 +440,37 @@ async def get_session_stats(session_id: str):
 async def get_overview_stats():
     """Get overview statistics for all sessions"""
     try:
-        sessions = redis_client.list_sessions()
-        total_sessions = len(sessions)
-        total_messages = 0
-        
-        for session_id in sessions:
-            stats = redis_client.get_session_stats(session_id)
-            if stats:
-                total_messages += stats.get('total_messages', 0)
-        
-        return {
-            "total_sessions": total_sessions,
-            "total_messages": total_messages,
-            "avg_messages_per_session": total_messages / total_sessions if total_sessions > 0 else 0
-        }
+        return await redis_client.get_overview_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/stats/inference")
+async def get_inference_stats():
+    """Inference pool counters, micro-batching queue depth and batch size histograms, and result cache hit ratios"""
+    # Caches live where models run: with INFERENCE_POOL=process this reports the worker that serves the call
+    cache = await inference_pool.run(cache_stats)
+    return {
+        "pool": inference_pool.stats(),
+        "cache": cache,
+        **{name: batcher.stats() for name, batcher in inference_batchers.items()}
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        redis_health = redis_client.health_check()
+        redis_health = await redis_client.health_check()
         summarizer_health = chat_summarizer.health_check()
         
         sentiment_health = False
         if sentiment_analyzer:
-            sentiment_health = sentiment_analyzer.health_check()
+            sentiment_health = await inference_pool.run(ModelMethod(sentiment_analyzer, 'health_check'))
         
         classifier_health = False
         if topic_classifier:
-            classifier_health = topic_classifier.health_check()
+            classifier_health = await inference_pool.run(ModelMethod(topic_classifier, 'health_check'))
         
         return {
             "status": "healthy" if all([redis_health, summarizer_health]) else "unhealthy",
@@ -297,7 +479,8 @@ async def health_check():
                 "summarizer": summarizer_health,
                 "sentiment_analyzer": sentiment_health,
                 "topic_classifier": classifier_health
-            }
+            },
+            "storage": await redis_client.memory_usage()
         }
     except Exception as e:
         return {
@@ -1,107 +1,238 @@
-import json
+import sys
 import uuid
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from collections import OrderedDict
+from itertools import islice
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
-from models import ChatMessage, ChatSession, Role
+from models import ChatMessage, ChatSession, Sentiment, TopicCategory
+from message_codec import build_message
+from memory_persistence import (
+    MessageLog, OP_STORE, OP_DELETE, OP_SESSION, OP_MESSAGE,
+    store_payload, parse_store, session_payload, parse_session, message_payload, parse_message
+)
+from session_stats import (
+    stat_increments, apply_increments, counter_fields,
+    stats_from_counters, overview_from_counters
+)
+from search_index import InvertedIndex
+from secondary_index import SecondaryIndex, facet_filters
 
 # Load environment variables
 load_dotenv()
 
+# Approximate bytes of the dict and list slots that reference each record
+RECORD_ENTRY_OVERHEAD = 100
+
+
+class MessageRecord:
+    """Compact in-memory message record; built once on write, never re-parsed"""
+    
+    __slots__ = ('session_id', 'role', 'content', 'timestamp', 'message_id', 'sentiment', 'sentiment_score', 'topic', 'position')
+    
+    def __init__(self, message: ChatMessage):
+        """Copy the fields of an already validated ChatMessage"""
+        self.session_id = message.session_id
+        self.role = message.role
+        self.content = message.content
+        self.timestamp = message.timestamp
+        self.message_id = message.message_id
+        self.sentiment = Sentiment(message.sentiment) if message.sentiment else None
+        self.sentiment_score = message.sentiment_score
+        self.topic = TopicCategory(message.topic) if message.topic else None
+        self.position = 0  # index within the session's record list
+    
+    @classmethod
+    def from_fields(cls, fields: Dict[str, Any]) -> 'MessageRecord':
+        """Build a record from trusted, already typed field values (snapshot loading)"""
+        record = cls.__new__(cls)
+        for name, value in fields.items():
+            setattr(record, name, value)
+        record.position = 0
+        return record
+    
+    def to_message(self) -> ChatMessage:
+        """Build a ChatMessage without re-running pydantic validation"""
+        return build_message({
+            'session_id': self.session_id,
+            'role': self.role,
+            'content': self.content,
+            'timestamp': self.timestamp,
+            'message_id': self.message_id,
+            'sentiment': self.sentiment,
+            'sentiment_score': self.sentiment_score,
+            'topic': self.topic
+        })
+    
+    def approx_bytes(self) -> int:
+        """Approximate memory held by this record (shallow sizes of its own objects)"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.content) + sys.getsizeof(self.message_id)
+                + sys.getsizeof(self.timestamp) + RECORD_ENTRY_OVERHEAD)
+
 
 class MemoryClient:
-    """In-memory storage client as alternative to Redis"""
+    """In-memory storage client as alternative to Redis
     
-    def __init__(self):
-        """Initialize in-memory storage"""
-        self.messages = {}  # message_id -> message_data
-        self.sessions = {}  # session_id -> list of message_ids
+    Optionally bounded: once max_messages, max_bytes or max_sessions is exceeded
+    the least recently updated sessions are evicted, and sessions idle for longer
+    than session_ttl seconds expire. A limit of 0 means unbounded.
+    
+    With persist_dir set, every write is also appended to a MessageLog and the
+    state is rebuilt from its latest snapshot plus log tail on startup; reads
+    are served from memory exactly as without persistence.
+    """
+    
+    def __init__(self, max_messages: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_sessions: Optional[int] = None, session_ttl: Optional[float] = None,
+                 persist_dir: Optional[str] = None, snapshot_every: Optional[int] = None):
+        """Initialize in-memory storage, reading unset limits from the environment"""
+        self.messages = {}  # message_id -> MessageRecord
+        self.sessions = {}  # session_id -> list of MessageRecords, oldest first
         self.session_metadata = {}  # session_id -> metadata
+        self.session_index = OrderedDict()  # session_id -> None, least recently updated first
+        self.global_stats = {}  # rollup counters across all sessions
+        self.search_index = InvertedIndex()  # full-text index over message content
+        self.message_index = SecondaryIndex()  # messages by time bucket, topic and sentiment
         
-    def _serialize_message(self, message: ChatMessage) -> str:
-        """Serialize ChatMessage to JSON string"""
-        return json.dumps({
-            'session_id': message.session_id,
-            'role': message.role.value,
-            'content': message.content,
-            'timestamp': message.timestamp.isoformat(),
-            'message_id': message.message_id,
-            'sentiment': message.sentiment.value if message.sentiment else None,
-            'topic': message.topic.value if message.topic else None
-        })
-    
-    def _deserialize_message(self, message_data: str) -> ChatMessage:
-        """Deserialize JSON string to ChatMessage"""
-        data = json.loads(message_data)
-        return ChatMessage(
-            session_id=data['session_id'],
-            role=Role(data['role']),
-            content=data['content'],
-            timestamp=datetime.fromisoformat(data['timestamp']),
-            message_id=data['message_id'],
-            sentiment=data['sentiment'],
-            topic=data['topic']
-        )
+        self.max_messages = max_messages if max_messages is not None else int(os.getenv('MEMORY_MAX_MESSAGES', 0))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('MEMORY_MAX_BYTES', 0))
+        self.max_sessions = max_sessions if max_sessions is not None else int(os.getenv('MEMORY_MAX_SESSIONS', 0))
+        self.session_ttl = session_ttl if session_ttl is not None else float(os.getenv('SESSION_TTL_SECONDS', 0))
+        self.total_bytes = 0  # approximate bytes held by stored records
+        self.evicted_sessions = 0
+        self.expired_sessions = 0
+        
+        persist_dir = persist_dir if persist_dir is not None else os.getenv('MEMORY_PERSIST_DIR', '')
+        self.snapshot_every = snapshot_every if snapshot_every is not None else int(os.getenv('MEMORY_SNAPSHOT_EVERY', 100000))
+        self.log = None
+        self.recovery = None
+        if persist_dir:
+            self.log = MessageLog(persist_dir)
+            self.recovery = self.log.recover(self._replay)
+            print(f"Recovered {len(self.messages)} messages in {len(self.sessions)} sessions "
+                  f"from {persist_dir} in {self.recovery['seconds']:.2f}s")
     
-    def _serialize_session(self, session: ChatSession) -> str:
-        """Serialize ChatSession to JSON string"""
-        return json.dumps({
-            'session_id': session.session_id,
-            'messages': [self._serialize_message(msg) for msg in session.messages],
-            'created_at': session.created_at.isoformat(),
-            'updated_at': session.updated_at.isoformat()
-        })
+    def _add_record(self, record: MessageRecord):
+        """Index a record and append it to its session list (chronological, O(1) per message)"""
+        self.messages[record.message_id] = record
+        self.total_bytes += record.approx_bytes()
+        self.search_index.add(record.message_id, record.content)
+        self.message_index.add(record.message_id, record)
+        records = self.sessions.setdefault(record.session_id, [])
+        record.position = len(records)
+        records.append(record)
     
-    def _deserialize_session(self, session_data: str) -> ChatSession:
-        """Deserialize JSON string to ChatSession"""
-        data = json.loads(session_data)
-        return ChatSession(
-            session_id=data['session_id'],
-            messages=[self._deserialize_message(msg) for msg in data['messages']],
-            created_at=datetime.fromisoformat(data['created_at']),
-            updated_at=datetime.fromisoformat(data['updated_at'])
-        )
+    def _apply_message(self, message: ChatMessage, now: datetime) -> Dict[str, Any]:
+        """Add a message and update its session metadata and counters; return the metadata"""
+        self._add_record(MessageRecord(message))
+        
+        # Update session metadata and stats counters
+        metadata = self._update_session_metadata(message.session_id, now)
+        increments = stat_increments(message)
+        apply_increments(metadata, increments)
+        apply_increments(self.global_stats, increments)
+        metadata.setdefault('first_message_at', message.timestamp)
+        metadata['last_message_at'] = message.timestamp
+        return metadata
     
-    def store_message(self, message: ChatMessage) -> bool:
-        """Store a chat message in memory"""
+    def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a chat message in memory and return the session's created/updated timestamps"""
         try:
-            # Generate message ID if not provided
+            self._expire_sessions()
+            
+            # Generate message ID if not provided; a known ID is not stored twice
             if not message.message_id:
                 message.message_id = str(uuid.uuid4())
+            elif message.message_id in self.messages:
+                metadata = self.session_metadata[self.messages[message.message_id].session_id]
+                return {
+                    'created_at': metadata['created_at'],
+                    'updated_at': metadata['updated_at']
+                }
             
-            # Store individual message
-            self.messages[message.message_id] = self._serialize_message(message)
-            
-            # Add message to session list
-            if message.session_id not in self.sessions:
-                self.sessions[message.session_id] = []
-            self.sessions[message.session_id].insert(0, message.message_id)
-            
-            # Update session metadata
-            self._update_session_metadata(message.session_id)
+            # Logged before it is applied, so a failed append leaves memory unchanged
+            now = datetime.now()
+            if self.log is not None:
+                self.log.append(OP_STORE, store_payload(message, now))
+            metadata = self._apply_message(message, now)
             
-            return True
+            self._enforce_limits(message.session_id)
+            if (self.log is not None and self.snapshot_every and self.log.records_since_snapshot >= self.snapshot_every
+                    and not self.log.snapshot_pending):
+                # Capturing is O(sessions); the snapshot file is written on a background thread
+                self.log.schedule_snapshot(self._snapshot_records(self._capture_state()))
+            return {
+                'created_at': metadata['created_at'],
+                'updated_at': metadata['updated_at']
+            }
         except Exception as e:
             print(f"Error storing message: {e}")
-            return False
+            return None
+    
+    def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch of messages and return how many were stored (known message IDs are skipped)
+        
+        Returns None if any message failed; the others stay stored, so the
+        batch can be retried as a whole.
+        """
+        stored = 0
+        failed = False
+        for message in messages:
+            if message.message_id and message.message_id in self.messages:
+                continue
+            if self.store_message(message) is None:
+                failed = True
+            else:
+                stored += 1
+        return None if failed else stored
+    
+    def _window_start(self, records: List[MessageRecord], session_id: str, offset: int,
+                      since_message_id: Optional[str], since_ts: Optional[datetime]) -> Optional[int]:
+        """Index of the first record in the requested window; None for an unknown cursor without since_ts"""
+        if since_message_id:
+            record = self.messages.get(since_message_id)
+            if record is not None and record.session_id == session_id:
+                return record.position + 1
+            if since_ts is None:
+                return None
+        
+        if since_ts is not None:
+            # Records are appended in time order, so binary search the first newer one;
+            # epoch seconds compare naive and timezone-aware timestamps alike
+            since = since_ts.timestamp()
+            low, high = 0, len(records)
+            while low < high:
+                mid = (low + high) // 2
+                if records[mid].timestamp.timestamp() <= since:
+                    low = mid + 1
+                else:
+                    high = mid
+            return low
+        
+        # A negative offset counts back from the newest message; the window is not
+        # shifted when it reaches past the oldest one (same as RedisClient)
+        return len(records) + offset if offset < 0 else offset
     
-    def get_session_messages(self, session_id: str) -> List[ChatMessage]:
-        """Retrieve all messages for a session"""
+    def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                             since_message_id: Optional[str] = None,
+                             since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages in chronological order, optionally windowed
+        
+        offset/limit select a slice (negative offset counts from the newest message);
+        since_message_id or since_ts return only messages after that point. None
+        means since_message_id is not in the session (deleted, evicted or expired)
+        and no since_ts was given to fall back on: reload the session instead.
+        """
         try:
-            if session_id not in self.sessions:
-                return []
-            
-            message_ids = self.sessions[session_id]
-            messages = []
-            
-            for message_id in reversed(message_ids):  # Reverse to get chronological order
-                if message_id in self.messages:
-                    message_data = self.messages[message_id]
-                    messages.append(self._deserialize_message(message_data))
-            
-            return messages
+            self._expire_sessions()
+            records = self.sessions.get(session_id, [])
+            start = self._window_start(records, session_id, offset, since_message_id, since_ts)
+            if start is None:
+                return None
+            end = len(records) if limit is None else min(start + max(limit, 0), len(records))
+            return [record.to_message() for record in records[max(start, 0):max(end, 0)]]
         except Exception as e:
             print(f"Error retrieving messages: {e}")
             return []
@@ -128,87 +259,225 @@ class MemoryClient:
             print(f"Error retrieving session: {e}")
             return None
     
-    def _update_session_metadata(self, session_id: str):
-        """Update session metadata"""
-        try:
-            if session_id not in self.session_metadata:
-                self.session_metadata[session_id] = {
-                    'created_at': datetime.now(),
-                    'updated_at': datetime.now()
-                }
-            else:
-                self.session_metadata[session_id]['updated_at'] = datetime.now()
-        except Exception as e:
-            print(f"Error updating session metadata: {e}")
+    def _update_session_metadata(self, session_id: str, now: datetime) -> Dict[str, Any]:
+        """Update session metadata and return it"""
+        metadata = self.session_metadata.get(session_id)
+        if metadata is None:
+            metadata = {'created_at': now, 'updated_at': now}
+            self.session_metadata[session_id] = metadata
+        else:
+            metadata['updated_at'] = now
+        
+        # Keep the index ordered by updated_at: touched sessions move to the end
+        self.session_index[session_id] = None
+        self.session_index.move_to_end(session_id)
+        return metadata
+    
+    def _over_limits(self) -> bool:
+        """Whether any configured cap is exceeded"""
+        return bool(
+            (self.max_messages and len(self.messages) > self.max_messages)
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+            or (self.max_sessions and len(self.sessions) > self.max_sessions)
+        )
+    
+    def _enforce_limits(self, current_session_id: str):
+        """Evict least recently updated sessions until within caps, never the session just written"""
+        while self._over_limits():
+            oldest = next(iter(self.session_index))
+            if oldest == current_session_id:
+                break
+            self.delete_session(oldest)
+            self.evicted_sessions += 1
+    
+    def _expire_sessions(self):
+        """Drop sessions idle for longer than the TTL (O(1) when none are due)"""
+        if not self.session_ttl:
+            return
+        cutoff = datetime.now() - timedelta(seconds=self.session_ttl)
+        while self.session_index:
+            oldest = next(iter(self.session_index))
+            if self.session_metadata[oldest]['updated_at'] >= cutoff:
+                break
+            self.delete_session(oldest)
+            self.expired_sessions += 1
     
-    def list_sessions(self) -> List[str]:
-        """List all session IDs"""
+    def list_sessions(self, cursor: int = 0, limit: Optional[int] = None, order: str = "desc") -> List[str]:
+        """List session IDs by last update (newest first by default), starting at rank `cursor`"""
         try:
-            return list(self.sessions.keys())
+            self._expire_sessions()
+            ordered = reversed(self.session_index) if order != "asc" else iter(self.session_index)
+            stop = None if limit is None else cursor + limit
+            return list(islice(ordered, cursor, stop))
         except Exception as e:
             print(f"Error listing sessions: {e}")
             return []
     
+    def _remove_session(self, session_id: str) -> bool:
+        """Drop a session's records, metadata and counters; False if it does not exist"""
+        if session_id not in self.sessions:
+            return False
+        
+        # Remove all messages for this session
+        for record in self.sessions[session_id]:
+            self.messages.pop(record.message_id, None)
+            self.total_bytes -= record.approx_bytes()
+            self.search_index.remove(record.message_id, record.content)
+            self.message_index.remove(record.message_id, record)
+        
+        # Remove session
+        del self.sessions[session_id]
+        
+        # Remove metadata and roll its counters out of the global stats
+        metadata = self.session_metadata.pop(session_id, {})
+        apply_increments(self.global_stats, counter_fields(metadata), sign=-1)
+        self.session_index.pop(session_id, None)
+        return True
+    
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and all its messages"""
         try:
-            if session_id in self.sessions:
-                # Remove all messages for this session
-                message_ids = self.sessions[session_id]
-                for message_id in message_ids:
-                    if message_id in self.messages:
-                        del self.messages[message_id]
-                
-                # Remove session
-                del self.sessions[session_id]
-                
-                # Remove metadata
-                if session_id in self.session_metadata:
-                    del self.session_metadata[session_id]
-                
-                return True
-            return False
+            if session_id not in self.sessions:
+                return False
+            if self.log is not None:
+                self.log.append(OP_DELETE, session_id.encode('utf-8'))
+            return self._remove_session(session_id)
         except Exception as e:
             print(f"Error deleting session: {e}")
             return False
     
     def get_session_stats(self, session_id: str) -> Dict[str, Any]:
-        """Get statistics for a session"""
+        """Get statistics for a session from its write-time counters"""
         try:
-            messages = self.get_session_messages(session_id)
-            if not messages:
-                return {}
-            
-            # Count messages by role
-            user_messages = len([m for m in messages if m.role == Role.USER])
-            assistant_messages = len([m for m in messages if m.role == Role.ASSISTANT])
-            
-            # Count sentiments
-            sentiment_counts = {}
-            for message in messages:
-                if message.sentiment:
-                    sentiment = message.sentiment.value
-                    sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
-            
-            # Count topics
-            topic_counts = {}
-            for message in messages:
-                if message.topic:
-                    topic = message.topic.value
-                    topic_counts[topic] = topic_counts.get(topic, 0) + 1
-            
-            return {
-                'total_messages': len(messages),
-                'user_messages': user_messages,
-                'assistant_messages': assistant_messages,
-                'sentiment_distribution': sentiment_counts,
-                'topic_distribution': topic_counts,
-                'session_duration': (messages[-1].timestamp - messages[0].timestamp).total_seconds() if len(messages) > 1 else 0
-            }
+            self._expire_sessions()
+            return stats_from_counters(session_id, self.session_metadata.get(session_id, {}))
         except Exception as e:
             print(f"Error getting session stats: {e}")
             return {}
     
+    def get_overview_stats(self) -> Dict[str, Any]:
+        """Get overview statistics for all sessions from the global rollup counters"""
+        try:
+            self._expire_sessions()
+            return overview_from_counters(len(self.sessions), self.global_stats)
+        except Exception as e:
+            print(f"Error getting overview stats: {e}")
+            return {}
+    
+    def search_messages(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Messages matching a full-text query, ranked by BM25, with the total match count"""
+        try:
+            self._expire_sessions()
+            total, hits = self.search_index.search(query, offset, limit)
+            results = []
+            for message_id, score in hits:
+                record = self.messages[message_id]
+                results.append({
+                    'session_id': record.session_id,
+                    'message_id': message_id,
+                    'score': score,
+                    'message': record.to_message()
+                })
+            return {'total': total, 'results': results}
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def query_messages(self, topic: Optional[str] = None, sentiment: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """Messages matching a topic and/or sentiment within [since, until], newest first, with the total"""
+        try:
+            self._expire_sessions()
+            facets = facet_filters(topic, sentiment)
+            total, message_ids = self.message_index.query(facets, since, until, offset, limit)
+            results = []
+            for message_id in message_ids:
+                record = self.messages[message_id]
+                results.append({
+                    'session_id': record.session_id,
+                    'message_id': message_id,
+                    'message': record.to_message()
+                })
+            return {'total': total, 'results': results}
+        except Exception as e:
+            print(f"Error querying messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def _replay(self, op: int, payload: memoryview):
+        """Apply one snapshot or log record during recovery (never re-logged)"""
+        if op == OP_STORE:
+            message, now = parse_store(payload)
+            self._apply_message(message, now)
+        elif op == OP_DELETE:
+            self._remove_session(bytes(payload).decode('utf-8'))
+        elif op == OP_SESSION:
+            session_id, metadata = parse_session(payload)
+            self.sessions[session_id] = []
+            self.session_metadata[session_id] = metadata
+            self.session_index[session_id] = None
+            apply_increments(self.global_stats, counter_fields(metadata))
+        elif op == OP_MESSAGE:
+            self._add_record(MessageRecord.from_fields(parse_message(payload)))
+    
+    def _capture_state(self) -> List[Tuple[str, Dict[str, Any], List[MessageRecord], int]]:
+        """Point-in-time view for a snapshot: per session a metadata copy, its record list and length
+        
+        Record lists are only appended to (a removed session's list is dropped
+        whole), so the first `length` records stay as captured without copying.
+        """
+        return [(session_id, dict(self.session_metadata[session_id]), self.sessions[session_id],
+                 len(self.sessions[session_id])) for session_id in self.session_index]
+    
+    def _snapshot_records(self, state: List[Tuple[str, Dict[str, Any], List[MessageRecord], int]]):
+        """Captured state as snapshot records, sessions in least recently updated order"""
+        for session_id, metadata, records, length in state:
+            yield OP_SESSION, session_payload(session_id, metadata)
+            for record in islice(records, length):
+                yield OP_MESSAGE, message_payload(record.to_message())
+    
+    def snapshot(self) -> bool:
+        """Write a compacted snapshot now and drop the log segments it replaces"""
+        if self.log is None:
+            return False
+        try:
+            state = self._capture_state()
+            self.log.write_snapshot(self.log.begin_snapshot(), self._snapshot_records(state))
+            return True
+        except Exception as e:
+            print(f"Error writing snapshot: {e}")
+            return False
+    
+    def close(self):
+        """Flush and close the persistence log, if any"""
+        if self.log is not None:
+            self.log.close()
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Approximate memory accounting and configured limits, for sizing workers"""
+        return {
+            'backend': 'memory',
+            'sessions': len(self.sessions),
+            'messages': len(self.messages),
+            'approx_bytes': self.total_bytes,
+            'search_terms': len(self.search_index.postings),
+            'index_buckets': len(self.message_index.buckets),
+            'evicted_sessions': self.evicted_sessions,
+            'expired_sessions': self.expired_sessions,
+            'limits': {
+                'max_messages': self.max_messages,
+                'max_bytes': self.max_bytes,
+                'max_sessions': self.max_sessions,
+                'session_ttl': self.session_ttl
+            },
+            'persistence': None if self.log is None else {
+                'directory': self.log.directory,
+                'segment': self.log.segment,
+                'records_since_snapshot': self.log.records_since_snapshot,
+                'recovery': self.recovery
+            }
+        }
+    
     def health_check(self) -> bool:
         """Check if the storage is healthy"""
         try:
@@ -218,4 +487,25 @@ class MemoryClient:
             return True
         except Exception as e:
             print(f"Health check failed: {e}")
-            return False 
\ No newline at end of file
+            return False 
+
+class AsyncMemoryClient:
+    """Awaitable facade over MemoryClient so API handlers treat every backend alike"""
+    
+    def __init__(self, client: Optional[MemoryClient] = None):
+        """Wrap an existing MemoryClient or create a new one"""
+        self.client = client or MemoryClient()
+    
+    def __getattr__(self, name: str):
+        """Expose MemoryClient methods as coroutines (in-memory calls never block on I/O)"""
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+    
+    async def close(self):
+        """Flush the persistence log, if any"""
+        self.client.close()
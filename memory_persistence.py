@@ -0,0 +1,311 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+from dotenv import load_dotenv
+
+from models import ChatMessage
+from message_codec import CODECS, decode_message
+
+# Load environment variables
+load_dotenv()
+
+# Record types. Append only: existing codes are persisted.
+OP_STORE = 1    # log: store time + encoded message
+OP_DELETE = 2   # log: session id
+OP_SESSION = 3  # snapshot: session id + metadata, followed by its messages
+OP_MESSAGE = 4  # snapshot: encoded message of the preceding session
+
+# Frame: payload length:u32, crc32(payload, seeded with op):u32, op:u8, then the payload
+_FRAME = struct.Struct('<IIB')
+_STORE_TIME = struct.Struct('<d')
+_CODEC = CODECS['binary']
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".snap"
+SNAPSHOT_MAGIC = b"CSSNAP1\n"
+
+# Metadata fields holding datetimes (serialized as ISO strings in snapshots)
+_TIME_FIELDS = ('created_at', 'updated_at', 'first_message_at', 'last_message_at')
+
+
+def frame(op: int, payload: bytes) -> bytes:
+    """Frame a record for the log or a snapshot"""
+    return _FRAME.pack(len(payload), zlib.crc32(payload, op), op) + payload
+
+
+def iter_frames(buffer, offset: int = 0) -> Iterator[Tuple[int, memoryview, int]]:
+    """Yield (op, payload, end offset) until the buffer ends or a torn/corrupt record is found"""
+    view = memoryview(buffer)
+    size = len(view)
+    while offset + _FRAME.size <= size:
+        length, crc, op = _FRAME.unpack_from(view, offset)
+        start = offset + _FRAME.size
+        end = start + length
+        if end > size:
+            return
+        payload = view[start:end]
+        if zlib.crc32(payload, op) != crc:
+            return
+        yield op, payload, end
+        offset = end
+
+
+def store_payload(message: ChatMessage, now: datetime) -> bytes:
+    """OP_STORE payload: the session update time and the encoded message"""
+    return _STORE_TIME.pack(now.timestamp()) + _CODEC.encode(message)
+
+
+def parse_store(payload: memoryview) -> Tuple[ChatMessage, datetime]:
+    """Inverse of store_payload"""
+    (now,) = _STORE_TIME.unpack_from(payload, 0)
+    return decode_message(bytes(payload[_STORE_TIME.size:])), datetime.fromtimestamp(now)
+
+
+def session_payload(session_id: str, metadata: Dict[str, Any]) -> bytes:
+    """OP_SESSION payload: session id plus its metadata and counters"""
+    fields = {key: value.isoformat() if key in _TIME_FIELDS else value for key, value in metadata.items()}
+    return json.dumps({'session_id': session_id, 'metadata': fields}).encode('utf-8')
+
+
+def parse_session(payload: memoryview) -> Tuple[str, Dict[str, Any]]:
+    """Inverse of session_payload"""
+    data = json.loads(bytes(payload))
+    metadata = {
+        key: datetime.fromisoformat(value) if key in _TIME_FIELDS else value
+        for key, value in data['metadata'].items()
+    }
+    return data['session_id'], metadata
+
+
+def message_payload(message: ChatMessage) -> bytes:
+    """OP_MESSAGE payload"""
+    return _CODEC.encode(message)
+
+
+def parse_message(payload: memoryview) -> Dict[str, Any]:
+    """Field values of an OP_MESSAGE payload, without building a ChatMessage"""
+    return _CODEC.decode_fields(bytes(payload))
+
+
+def _numbered(directory: str, prefix: str, suffix: str) -> List[Tuple[int, str]]:
+    """(number, path) of files named <prefix><number><suffix>, in ascending order"""
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            number = name[len(prefix):-len(suffix)]
+            if number.isdigit():
+                found.append((int(number), os.path.join(directory, name)))
+    return sorted(found)
+
+
+class MessageLog:
+    """Append-only segment log with fsync batching and compacted snapshots
+    
+    A snapshot numbered N holds the full state at the moment segment N was
+    opened, so recovery loads it and replays only segments >= N. Snapshots
+    are written off the append path: begin_snapshot only rotates the segment,
+    and the file is written on a background thread from records captured then.
+    """
+    
+    def __init__(self, directory: str, fsync_batch: Optional[int] = None,
+                 fsync_interval: Optional[float] = None, segment_bytes: Optional[int] = None):
+        """Prepare the log directory; call recover() before appending"""
+        self.directory = directory
+        self.fsync_batch = fsync_batch or int(os.getenv('MEMORY_LOG_FSYNC_BATCH', 256))
+        self.fsync_interval = fsync_interval or float(os.getenv('MEMORY_LOG_FSYNC_INTERVAL', 1.0))
+        self.segment_bytes = segment_bytes or int(os.getenv('MEMORY_LOG_SEGMENT_BYTES', 64 * 1024 * 1024))
+        os.makedirs(directory, exist_ok=True)
+        
+        self.lock = threading.Lock()
+        self.file = None
+        self.segment = 0
+        self.pending = 0  # records written since the last fsync
+        self.records_since_snapshot = 0
+        self.snapshot_lock = threading.Lock()  # one snapshot file written at a time
+        self.snapshot_number = None  # newest snapshot written by this process
+        self._stop = threading.Event()
+        self._flusher = None
+        self._snapshotter = None  # background thread writing a scheduled snapshot
+    
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:010d}{SEGMENT_SUFFIX}")
+    
+    def _snapshot_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{number:010d}{SNAPSHOT_SUFFIX}")
+    
+    def _replay_file(self, path: str, apply: Callable[[int, memoryview], None], offset: int = 0) -> Tuple[int, int]:
+        """Apply every intact record of a file through mmap; return (records, valid end offset)"""
+        if os.path.getsize(path) <= offset:
+            return 0, offset
+        count = 0
+        end = offset
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for op, payload, end in iter_frames(buffer, offset):
+                apply(op, payload)
+                count += 1
+            payload = None  # release the last slice before the mmap closes
+        return count, end
+    
+    def recover(self, apply: Callable[[int, memoryview], None]) -> Dict[str, Any]:
+        """Load the latest snapshot, replay the log tail after it and open the log for appending"""
+        started = time.perf_counter()
+        snapshots = _numbered(self.directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX)
+        first_segment = 0
+        snapshot_records = 0
+        if snapshots:
+            first_segment, path = snapshots[-1]
+            snapshot_records, _ = self._replay_file(path, apply, len(SNAPSHOT_MAGIC))
+        
+        replayed = 0
+        segments = [(n, path) for n, path in _numbered(self.directory, SEGMENT_PREFIX, SEGMENT_SUFFIX)
+                    if n >= first_segment]
+        for number, path in segments:
+            count, end = self._replay_file(path, apply)
+            replayed += count
+            if end < os.path.getsize(path):
+                # Torn write from a crash: drop the partial record so appends stay readable
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+        
+        self.segment = segments[-1][0] if segments else first_segment
+        self.file = open(self._segment_path(self.segment), 'ab')
+        self.records_since_snapshot = replayed
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+        return {
+            'snapshot_records': snapshot_records,
+            'log_records': replayed,
+            'seconds': time.perf_counter() - started
+        }
+    
+    def append(self, op: int, payload: bytes):
+        """Append a record; it is fsynced once the batch fills or the interval elapses"""
+        with self.lock:
+            self.file.write(frame(op, payload))
+            self.pending += 1
+            self.records_since_snapshot += 1
+            if self.pending >= self.fsync_batch:
+                self._sync()
+            if self.file.tell() >= self.segment_bytes:
+                self._rotate()
+    
+    def _sync(self):
+        """Flush and fsync pending records (caller holds the lock)"""
+        if self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+    
+    def _rotate(self):
+        """Close the current segment and start the next one (caller holds the lock)"""
+        self._sync()
+        self.file.close()
+        self.segment += 1
+        self.file = open(self._segment_path(self.segment), 'ab')
+    
+    def _flush_periodically(self):
+        """Bound the loss window when writes are too sparse to fill a batch"""
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+    
+    def sync(self):
+        """Force pending records to disk"""
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+    
+    def begin_snapshot(self) -> int:
+        """Start the next segment and return the number of a snapshot of the state at this point
+        
+        The owner captures the state to snapshot right before this call, with
+        no writes in between.
+        """
+        with self.lock:
+            self._rotate()
+            self.records_since_snapshot = 0
+            return self.segment
+    
+    @property
+    def snapshot_pending(self) -> bool:
+        """Whether a scheduled snapshot is still being written"""
+        return self._snapshotter is not None and self._snapshotter.is_alive()
+    
+    def schedule_snapshot(self, records: Iterable[Tuple[int, bytes]]) -> bool:
+        """Begin a snapshot and write `records` on a background thread; False while one is pending
+        
+        `records` must come from a capture that later writes do not change.
+        """
+        if self.snapshot_pending:
+            return False
+        number = self.begin_snapshot()
+        self._snapshotter = threading.Thread(target=self._write_scheduled_snapshot, args=(number, records),
+                                             daemon=True, name="memory-snapshot")
+        self._snapshotter.start()
+        return True
+    
+    def _write_scheduled_snapshot(self, number: int, records: Iterable[Tuple[int, bytes]]):
+        """Background snapshot body; a failure leaves the log to cover the state"""
+        try:
+            self.write_snapshot(number, records)
+        except Exception as e:
+            print(f"Error writing snapshot: {e}")
+    
+    def write_snapshot(self, number: int, records: Iterable[Tuple[int, bytes]]):
+        """Write snapshot `number` (from begin_snapshot) and drop the log it supersedes
+        
+        Appends continue while `records` is consumed; a snapshot older than one
+        already written is discarded.
+        """
+        with self.snapshot_lock:
+            if self.snapshot_number is not None and number <= self.snapshot_number:
+                return
+            path = self._snapshot_path(number)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(SNAPSHOT_MAGIC)
+                for op, payload in records:
+                    f.write(frame(op, payload))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self._fsync_directory()
+            
+            for old, old_path in _numbered(self.directory, SEGMENT_PREFIX, SEGMENT_SUFFIX):
+                if old < number:
+                    os.remove(old_path)
+            for old, old_path in _numbered(self.directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX):
+                if old < number:
+                    os.remove(old_path)
+            self.snapshot_number = number
+    
+    def _fsync_directory(self):
+        """Persist the snapshot rename (no-op where directories cannot be opened)"""
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    
+    def close(self):
+        """Stop the flusher, finish a pending snapshot, fsync and close the current segment"""
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+                self.file.close()
+                self.file = None
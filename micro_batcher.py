@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+from inference_pool import InferencePool
+
+# Load environment variables
+load_dotenv()
+
+# Most requests coalesced into one model call
+INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', 32))
+
+# Longest a request waits for others to share its batch, in milliseconds (0 = never wait)
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', 8))
+
+# Upper bounds of the histogram buckets; larger values land in a final open bucket
+HISTOGRAM_BOUNDS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum for the mean"""
+    
+    def __init__(self, bounds: Sequence[int] = HISTOGRAM_BOUNDS):
+        """Create an empty histogram over the given bucket upper bounds"""
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+    
+    def observe(self, value: int):
+        """Count one value"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Non-empty buckets (`<=bound`, or `>last` for the open one), count and mean"""
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count},
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched calls of a blocking batch function
+    
+    Requests queue up while a worker task waits for the first one, then for up
+    to `max_wait_ms` more (or until `max_batch_size` are pending), and hands the
+    whole batch to `batch_fn` on `pool` (or a default thread) so the event loop
+    keeps serving.
+    Requests arriving while a batch runs form the next one. Each request's
+    queue depth on arrival and each batch's size are recorded in histograms.
+    """
+    
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = INFERENCE_MAX_BATCH,
+                 max_wait_ms: float = INFERENCE_MAX_WAIT_MS, name: str = "batcher",
+                 pool: Optional[InferencePool] = None):
+        """Batch calls to `batch_fn`, which maps a list of items to a list of results in the same order"""
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.pool = pool
+        self.pending: Deque[Tuple[Any, asyncio.Future]] = deque()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.arrived: Optional[asyncio.Event] = None  # set while requests are pending
+        self.full: Optional[asyncio.Event] = None  # set while a whole batch is pending
+        self.queue_depth = Histogram()
+        self.batch_sizes = Histogram()
+        self.failed_batches = 0
+        self.busy_seconds = 0.0
+    
+    def _start(self):
+        """Start the worker on the running loop (again after a loop change or a crash)"""
+        loop = asyncio.get_running_loop()
+        if self.worker is not None and self.loop is loop and not self.worker.done():
+            return
+        if self.loop is not loop:
+            self.pending.clear()  # futures of another loop can't be resolved here
+        self.loop = loop
+        self.arrived = asyncio.Event()
+        self.full = asyncio.Event()
+        self.worker = loop.create_task(self._run(), name=f"{self.name}-batcher")
+    
+    async def submit(self, item: Any) -> Any:
+        """Result of `batch_fn` for one item, computed in a batch with concurrent requests"""
+        self._start()
+        future = self.loop.create_future()
+        self.queue_depth.observe(len(self.pending))
+        self.pending.append((item, future))
+        self.arrived.set()
+        if len(self.pending) >= self.max_batch_size:
+            self.full.set()
+        return await future
+    
+    def _take_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Pop up to max_batch_size pending requests, dropping those whose caller went away"""
+        batch = []
+        while self.pending and len(batch) < self.max_batch_size:
+            item, future = self.pending.popleft()
+            if not future.cancelled():
+                batch.append((item, future))
+        if not self.pending:
+            self.arrived.clear()
+        if len(self.pending) < self.max_batch_size:
+            self.full.clear()
+        return batch
+    
+    async def _run(self):
+        """Worker: collect a batch, run it off the loop, resolve each request's future"""
+        while True:
+            await self.arrived.wait()
+            if self.max_wait > 0 and not self.full.is_set():
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            
+            batch = self._take_batch()
+            if not batch:
+                continue
+            self.batch_sizes.observe(len(batch))
+            started = time.perf_counter()
+            try:
+                items = [item for item, _ in batch]
+                if self.pool:
+                    results = await self.pool.run(self.batch_fn, items)
+                else:
+                    results = await asyncio.to_thread(self.batch_fn, items)
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name} batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                self.failed_batches += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+            
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+    
+    async def close(self):
+        """Stop the worker, failing requests still pending"""
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        while self.pending:
+            _, future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} batcher closed"))
+        self.worker = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Batching settings, queue depth seen by arriving requests and batch size histograms"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'pending': len(self.pending),
+            'batches': self.batch_sizes.count,
+            'requests': self.batch_sizes.total,
+            'failed_batches': self.failed_batches,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'queue_depth': self.queue_depth.as_dict(),
+            'batch_size': self.batch_sizes.as_dict()
+        }
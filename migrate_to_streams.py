@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Migrate chat sessions from the list layout (message:{sid}:{mid} keys plus a
+session:{sid} id list) to the Redis Streams layout (one stream:{sid} per session)
+
+Session metadata, counters and the session index are shared by both layouts and
+are left untouched. Stream ids are derived from message timestamps, so message
+ids change and the session's search postings and secondary index entries are rewritten to the new ids; the old ids are
+mapped to the new ones, so importing an export taken before the migration skips them. Each session is moved in one MULTI/EXEC guarded by WATCH, so it is
+safe to run while the old layout is still taking writes. Sessions that already
+have a stream (for example written after switching to the Streams layout) are
+skipped unless --force is given, which replaces the stream with the legacy messages.
+
+Usage:
+    python migrate_to_streams.py --dry-run
+    python migrate_to_streams.py
+    python migrate_to_streams.py --keep-legacy     # copy without deleting old keys
+    python migrate_to_streams.py --force           # also replace sessions that already have a stream
+"""
+
+import argparse
+import time
+from typing import Optional
+
+import redis
+
+from redis_client import RedisClient, MGET_CHUNK_SIZE, search_postings_key, index_entries_key
+from redis_stream_client import StreamRedisClient, PAYLOAD_FIELD, ORIGIN_FIELD, stream_key, stream_ids_key, next_stream_id
+
+
+def migrate_session(legacy: RedisClient, streams: StreamRedisClient, session_id: str,
+                    keep_legacy: bool = False, force: bool = False) -> Optional[int]:
+    """Move one session into its stream and return the number of messages migrated (None if skipped)"""
+    session_key = f"session:{session_id}"
+    metadata_key = f"session_metadata:{session_id}"
+    key = stream_key(session_id)
+    
+    with legacy.redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(session_key, metadata_key, key)
+                if pipe.exists(key) and not force:
+                    pipe.reset()
+                    return None
+                message_ids = pipe.lrange(session_key, 0, -1)
+                counters = pipe.hgetall(metadata_key)
+                postings = pipe.smembers(search_postings_key(session_id))
+                entries = pipe.smembers(index_entries_key(session_id))
+                messages = legacy.get_session_messages(session_id)
+                
+                pipe.multi()
+                pipe.delete(key, stream_ids_key(session_id))
+                legacy._queue_search_removal(pipe, session_id, postings, counters)
+                pipe.hdel(metadata_key, 'search_docs', 'search_tokens')
+                legacy._queue_index_removal(pipe, session_id, entries)
+                last_id = None
+                for message in messages:
+                    last_id = next_stream_id(message.timestamp, last_id)
+                    origin, message.message_id = message.message_id, None
+                    fields = {PAYLOAD_FIELD: streams._serialize_message(message), ORIGIN_FIELD: origin}
+                    message.message_id = f"{last_id[0]}-{last_id[1]}"
+                    pipe.xadd(key, fields, id=message.message_id)
+                    pipe.hset(stream_ids_key(session_id), origin, message.message_id)
+                    streams._queue_search_index(pipe, message)
+                    streams._queue_message_index(pipe, message)
+                
+                if not keep_legacy:
+                    for start in range(0, len(message_ids), MGET_CHUNK_SIZE):
+                        chunk = message_ids[start:start + MGET_CHUNK_SIZE]
+                        pipe.delete(*[f"message:{session_id}:{msg_id}" for msg_id in chunk])
+                    pipe.delete(session_key, f"session_times:{session_id}")
+                pipe.execute()
+                return len(messages)
+            except redis.WatchError:
+                continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate sessions to the Redis Streams layout")
+    parser.add_argument('--dry-run', action='store_true', help="Only count sessions and messages to migrate")
+    parser.add_argument('--keep-legacy', action='store_true', help="Keep the old list-layout keys")
+    parser.add_argument('--force', action='store_true', help="Replace streams that already exist")
+    args = parser.parse_args()
+    
+    legacy = RedisClient()
+    streams = StreamRedisClient()
+    if not legacy.health_check():
+        print("❌ Redis is not reachable")
+        return
+    
+    session_ids = [
+        session_id for session_id in legacy.list_sessions()
+        if legacy.redis_client.exists(f"session:{session_id}")
+    ]
+    print(f"📦 {len(session_ids)} sessions in the list layout")
+    if args.dry_run:
+        total = sum(legacy.redis_client.llen(f"session:{session_id}") for session_id in session_ids)
+        print(f"Would migrate {total} messages")
+        return
+    
+    started = time.perf_counter()
+    total = 0
+    skipped = 0
+    for i, session_id in enumerate(session_ids, 1):
+        migrated = migrate_session(legacy, streams, session_id, args.keep_legacy, args.force)
+        if migrated is None:
+            skipped += 1
+        else:
+            total += migrated
+        if i % 1000 == 0:
+            print(f"   {i}/{len(session_ids)} sessions, {total} messages")
+    
+    elapsed = time.perf_counter() - started
+    print(f"✅ Migrated {total} messages in {len(session_ids) - skipped} sessions in {elapsed:.1f}s")
+    if skipped:
+        print(f"⏭️  Skipped {skipped} sessions that already have a stream (use --force to replace them)")
+    print("Set STORAGE_BACKEND=redis_streams to serve the new layout")
+
+
+if __name__ == "__main__":
+    main()
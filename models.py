@@ -35,6 +35,7 @@ class ChatMessage(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="Message timestamp")
     message_id: Optional[str] = Field(None, description="Unique message identifier")
     sentiment: Optional[Sentiment] = Field(None, description="Sentiment analysis result")
+    sentiment_score: Optional[float] = Field(None, description="Signed sentiment score (-1 to 1)")
     topic: Optional[TopicCategory] = Field(None, description="Topic classification result")
 
 
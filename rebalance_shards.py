@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Rebalance chat sessions after changing the Redis shard list
+
+Every session whose owner differs between the old and the new hash ring is
+copied key by key (DUMP/RESTORE, keeping TTLs) to its new shard and then
+removed from the old one, moving its index entry, search postings, secondary
+index entries and its share of the global and search stats with it. Works for
+both the list and the Streams layout. With consistent hashing, adding a shard
+to N existing ones moves about 1/(N+1) of the sessions.
+
+The source side of each move is guarded by WATCH, so a session written during
+its move is copied again. Writes routed by the new ring to a session that has
+not been moved yet are overwritten by the move, so switch the application's
+REDIS_SHARDS only after a pass finishes, then run a second pass to pick up
+sessions written to their old shard in between.
+
+Usage:
+    python rebalance_shards.py --from localhost:6379,localhost:6380 --to localhost:6379,localhost:6380,localhost:6381 --dry-run
+    python rebalance_shards.py --from localhost:6379,localhost:6380      # --to defaults to REDIS_SHARDS
+"""
+
+import argparse
+import time
+from collections import Counter
+from typing import Dict, List
+
+import redis
+
+from redis_client import (
+    RedisClient, SESSION_INDEX_KEY, GLOBAL_STATS_KEY, SEARCH_STATS_KEY, SEARCH_TERM_PREFIX, INDEX_BUCKETS_KEY,
+    search_postings_key, index_entries_key
+)
+from redis_stream_client import stream_key, stream_ids_key
+from sharded_redis_client import HashRing, parse_shards
+from secondary_index import bucket_start
+from session_stats import counter_fields
+
+
+def session_keys(session_id: str, message_ids: List[str]) -> List[str]:
+    """Every data key a session may own, in either layout"""
+    keys = [f"message:{session_id}:{msg_id}" for msg_id in message_ids]
+    keys += [f"session:{session_id}", f"session_times:{session_id}", f"session_metadata:{session_id}",
+             stream_key(session_id), stream_ids_key(session_id), search_postings_key(session_id),
+             index_entries_key(session_id)]
+    return keys
+
+
+def search_totals(metadata: Dict[str, str]) -> Dict[str, int]:
+    """A session's share of the search stats"""
+    return {
+        'docs': int(metadata.get('search_docs', 0)),
+        'tokens': int(metadata.get('search_tokens', 0))
+    }
+
+
+def move_session(source: RedisClient, target: RedisClient, session_id: str, score: float) -> int:
+    """Copy a session to the target shard, then delete it from the source; return the keys moved"""
+    session_key = f"session:{session_id}"
+    metadata_key = f"session_metadata:{session_id}"
+    
+    with source.redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(session_key, metadata_key, stream_key(session_id))
+                keys = session_keys(session_id, pipe.lrange(session_key, 0, -1))
+                metadata = pipe.hgetall(metadata_key)
+                counters = counter_fields(metadata)
+                postings = [
+                    (f"{SEARCH_TERM_PREFIX}{term}", f"{session_id}:{message_id}")
+                    for term, _, message_id in (posting.partition(' ') for posting in
+                                                pipe.smembers(search_postings_key(session_id)))
+                ]
+                # Secondary index entries are sorted set members too, scored by timestamp
+                postings += [
+                    (key, f"{session_id}:{message_id}")
+                    for key, _, message_id in (entry.partition(' ') for entry in
+                                               pipe.smembers(index_entries_key(session_id)))
+                ]
+                buckets = {key.rpartition(':')[2] for key, _ in postings if not key.startswith(SEARCH_TERM_PREFIX)}
+                
+                reader = source.redis_client.pipeline(transaction=False)
+                for key in keys:
+                    reader.dump(key)
+                    reader.pttl(key)
+                for term_key, member in postings:
+                    reader.zscore(term_key, member)
+                replies = reader.execute()
+                dumps = [(key, replies[2 * i], replies[2 * i + 1]) for i, key in enumerate(keys)]
+                dumps = [(key, value, ttl) for key, value, ttl in dumps if value is not None]
+                weights = replies[2 * len(keys):]
+                
+                # Counters already on the target (from an interrupted earlier attempt) are
+                # replaced by the restore, so only the difference goes into its rollups
+                previous_metadata = target.redis_client.hgetall(metadata_key)
+                previous = counter_fields(previous_metadata)
+                previous_search = search_totals(previous_metadata)
+                writer = target.redis_client.pipeline(transaction=True)
+                for key, value, ttl in dumps:
+                    writer.restore(key, max(ttl, 0), value, replace=True)
+                for (term_key, member), weight in zip(postings, weights):
+                    if weight is not None:
+                        writer.zadd(term_key, {member: weight})
+                if buckets:
+                    writer.zadd(INDEX_BUCKETS_KEY, {bucket: bucket_start(bucket) for bucket in buckets})
+                writer.zadd(SESSION_INDEX_KEY, {session_id: score})
+                target._queue_increments(writer, GLOBAL_STATS_KEY, {
+                    field: counters.get(field, 0) - previous.get(field, 0)
+                    for field in set(counters) | set(previous)
+                })
+                target._queue_increments(writer, SEARCH_STATS_KEY, {
+                    field: value - previous_search[field] for field, value in search_totals(metadata).items()
+                })
+                writer.execute()
+                
+                pipe.multi()
+                pipe.delete(*keys)
+                for term_key, member in postings:
+                    pipe.zrem(term_key, member)
+                pipe.zrem(SESSION_INDEX_KEY, session_id)
+                source._queue_increments(pipe, GLOBAL_STATS_KEY, {field: -value for field, value in counters.items()})
+                source._queue_increments(pipe, SEARCH_STATS_KEY, {
+                    field: -value for field, value in search_totals(metadata).items()
+                })
+                pipe.execute()
+                return len(dumps)
+            except redis.WatchError:
+                continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move sessions to their owners on a new Redis shard list")
+    parser.add_argument('--from', dest='old', required=True, help="Current shard list (host:port[/db],...)")
+    parser.add_argument('--to', dest='new', default=None, help="New shard list (default: REDIS_SHARDS)")
+    parser.add_argument('--dry-run', action='store_true', help="Only count the sessions that would move")
+    args = parser.parse_args()
+    
+    old_shards = parse_shards(args.old)
+    new_shards = parse_shards(args.new)
+    clients: Dict[str, RedisClient] = {
+        name: RedisClient(host, port, db) for name, host, port, db in old_shards + new_shards
+    }
+    for name, client in clients.items():
+        if not client.health_check():
+            print(f"❌ Redis shard {name} is not reachable")
+            return
+    
+    ring = HashRing(name for name, _, _, _ in new_shards)
+    moves = Counter()
+    started = time.perf_counter()
+    for source_name, _, _, _ in old_shards:
+        source = clients[source_name]
+        sessions = source.redis_client.zrange(SESSION_INDEX_KEY, 0, -1, withscores=True)
+        moved = 0
+        for session_id, score in sessions:
+            target_name = ring.node_for(session_id)
+            if target_name == source_name:
+                continue
+            moves[(source_name, target_name)] += 1
+            if not args.dry_run:
+                move_session(source, clients[target_name], session_id, score)
+            moved += 1
+        print(f"📦 {source_name}: {moved}/{len(sessions)} sessions {'to move' if args.dry_run else 'moved'}")
+    
+    for (source_name, target_name), count in sorted(moves.items()):
+        print(f"   {source_name} -> {target_name}: {count}")
+    if not args.dry_run:
+        print(f"✅ Moved {sum(moves.values())} sessions in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
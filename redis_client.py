@@ -1,112 +1,403 @@
 import redis
-import json
+from redis.client import NEVER_DECODE
 import uuid
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import heapq
+from collections import Counter
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
-from models import ChatMessage, ChatSession, Role
+from models import ChatMessage, ChatSession
+from message_codec import get_codec, encode_message, decode_message
+from session_stats import (
+    stat_increments, counters_for_messages, counter_fields,
+    stats_from_counters, overview_from_counters
+)
+from search_index import tokenize, query_terms, idf, term_weight, posting_score, posting_counts
+from secondary_index import time_bucket, bucket_start, message_facets, facet_filters, time_bounds, BUCKET_SPAN
 
 # Load environment variables
 load_dotenv()
 
+# Maximum number of keys requested by a single MGET when reading a session
+MGET_CHUNK_SIZE = 500
+
+# Sorted set of session ids scored by their updated_at epoch
+SESSION_INDEX_KEY = "sessions_by_update"
+
+# Marker set once the index has been backfilled from pre-index session metadata
+SESSION_INDEX_BUILT_KEY = "sessions_by_update:built"
+
+# Hash of rollup counters across all sessions (same fields as per-session counters)
+GLOBAL_STATS_KEY = "global_stats"
+
+# Maximum number of idle sessions removed by a single retention sweep
+EXPIRY_SWEEP_BATCH = 100
+
+# Full-text search: one sorted set per term whose members are "<session_id>:<message_id>"
+# scored by posting_score (term frequency and message length), plus message and term
+# totals for idf and average length. The built marker names the score format, so
+# postings in an older format are rebuilt on the first query.
+SEARCH_TERM_PREFIX = "search:term:"
+SEARCH_STATS_KEY = "search:stats"
+SEARCH_INDEX_BUILT_KEY = "search:built:tf"
+
+# Postings read per query term; BM25 is computed exactly over their union
+SEARCH_CANDIDATES = 1000
+
+
+# Secondary indexes: per time bucket, a sorted set of all its messages and one per
+# topic and per sentiment value, members "<session_id>:<message_id>" scored by timestamp
+INDEX_BUCKETS_KEY = "index:buckets"  # bucket names scored by their start epoch
+# Names the bucketing (UTC days), so indexes bucketed another way are rebuilt on the first query
+INDEX_BUILT_KEY = "index:built:utc"
+
+# Seconds a query's temporary intersection may outlive the query (if it dies midway)
+INDEX_QUERY_TTL = 60
+
+
+def search_postings_key(session_id: str) -> str:
+    """Set of "<term> <message_id>" postings written for a session, used to clean them up"""
+    return f"search:session:{session_id}"
+
+
+def index_key(bucket: str, facet: Optional[str] = None, value: Optional[str] = None) -> str:
+    """Sorted set of a bucket's messages, or of those with one facet value"""
+    if facet is None:
+        return f"index:all:{bucket}"
+    return f"index:{facet}:{value}:{bucket}"
+
+
+def index_entries_key(session_id: str) -> str:
+    """Set of "<index key> <message_id>" entries written for a session, used to clean them up"""
+    return f"index:session:{session_id}"
+
+
+def score_arg(value: float) -> str:
+    """A score bound as Redis expects it"""
+    if value == float('inf'):
+        return '+inf'
+    if value == float('-inf'):
+        return '-inf'
+    return repr(value)
+
 
 class RedisClient:
     """Redis client for storing and retrieving chat data"""
     
-    def __init__(self):
-        """Initialize Redis connection"""
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, db: Optional[int] = None):
+        """Initialize Redis connection (REDIS_HOST/REDIS_PORT/REDIS_DB unless given)"""
         self.redis_client = redis.Redis(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379)),
-            db=int(os.getenv('REDIS_DB', 0)),
+            host=host or os.getenv('REDIS_HOST', 'localhost'),
+            port=port or int(os.getenv('REDIS_PORT', 6379)),
+            db=int(os.getenv('REDIS_DB', 0)) if db is None else db,
             decode_responses=True
         )
+        self.codec = get_codec()
+        self.session_ttl = int(float(os.getenv('SESSION_TTL_SECONDS', 0)))
+        self._session_index_checked = False
+        self._search_index_checked = False
+        self._message_index_checked = False
+        # Set by storage when a session cache is enabled: writes then PUBLISH
+        # "<origin>:<op>:<session_id>" so other workers' caches stay coherent
+        self.invalidation_channel = None
+        self.invalidation_origin = ''
+    
+    def _serialize_message(self, message: ChatMessage) -> bytes:
+        """Serialize ChatMessage with the configured codec"""
+        return encode_message(message, self.codec)
+    
+    def _deserialize_message(self, message_data: bytes) -> ChatMessage:
+        """Deserialize a payload written by any codec version"""
+        return decode_message(message_data)
+    
+    def _queue_store_message(self, pipe, message: ChatMessage, now: datetime):
+        """Queue all writes for a new message on a transactional pipeline
         
-    def _serialize_message(self, message: ChatMessage) -> str:
-        """Serialize ChatMessage to JSON string"""
-        return json.dumps({
-            'session_id': message.session_id,
-            'role': message.role.value,
-            'content': message.content,
-            'timestamp': message.timestamp.isoformat(),
-            'message_id': message.message_id,
-            'sentiment': message.sentiment.value if message.sentiment else None,
-            'topic': message.topic.value if message.topic else None
-        })
-    
-    def _deserialize_message(self, message_data: str) -> ChatMessage:
-        """Deserialize JSON string to ChatMessage"""
-        data = json.loads(message_data)
-        return ChatMessage(
-            session_id=data['session_id'],
-            role=Role(data['role']),
-            content=data['content'],
-            timestamp=datetime.fromisoformat(data['timestamp']),
-            message_id=data['message_id'],
-            sentiment=data['sentiment'],
-            topic=data['topic']
-        )
+        The first two replies are the search totals and the last is created_at.
+        """
+        # Generate message ID if not provided
+        if not message.message_id:
+            message.message_id = str(uuid.uuid4())
+        
+        self._queue_search_index(pipe, message)
+        self._queue_message_index(pipe, message)
+        
+        # Store individual message; retention is the idle-session sweep's job, so the
+        # keys of an active session never expire one message at a time
+        message_key = f"message:{message.session_id}:{message.message_id}"
+        pipe.set(message_key, self._serialize_message(message))
+        
+        # Add message to session list and to the session's time index
+        session_key = f"session:{message.session_id}"
+        times_key = f"session_times:{message.session_id}"
+        pipe.lpush(session_key, message.message_id)
+        pipe.zadd(times_key, {message.message_id: message.timestamp.timestamp()})
+        
+        # Update per-session stats counters
+        self._queue_session_stats(pipe, message)
+        self._queue_invalidation(pipe, 'store', message.session_id)
+        
+        # Update session metadata (queued last, so the final reply is created_at)
+        self._queue_session_metadata(pipe, message.session_id, now)
     
-    def _serialize_session(self, session: ChatSession) -> str:
-        """Serialize ChatSession to JSON string"""
-        return json.dumps({
-            'session_id': session.session_id,
-            'messages': [self._serialize_message(msg) for msg in session.messages],
-            'created_at': session.created_at.isoformat(),
-            'updated_at': session.updated_at.isoformat()
-        })
-    
-    def _deserialize_session(self, session_data: str) -> ChatSession:
-        """Deserialize JSON string to ChatSession"""
-        data = json.loads(session_data)
-        return ChatSession(
-            session_id=data['session_id'],
-            messages=[self._deserialize_message(msg) for msg in data['messages']],
-            created_at=datetime.fromisoformat(data['created_at']),
-            updated_at=datetime.fromisoformat(data['updated_at'])
-        )
+    def _queue_search_index(self, pipe, message: ChatMessage):
+        """Queue a message's postings, scored by raw term frequency and message length (see posting_score)
+        
+        BM25 weights depend on the corpus-wide average length, so they are
+        computed at query time rather than frozen into the postings.
+        """
+        counts = Counter(tokenize(message.content))
+        length = sum(counts.values())
+        metadata_key = f"session_metadata:{message.session_id}"
+        pipe.hincrby(SEARCH_STATS_KEY, 'docs', 1)
+        pipe.hincrby(SEARCH_STATS_KEY, 'tokens', length)
+        pipe.hincrby(metadata_key, 'search_docs', 1)
+        if not counts:
+            return
+        
+        member = f"{message.session_id}:{message.message_id}"
+        for term, tf in counts.items():
+            pipe.zadd(f"{SEARCH_TERM_PREFIX}{term}", {member: posting_score(tf, length)})
+        pipe.sadd(search_postings_key(message.session_id), *[f"{term} {message.message_id}" for term in counts])
+        pipe.hincrby(metadata_key, 'search_tokens', length)
+    
+    def _queue_search_removal(self, pipe, session_id: str, postings: List[str], counters: Dict[str, str]):
+        """Queue removal of a session's postings and its share of the search totals"""
+        members: Dict[str, List[str]] = {}
+        for posting in postings:
+            term, _, message_id = posting.partition(' ')
+            members.setdefault(term, []).append(f"{session_id}:{message_id}")
+        for term, term_members in members.items():
+            pipe.zrem(f"{SEARCH_TERM_PREFIX}{term}", *term_members)
+        pipe.delete(search_postings_key(session_id))
+        
+        docs = int(counters.get('search_docs', 0))
+        tokens = int(counters.get('search_tokens', 0))
+        if docs:
+            pipe.hincrby(SEARCH_STATS_KEY, 'docs', -docs)
+        if tokens:
+            pipe.hincrby(SEARCH_STATS_KEY, 'tokens', -tokens)
+    
+    def _message_index_keys(self, message: ChatMessage) -> List[str]:
+        """Secondary index sets holding a message: its time bucket and per-bucket topic/sentiment sets"""
+        bucket = time_bucket(message.timestamp)
+        return [index_key(bucket)] + [
+            index_key(bucket, facet, value) for facet, value in message_facets(message).items()
+        ]
+    
+    def _queue_message_index(self, pipe, message: ChatMessage):
+        """Queue a message's secondary index entries: its time bucket and per-bucket topic/sentiment sets"""
+        bucket = time_bucket(message.timestamp)
+        member = f"{message.session_id}:{message.message_id}"
+        keys = self._message_index_keys(message)
+        for key in keys:
+            pipe.zadd(key, {member: message.timestamp.timestamp()})
+        pipe.zadd(INDEX_BUCKETS_KEY, {bucket: bucket_start(bucket)})
+        pipe.sadd(index_entries_key(message.session_id), *[f"{key} {message.message_id}" for key in keys])
+    
+    def _queue_index_removal(self, pipe, session_id: str, entries: List[str]):
+        """Queue removal of a session's secondary index entries
+        
+        Emptied bucket sets disappear with their last member; the bucket stays in
+        INDEX_BUCKETS_KEY and costs one empty count per query over its day.
+        """
+        members: Dict[str, List[str]] = {}
+        for entry in entries:
+            key, _, message_id = entry.partition(' ')
+            members.setdefault(key, []).append(f"{session_id}:{message_id}")
+        for key, key_members in members.items():
+            pipe.zrem(key, *key_members)
+        pipe.delete(index_entries_key(session_id))
+    
+    def _queue_message_removal(self, pipe, message: ChatMessage):
+        """Queue the inverse of one stored message's postings, index entries and counters (not its payload)"""
+        counts = Counter(tokenize(message.content))
+        length = sum(counts.values())
+        metadata_key = f"session_metadata:{message.session_id}"
+        member = f"{message.session_id}:{message.message_id}"
+        pipe.hincrby(SEARCH_STATS_KEY, 'docs', -1)
+        pipe.hincrby(SEARCH_STATS_KEY, 'tokens', -length)
+        pipe.hincrby(metadata_key, 'search_docs', -1)
+        if counts:
+            for term in counts:
+                pipe.zrem(f"{SEARCH_TERM_PREFIX}{term}", member)
+            pipe.srem(search_postings_key(message.session_id), *[f"{term} {message.message_id}" for term in counts])
+            pipe.hincrby(metadata_key, 'search_tokens', -length)
+        
+        keys = self._message_index_keys(message)
+        for key in keys:
+            pipe.zrem(key, member)
+        pipe.srem(index_entries_key(message.session_id), *[f"{key} {message.message_id}" for key in keys])
+        
+        decrements = {field: -amount for field, amount in stat_increments(message).items()}
+        self._queue_increments(pipe, metadata_key, decrements)
+        self._queue_increments(pipe, GLOBAL_STATS_KEY, decrements)
+    
+    def _queue_invalidation(self, pipe, op: str, session_id: str):
+        """Queue a PUBLISH announcing a changed session to other workers' session caches"""
+        if self.invalidation_channel:
+            pipe.publish(self.invalidation_channel, f"{self.invalidation_origin}:{op}:{session_id}")
     
-    def store_message(self, message: ChatMessage) -> bool:
-        """Store a chat message in Redis"""
+    def _store_result(self, results: List[Any], now: datetime) -> Dict[str, Any]:
+        """Build the store_message return value from the pipeline replies"""
+        return {
+            'created_at': datetime.fromisoformat(results[-1]),
+            'updated_at': now
+        }
+    
+    def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a chat message in one MULTI/EXEC round-trip and return the session's created/updated timestamps"""
         try:
-            # Generate message ID if not provided
-            if not message.message_id:
-                message.message_id = str(uuid.uuid4())
-            
-            # Store individual message
-            message_key = f"message:{message.session_id}:{message.message_id}"
-            self.redis_client.set(message_key, self._serialize_message(message))
-            
-            # Add message to session list
-            session_key = f"session:{message.session_id}"
-            self.redis_client.lpush(session_key, message.message_id)
-            
-            # Update session metadata
-            self._update_session_metadata(message.session_id)
-            
-            return True
+            now = datetime.now()
+            pipe = self.redis_client.pipeline(transaction=True)
+            self._queue_store_message(pipe, message, now)
+            results = pipe.execute()
+            return self._store_result(results, now)
         except Exception as e:
             print(f"Error storing message: {e}")
-            return False
+            return None
     
-    def get_session_messages(self, session_id: str) -> List[ChatMessage]:
-        """Retrieve all messages for a session"""
+    def _queue_exists_checks(self, pipe, messages: List[ChatMessage]) -> Tuple[List[ChatMessage], List[ChatMessage]]:
+        """Queue existence checks for a batch; return its messages (each message_id once) and those checked
+        
+        Every entry of the checked list gets one reply, truthy when its message is already stored.
+        """
+        unique = {}
+        for message in messages:
+            if not message.message_id:
+                message.message_id = str(uuid.uuid4())
+            unique.setdefault((message.session_id, message.message_id), message)
+        for session_id, message_id in unique:
+            pipe.exists(f"message:{session_id}:{message_id}")
+        candidates = list(unique.values())
+        return candidates, candidates
+    
+    def _unstored_messages(self, candidates: List[ChatMessage], checked: List[ChatMessage],
+                           replies: List[Any]) -> List[ChatMessage]:
+        """Candidates whose existence check found nothing, in batch order"""
+        stored = {id(message) for message, exists in zip(checked, replies) if exists}
+        return [message for message in candidates if id(message) not in stored]
+    
+    def _new_messages(self, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """Messages of a batch that are not stored yet, in one pipelined round-trip"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        candidates, checked = self._queue_exists_checks(pipe, messages)
+        replies = pipe.execute() if checked else []
+        return self._unstored_messages(candidates, checked, replies)
+    
+    def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch of messages in one MULTI/EXEC round-trip and return how many were stored (None on failure)
+        
+        Messages whose message_id is already stored (or repeated in the batch)
+        are skipped, so re-importing a dump is harmless.
+        """
         try:
-            session_key = f"session:{session_id}"
-            message_ids = self.redis_client.lrange(session_key, 0, -1)
+            messages = self._new_messages(messages)
+            if not messages:
+                return 0
             
-            messages = []
-            for msg_id in message_ids:
-                message_key = f"message:{session_id}:{msg_id}"
-                message_data = self.redis_client.get(message_key)
+            now = datetime.now()
+            pipe = self.redis_client.pipeline(transaction=True)
+            for message in messages:
+                self._queue_store_message(pipe, message, now)
+            pipe.execute()
+            return len(messages)
+        except Exception as e:
+            print(f"Error storing messages: {e}")
+            return None
+    
+    def _queue_fetch_messages(self, pipe, session_id: str, message_ids: List[str]):
+        """Queue chunked MGETs for the given message ids"""
+        for start in range(0, len(message_ids), MGET_CHUNK_SIZE):
+            chunk = message_ids[start:start + MGET_CHUNK_SIZE]
+            # Payloads are binary, so bypass the client's response decoding
+            keys = [f"message:{session_id}:{msg_id}" for msg_id in chunk]
+            pipe.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+    
+    def _decode_fetched(self, results: List[List[Optional[str]]]) -> List[ChatMessage]:
+        """Decode the replies of _queue_fetch_messages, skipping missing payloads"""
+        messages = []
+        for payloads in results:
+            for message_data in payloads:
                 if message_data:
                     messages.append(self._deserialize_message(message_data))
-            
-            # Sort by timestamp
-            messages.sort(key=lambda x: x.timestamp)
-            return messages
+        return messages
+    
+    def _fetch_messages(self, session_id: str, message_ids: List[str]) -> List[ChatMessage]:
+        """Fetch message payloads for the given ids in a single pipelined round-trip"""
+        if not message_ids:
+            return []
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_fetch_messages(pipe, session_id, message_ids)
+        return self._decode_fetched(pipe.execute())
+    
+    def _window_bounds(self, offset: int, limit: Optional[int]) -> Tuple[int, int]:
+        """Translate a chronological offset/limit window into LRANGE bounds on the newest-first list
+        
+        A negative offset counts from the newest message, so offset=-50 is the tail.
+        """
+        if offset < 0:
+            start = 0 if limit is None else max(-offset - limit, 0)
+            return start, -offset - 1
+        start = 0 if limit is None else -(offset + limit)
+        return start, -(offset + 1)
+    
+    def _after_position_bounds(self, position: int, limit: Optional[int]) -> Tuple[int, int]:
+        """LRANGE bounds for the messages newer than the one at `position` in the newest-first list"""
+        start = 0 if limit is None else max(position - limit, 0)
+        return start, position - 1
+    
+    def _window_message_ids(self, session_id: str, offset: int, limit: Optional[int],
+                            since_message_id: Optional[str], since_ts: Optional[datetime]) -> Optional[List[str]]:
+        """Resolve a window to chronological message ids in at most two round-trips (None: unknown cursor)"""
+        session_key = f"session:{session_id}"
+        
+        if since_message_id:
+            position = self.redis_client.lpos(session_key, since_message_id)
+            if position is not None:
+                if position == 0:
+                    return []
+                start, end = self._after_position_bounds(position, limit)
+                message_ids = self.redis_client.lrange(session_key, start, end)
+                message_ids.reverse()
+                return message_ids
+            if since_ts is None:
+                return None
+        
+        if since_ts is not None:
+            return self.redis_client.zrangebyscore(
+                f"session_times:{session_id}", f"({since_ts.timestamp()}", "+inf",
+                start=0 if limit is not None else None, num=limit
+            )
+        
+        start, end = self._window_bounds(offset, limit)
+        message_ids = self.redis_client.lrange(session_key, start, end)
+        
+        # Ids are LPUSHed, so the list is newest-first; reversing it yields
+        # append order and no timestamp sort is needed
+        message_ids.reverse()
+        return message_ids
+    
+    def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                             since_message_id: Optional[str] = None,
+                             since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages in chronological order, optionally windowed
+        
+        offset/limit select a slice (negative offset counts from the newest message);
+        since_message_id or since_ts return only messages after that point. None
+        means since_message_id is not in the session (deleted or expired) and no
+        since_ts was given to fall back on: reload the session instead.
+        """
+        try:
+            if limit is not None and limit <= 0:
+                return []
+            message_ids = self._window_message_ids(session_id, offset, limit, since_message_id, since_ts)
+            if message_ids is None:
+                return None
+            return self._fetch_messages(session_id, message_ids)
         except Exception as e:
             print(f"Error retrieving session messages: {e}")
             return []
@@ -122,100 +413,539 @@ class RedisClient:
             metadata_key = f"session_metadata:{session_id}"
             metadata = self.redis_client.hgetall(metadata_key)
             
-            created_at = datetime.fromisoformat(metadata.get('created_at', datetime.now().isoformat()))
-            updated_at = datetime.fromisoformat(metadata.get('updated_at', datetime.now().isoformat()))
-            
-            return ChatSession(
-                session_id=session_id,
-                messages=messages,
-                created_at=created_at,
-                updated_at=updated_at
-            )
+            return self._build_session(session_id, messages, metadata)
         except Exception as e:
             print(f"Error retrieving session: {e}")
             return None
     
-    def _update_session_metadata(self, session_id: str):
-        """Update session metadata"""
+    def _build_session(self, session_id: str, messages: List[ChatMessage], metadata: Dict[str, str]) -> ChatSession:
+        """Assemble a ChatSession from its messages and metadata hash"""
+        created_at = datetime.fromisoformat(metadata.get('created_at', datetime.now().isoformat()))
+        updated_at = datetime.fromisoformat(metadata.get('updated_at', datetime.now().isoformat()))
+        
+        return ChatSession(
+            session_id=session_id,
+            messages=messages,
+            created_at=created_at,
+            updated_at=updated_at
+        )
+    
+    def _queue_session_metadata(self, pipe, session_id: str, now: datetime):
+        """Queue session metadata and index updates on a pipeline; the last reply is created_at"""
+        metadata_key = f"session_metadata:{session_id}"
+        
+        # HSETNX makes "is this session new?" atomic across concurrent writers
+        pipe.hsetnx(metadata_key, 'created_at', now.isoformat())
+        pipe.hset(metadata_key, 'updated_at', now.isoformat())
+        pipe.zadd(SESSION_INDEX_KEY, {session_id: now.timestamp()})
+        pipe.hget(metadata_key, 'created_at')
+    
+    def _queue_increments(self, pipe, key: str, increments: Dict[str, Any]):
+        """Queue HINCRBY/HINCRBYFLOAT calls for a set of counter increments"""
+        for field, amount in increments.items():
+            if isinstance(amount, float):
+                pipe.hincrbyfloat(key, field, amount)
+            else:
+                pipe.hincrby(key, field, amount)
+    
+    def _queue_session_stats(self, pipe, message: ChatMessage):
+        """Queue counter increments for a message on the session metadata and global rollup hashes"""
+        metadata_key = f"session_metadata:{message.session_id}"
+        increments = stat_increments(message)
+        self._queue_increments(pipe, metadata_key, increments)
+        self._queue_increments(pipe, GLOBAL_STATS_KEY, increments)
+        pipe.hsetnx(metadata_key, 'first_message_at', message.timestamp.isoformat())
+        pipe.hset(metadata_key, 'last_message_at', message.timestamp.isoformat())
+    
+    def _index_scores(self, session_ids: List[str], updated_ats: List[Optional[str]]) -> Dict[str, float]:
+        """Map session ids to their index score (updated_at epoch)"""
+        return {
+            session_id: datetime.fromisoformat(updated_at).timestamp() if updated_at else 0
+            for session_id, updated_at in zip(session_ids, updated_ats)
+        }
+    
+    def rebuild_session_index(self) -> int:
+        """Rebuild the session index from session metadata using SCAN (for pre-index data)"""
         try:
-            metadata_key = f"session_metadata:{session_id}"
-            now = datetime.now().isoformat()
-            
-            # Check if session exists
-            if not self.redis_client.exists(metadata_key):
-                self.redis_client.hset(metadata_key, 'created_at', now)
+            pipe = self.redis_client.pipeline(transaction=False)
+            session_ids = []
+            for key in self.redis_client.scan_iter(match="session_metadata:*", count=1000):
+                session_ids.append(key.split(':', 1)[1])
+                pipe.hget(key, 'updated_at')
             
-            self.redis_client.hset(metadata_key, 'updated_at', now)
+            scores = self._index_scores(session_ids, pipe.execute())
+            if scores:
+                self.redis_client.zadd(SESSION_INDEX_KEY, scores)
+            self.redis_client.set(SESSION_INDEX_BUILT_KEY, datetime.now().isoformat())
+            return len(scores)
         except Exception as e:
-            print(f"Error updating session metadata: {e}")
+            print(f"Error rebuilding session index: {e}")
+            return 0
+    
+    def _expiry_cutoff(self) -> str:
+        """Exclusive index score below which sessions are past their TTL"""
+        return f"({(datetime.now() - timedelta(seconds=self.session_ttl)).timestamp()}"
+    
+    def expire_sessions(self) -> int:
+        """Remove up to EXPIRY_SWEEP_BATCH sessions idle for longer than the TTL
+        
+        Each session goes whole, like MemoryClient's expiry: its messages,
+        postings and index entries, metadata, index entry and its share of the
+        global stats.
+        """
+        if not self.session_ttl:
+            return 0
+        session_ids = self.redis_client.zrangebyscore(
+            SESSION_INDEX_KEY, "-inf", self._expiry_cutoff(), start=0, num=EXPIRY_SWEEP_BATCH
+        )
+        for session_id in session_ids:
+            self.delete_session(session_id)
+        return len(session_ids)
+    
+    def _prepare_session_index(self):
+        """Sweep expired sessions and backfill the index once per process"""
+        self.expire_sessions()
+        if not self._session_index_checked:
+            if not self.redis_client.exists(SESSION_INDEX_BUILT_KEY):
+                self.rebuild_session_index()
+            self._session_index_checked = True
     
-    def list_sessions(self) -> List[str]:
-        """List all session IDs"""
+    def list_sessions(self, cursor: int = 0, limit: Optional[int] = None, order: str = "desc") -> List[str]:
+        """List session IDs by last update (newest first by default), starting at rank `cursor`"""
         try:
-            pattern = "session_metadata:*"
-            keys = self.redis_client.keys(pattern)
-            return [key.split(':')[1] for key in keys]
+            self._prepare_session_index()
+            end = -1 if limit is None else cursor + limit - 1
+            if order == "asc":
+                return self.redis_client.zrange(SESSION_INDEX_KEY, cursor, end)
+            return self.redis_client.zrevrange(SESSION_INDEX_KEY, cursor, end)
         except Exception as e:
             print(f"Error listing sessions: {e}")
             return []
     
+    def list_sessions_scored(self, cursor: int = 0, limit: Optional[int] = None,
+                             order: str = "desc") -> List[Tuple[str, float]]:
+        """Like list_sessions, with each session's updated_at epoch (for merging across shards)"""
+        try:
+            self._prepare_session_index()
+            end = -1 if limit is None else cursor + limit - 1
+            if order == "asc":
+                return self.redis_client.zrange(SESSION_INDEX_KEY, cursor, end, withscores=True)
+            return self.redis_client.zrevrange(SESSION_INDEX_KEY, cursor, end, withscores=True)
+        except Exception as e:
+            print(f"Error listing sessions: {e}")
+            return []
+    
+    def _queue_delete_session(self, pipe, session_id: str, message_ids: List[str], counters: Dict[str, str],
+                              postings: List[str], entries: List[str]):
+        """Queue deletion of every key belonging to a session and roll its counters out of the global stats"""
+        for start in range(0, len(message_ids), MGET_CHUNK_SIZE):
+            chunk = message_ids[start:start + MGET_CHUNK_SIZE]
+            pipe.delete(*[f"message:{session_id}:{msg_id}" for msg_id in chunk])
+        pipe.delete(f"session:{session_id}", f"session_metadata:{session_id}", f"session_times:{session_id}")
+        pipe.zrem(SESSION_INDEX_KEY, session_id)
+        self._queue_search_removal(pipe, session_id, postings, counters)
+        self._queue_index_removal(pipe, session_id, entries)
+        self._queue_invalidation(pipe, 'delete', session_id)
+        
+        decrements = {field: -value for field, value in counter_fields(counters).items()}
+        self._queue_increments(pipe, GLOBAL_STATS_KEY, decrements)
+    
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and all its messages"""
         try:
-            # Get all message IDs for the session
             session_key = f"session:{session_id}"
-            message_ids = self.redis_client.lrange(session_key, 0, -1)
-            
-            # Delete individual messages
-            for msg_id in message_ids:
-                message_key = f"message:{session_id}:{msg_id}"
-                self.redis_client.delete(message_key)
+            metadata_key = f"session_metadata:{session_id}"
             
-            # Delete session list and metadata
-            self.redis_client.delete(session_key)
-            self.redis_client.delete(f"session_metadata:{session_id}")
+            with self.redis_client.pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        # WATCH so a concurrent append cannot slip between reading the
+                        # session's counters and subtracting them from the global stats
+                        pipe.watch(session_key, metadata_key)
+                        message_ids = pipe.lrange(session_key, 0, -1)
+                        counters = pipe.hgetall(metadata_key)
+                        postings = pipe.smembers(search_postings_key(session_id))
+                        entries = pipe.smembers(index_entries_key(session_id))
+                        
+                        pipe.multi()
+                        self._queue_delete_session(pipe, session_id, message_ids, counters, postings, entries)
+                        pipe.execute()
+                        break
+                    except redis.WatchError:
+                        continue
             
             return True
         except Exception as e:
             print(f"Error deleting session: {e}")
             return False
     
+    def _backfill_session_stats(self, messages: List[ChatMessage]) -> Dict[str, str]:
+        """Compute counters for a session stored before stats were maintained at write time"""
+        return {field: str(value) for field, value in counters_for_messages(messages).items()}
+    
     def get_session_stats(self, session_id: str) -> Dict[str, Any]:
-        """Get statistics for a session"""
+        """Get statistics for a session from its write-time counters"""
         try:
-            messages = self.get_session_messages(session_id)
-            if not messages:
-                return {}
+            metadata_key = f"session_metadata:{session_id}"
+            counters = self.redis_client.hgetall(metadata_key)
+            if counters and 'total_messages' not in counters:
+                counters = self._backfill_session_stats(self.get_session_messages(session_id))
+                if counters:
+                    self.redis_client.hset(metadata_key, mapping=counters)
+            
+            return stats_from_counters(session_id, counters)
+        except Exception as e:
+            print(f"Error getting session stats: {e}")
+            return {}
+    
+    def rebuild_global_stats(self) -> Dict[str, float]:
+        """Recompute the global rollup from per-session counters (one-time migration)"""
+        totals: Dict[str, float] = {}
+        for session_id in self.list_sessions():
+            # get_session_stats backfills counters for pre-counter sessions
+            self.get_session_stats(session_id)
+            counters = self.redis_client.hgetall(f"session_metadata:{session_id}")
+            for field, value in counter_fields(counters).items():
+                totals[field] = totals.get(field, 0) + value
+        
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(GLOBAL_STATS_KEY)
+        pipe.hset(GLOBAL_STATS_KEY, mapping={**totals, 'built_at': datetime.now().isoformat()})
+        pipe.execute()
+        return totals
+    
+    def overview_counters(self) -> Tuple[int, Dict[str, Any]]:
+        """Session count and global rollup counters, rebuilding the rollup if it was never built"""
+        self.expire_sessions()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zcard(SESSION_INDEX_KEY)
+        pipe.hgetall(GLOBAL_STATS_KEY)
+        total_sessions, counters = pipe.execute()
+        
+        if 'built_at' not in counters:
+            counters = self.rebuild_global_stats()
+            total_sessions = self.redis_client.zcard(SESSION_INDEX_KEY)
+        return total_sessions, counters
+    
+    def get_overview_stats(self) -> Dict[str, Any]:
+        """Get overview statistics for all sessions from the global rollup counters"""
+        try:
+            return overview_from_counters(*self.overview_counters())
+        except Exception as e:
+            print(f"Error getting overview stats: {e}")
+            return {}
+    
+    def _reindex_session(self, session_id: str) -> int:
+        """Replace a session's postings with freshly computed ones; return the messages indexed"""
+        metadata_key = f"session_metadata:{session_id}"
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(metadata_key)
+                    counters = pipe.hgetall(metadata_key)
+                    postings = pipe.smembers(search_postings_key(session_id))
+                    messages = self.get_session_messages(session_id)
+                    
+                    pipe.multi()
+                    self._queue_search_removal(pipe, session_id, postings, counters)
+                    pipe.hdel(metadata_key, 'search_docs', 'search_tokens')
+                    for message in messages:
+                        self._queue_search_index(pipe, message)
+                    pipe.execute()
+                    return len(messages)
+                except redis.WatchError:
+                    continue
+    
+    def rebuild_search_index(self) -> int:
+        """Re-index every session's messages (for data stored before search existed)"""
+        try:
+            total = sum(self._reindex_session(session_id) for session_id in self.list_sessions())
+            self.redis_client.set(SEARCH_INDEX_BUILT_KEY, datetime.now().isoformat())
+            return total
+        except Exception as e:
+            print(f"Error rebuilding search index: {e}")
+            return 0
+    
+    def _prepare_search_index(self):
+        """Backfill the search index once, the first time this deployment is searched"""
+        if not self._search_index_checked:
+            if not self.redis_client.exists(SEARCH_INDEX_BUILT_KEY):
+                self.rebuild_search_index()
+            self._search_index_checked = True
+    
+    def _queue_search_candidates(self, pipe, terms: List[str]):
+        """Queue the message/term totals, each term's document frequency and its top SEARCH_CANDIDATES postings"""
+        pipe.hmget(SEARCH_STATS_KEY, 'docs', 'tokens')
+        for term in terms:
+            pipe.zcard(f"{SEARCH_TERM_PREFIX}{term}")
+        for term in terms:
+            pipe.zrevrange(f"{SEARCH_TERM_PREFIX}{term}", 0, SEARCH_CANDIDATES - 1, withscores=True)
+    
+    def _search_candidates(self, terms: List[str], replies: List[Any]) -> Tuple[Dict[str, float], float, Dict[str, Dict[str, float]]]:
+        """idf per indexed query term's posting key, the average message length and the candidates' posting scores"""
+        docs, tokens = (int(value or 0) for value in replies[0])
+        idfs = {}
+        candidates: Dict[str, Dict[str, float]] = {}
+        for term, doc_freq, entries in zip(terms, replies[1:len(terms) + 1], replies[len(terms) + 1:]):
+            if not doc_freq:
+                continue
+            key = f"{SEARCH_TERM_PREFIX}{term}"
+            idfs[key] = idf(max(docs, doc_freq), doc_freq)
+            for member, score in entries:
+                candidates.setdefault(member, {})[key] = score
+        avg_length = tokens / docs if docs and tokens else 1.0
+        return idfs, avg_length, candidates
+    
+    def _queue_candidate_scores(self, pipe, idfs: Dict[str, float], members: List[str]):
+        """Queue each term's posting scores for every candidate (the ones outside its top postings)"""
+        for key in idfs:
+            pipe.zmscore(key, members)
+    
+    def _note_candidate_scores(self, idfs: Dict[str, float], candidates: Dict[str, Dict[str, float]],
+                               members: List[str], replies: List[Any]):
+        """Complete the candidates' posting scores from the ZMSCORE replies"""
+        for key, scores in zip(idfs, replies):
+            for member, score in zip(members, scores):
+                if score is not None:
+                    candidates[member][key] = score
+    
+    def _rank_candidates(self, idfs: Dict[str, float], avg_length: float, candidates: Dict[str, Dict[str, float]],
+                         offset: int, limit: int) -> List[Tuple[str, str, float]]:
+        """(session_id, message_id, BM25 score) of one page of the candidates, best first"""
+        scored = []
+        for member, postings in candidates.items():
+            score = 0.0
+            for key, packed in postings.items():
+                tf, length = posting_counts(packed)
+                score += idfs[key] * term_weight(tf, length, avg_length)
+            scored.append((score, member))
+        hits = []
+        for score, member in heapq.nlargest(offset + limit, scored)[offset:]:
+            session_id, _, message_id = member.rpartition(':')
+            hits.append((session_id, message_id, score))
+        return hits
+    
+    def _queue_fetch_hits(self, pipe, hits: List[Tuple[str, str, float]]):
+        """Queue one MGET for the payloads of the hit messages"""
+        keys = [f"message:{session_id}:{message_id}" for session_id, message_id, _ in hits]
+        pipe.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+    
+    def _decode_hits(self, replies: List[Any]) -> List[Optional[ChatMessage]]:
+        """Decoded hit messages in hit order, None where the message has expired"""
+        return [self._deserialize_message(payload) if payload else None for payload in replies[0]]
+    
+    def _search_results(self, total: int, hits: List[Tuple[str, str, float]],
+                        messages: List[Optional[ChatMessage]]) -> Dict[str, Any]:
+        """Shape search_messages' return value, skipping hits whose message is gone"""
+        results = [
+            {'session_id': session_id, 'message_id': message_id, 'score': score, 'message': message}
+            for (session_id, message_id, score), message in zip(hits, messages) if message is not None
+        ]
+        return {'total': total, 'results': results}
+    
+    def search_messages(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Messages matching a full-text query, ranked by BM25, with the number of ranked candidates
+        
+        Each term contributes its SEARCH_CANDIDATES postings with the highest
+        term frequency (shortest messages first on ties), and BM25 is computed
+        exactly over their union with the current average length. At most three
+        round-trips: term statistics with the candidates, the candidates' other
+        term frequencies (multi-term queries only), and one MGET for the page.
+        `total` counts the candidates, so it is capped per term.
+        """
+        try:
+            terms = query_terms(query)
+            if not terms or limit <= 0:
+                return {'total': 0, 'results': []}
+            self._prepare_search_index()
             
-            user_messages = len([m for m in messages if m.role == Role.USER])
-            assistant_messages = len([m for m in messages if m.role == Role.ASSISTANT])
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_search_candidates(pipe, terms)
+            idfs, avg_length, candidates = self._search_candidates(terms, pipe.execute())
+            if not candidates:
+                return {'total': 0, 'results': []}
             
-            # Calculate sentiment distribution
-            sentiments = [m.sentiment for m in messages if m.sentiment]
-            sentiment_dist = {}
-            if sentiments:
-                for sentiment in sentiments:
-                    sentiment_dist[sentiment.value] = sentiment_dist.get(sentiment.value, 0) + 1
+            if len(idfs) > 1:
+                members = list(candidates)
+                pipe = self.redis_client.pipeline(transaction=False)
+                self._queue_candidate_scores(pipe, idfs, members)
+                self._note_candidate_scores(idfs, candidates, members, pipe.execute())
+            total = len(candidates)
+            hits = self._rank_candidates(idfs, avg_length, candidates, offset, limit)
+            if not hits:
+                return {'total': total, 'results': []}
             
-            # Calculate topic distribution
-            topics = [m.topic for m in messages if m.topic]
-            topic_dist = {}
-            if topics:
-                for topic in topics:
-                    topic_dist[topic.value] = topic_dist.get(topic.value, 0) + 1
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_fetch_hits(pipe, hits)
+            return self._search_results(total, hits, self._decode_hits(pipe.execute()))
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def _reindex_session_facets(self, session_id: str) -> int:
+        """Replace a session's secondary index entries with fresh ones; return the messages indexed"""
+        metadata_key = f"session_metadata:{session_id}"
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(metadata_key)
+                    entries = pipe.smembers(index_entries_key(session_id))
+                    messages = self.get_session_messages(session_id)
+                    
+                    pipe.multi()
+                    self._queue_index_removal(pipe, session_id, entries)
+                    for message in messages:
+                        self._queue_message_index(pipe, message)
+                    pipe.execute()
+                    return len(messages)
+                except redis.WatchError:
+                    continue
+    
+    def rebuild_message_index(self) -> int:
+        """Re-index every session's messages by bucket, topic and sentiment (for data stored before the indexes)"""
+        try:
+            total = sum(self._reindex_session_facets(session_id) for session_id in self.list_sessions())
+            self.redis_client.set(INDEX_BUILT_KEY, datetime.now().isoformat())
+            return total
+        except Exception as e:
+            print(f"Error rebuilding message index: {e}")
+            return 0
+    
+    def _prepare_message_index(self):
+        """Backfill the secondary indexes once, the first time this deployment queries them"""
+        if not self._message_index_checked:
+            if not self.redis_client.exists(INDEX_BUILT_KEY):
+                self.rebuild_message_index()
+            self._message_index_checked = True
+    
+    def _queue_query_buckets(self, pipe, low: float, high: float):
+        """Queue the names of the buckets overlapping [low, high], newest first"""
+        pipe.zrevrangebyscore(INDEX_BUCKETS_KEY, score_arg(high), score_arg(low - BUCKET_SPAN))
+    
+    def _queue_query_counts(self, pipe, buckets: List[str], facets: Dict[str, str],
+                            low: float, high: float) -> Tuple[List[str], List[str]]:
+        """Queue one match count per bucket, last; return each bucket's result key and the temporary keys
+        
+        With several facets the bucket's sets are intersected into a temporary key
+        (ZINTERSTORE costs O(smallest set) per bucket); otherwise the set is read directly.
+        """
+        query_id = uuid.uuid4().hex
+        keys, temporary = [], []
+        for bucket in buckets:
+            sources = [index_key(bucket, facet, value) for facet, value in facets.items()] or [index_key(bucket)]
+            if len(sources) == 1:
+                keys.append(sources[0])
+                continue
+            key = f"index:query:{query_id}:{bucket}"
+            pipe.zinterstore(key, sources, aggregate='MAX')
+            pipe.expire(key, INDEX_QUERY_TTL)
+            keys.append(key)
+            temporary.append(key)
+        for key in keys:
+            pipe.zcount(key, score_arg(low), score_arg(high))
+        return keys, temporary
+    
+    def _queue_query_page(self, pipe, keys: List[str], counts: List[int], low: float, high: float,
+                          offset: int, limit: int) -> int:
+        """Queue newest-first reads of the buckets covering one page; return how many were queued"""
+        queued = 0
+        for key, count in zip(keys, counts):
+            if limit <= 0:
+                break
+            if offset >= count:
+                offset -= count
+                continue
+            take = min(count - offset, limit)
+            pipe.zrevrangebyscore(key, score_arg(high), score_arg(low), start=offset, num=take, withscores=True)
+            queued += 1
+            offset = 0
+            limit -= take
+        return queued
+    
+    def _query_hits(self, pages: List[List[Tuple[str, float]]]) -> List[Tuple[str, str, float]]:
+        """(session_id, message_id, timestamp) of the page's members"""
+        hits = []
+        for entries in pages:
+            for member, score in entries:
+                session_id, _, message_id = member.rpartition(':')
+                hits.append((session_id, message_id, score))
+        return hits
+    
+    def _query_results(self, total: int, hits: List[Tuple[str, str, float]],
+                       messages: List[Optional[ChatMessage]]) -> Dict[str, Any]:
+        """Shape query_messages' return value, skipping hits whose message is gone"""
+        results = [
+            {'session_id': session_id, 'message_id': message_id, 'message': message}
+            for (session_id, message_id, _), message in zip(hits, messages) if message is not None
+        ]
+        return {'total': total, 'results': results}
+    
+    def query_messages(self, topic: Optional[str] = None, sentiment: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """Messages matching a topic and/or sentiment within [since, until], newest first, with the total
+        
+        Reads only the index sets of the time buckets in range: bucket names,
+        per-bucket counts (intersecting facets inside Redis), the page's
+        members and their payloads, in four round-trips.
+        """
+        try:
+            if limit <= 0:
+                return {'total': 0, 'results': []}
+            self._prepare_message_index()
+            facets = facet_filters(topic, sentiment)
+            low, high = time_bounds(since, until)
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_query_buckets(pipe, low, high)
+            buckets = pipe.execute()[0]
+            if not buckets:
+                return {'total': 0, 'results': []}
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            keys, temporary = self._queue_query_counts(pipe, buckets, facets, low, high)
+            counts = pipe.execute()[-len(keys):]
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            queued = self._queue_query_page(pipe, keys, counts, low, high, offset, limit)
+            if temporary:
+                pipe.delete(*temporary)
+            hits = self._query_hits(pipe.execute()[:queued])
+            if not hits:
+                return {'total': sum(counts), 'results': []}
             
-            return {
-                'session_id': session_id,
-                'total_messages': len(messages),
-                'user_messages': user_messages,
-                'assistant_messages': assistant_messages,
-                'sentiment_distribution': sentiment_dist,
-                'topic_distribution': topic_dist,
-                'created_at': messages[0].timestamp if messages else None,
-                'last_activity': messages[-1].timestamp if messages else None
-            }
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_fetch_hits(pipe, hits)
+            return self._query_results(sum(counts), hits, self._decode_hits(pipe.execute()))
         except Exception as e:
-            print(f"Error getting session stats: {e}")
+            print(f"Error querying messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def _memory_report(self, sessions: int, keys: int, info: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape memory_usage from ZCARD, DBSIZE and INFO memory replies"""
+        return {
+            'backend': 'redis',
+            'sessions': sessions,
+            'keys': keys,
+            'used_memory': info.get('used_memory'),
+            'used_memory_peak': info.get('used_memory_peak'),
+            'maxmemory': info.get('maxmemory'),
+            'maxmemory_policy': info.get('maxmemory_policy'),
+            'limits': {'session_ttl': self.session_ttl}
+        }
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Redis memory accounting and retention settings, for sizing"""
+        try:
+            sessions = self.redis_client.zcard(SESSION_INDEX_KEY)
+            keys = self.redis_client.dbsize()
+            try:
+                info = self.redis_client.info('memory')
+            except redis.ResponseError:
+                info = {}
+            return self._memory_report(sessions, keys, info)
+        except Exception as e:
+            print(f"Error getting memory usage: {e}")
             return {}
     
     def health_check(self) -> bool:
@@ -0,0 +1,519 @@
+import re
+from collections import Counter
+import redis
+from redis.client import NEVER_DECODE
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import os
+from dotenv import load_dotenv
+
+from models import ChatMessage
+from message_codec import encode_message
+from redis_client import RedisClient, SESSION_INDEX_KEY, GLOBAL_STATS_KEY, search_postings_key, index_entries_key
+from async_redis_client import AsyncRedisClient
+from session_stats import counter_fields
+
+# Load environment variables
+load_dotenv()
+
+# Stream entry field holding the encoded message
+PAYLOAD_FIELD = "d"
+
+# Stream entry field holding the id the message was stored with, when the stream id replaced it
+ORIGIN_FIELD = "o"
+
+# XRANGE page size used when since_ts filtering has to read ahead
+STREAM_PAGE_SIZE = 500
+
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+
+def stream_key(session_id: str) -> str:
+    """Key of the stream holding a session's messages"""
+    return f"stream:{session_id}"
+
+
+def stream_ids_key(session_id: str) -> str:
+    """Key of the hash mapping a session's original message ids to the stream ids that replaced them"""
+    return f"stream_ids:{session_id}"
+
+
+def next_stream_id(timestamp: datetime, last_id: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """Explicit stream id derived from a message timestamp, kept strictly increasing"""
+    ms = int(timestamp.timestamp() * 1000)
+    if last_id is None or ms > last_id[0]:
+        return ms, 0
+    return last_id[0], last_id[1] + 1
+
+
+class StreamRedisClient(RedisClient):
+    """Redis client storing each session as one Redis Stream
+    
+    Stream ids double as message ids, so a session costs one stream key plus
+    its metadata hash instead of two keys per message. Ids are explicit,
+    derived from message timestamps (see next_stream_id), and each write adds
+    the entries together with their search, index and stats updates in one
+    MULTI/EXEC. An id a message arrived with (for example a uuid from another
+    backend's export) is kept in stream_ids_key, so storing it again is a
+    no-op. Windows and time ranges are XRANGE/XREVRANGE reads, STREAM_MAXLEN
+    caps each stream exactly (trimmed entries leave the search, index and
+    stats counters in the same MULTI), and deleting a session removes the
+    stream and its id map.
+    Metadata, counters and the session index are shared with RedisClient.
+    """
+    
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, db: Optional[int] = None):
+        """Initialize the Redis connection and stream settings"""
+        super().__init__(host, port, db)
+        self.stream_maxlen = int(os.getenv('STREAM_MAXLEN', 0))
+    
+    def _queue_store_message(self, pipe, message: ChatMessage, now: datetime, origin: Optional[str] = None):
+        """Queue a message's postings, index entries, XADD at its explicit id (see _assign_ids), stats and metadata
+        
+        `origin` is the id the message arrived with; when the stream id differs it
+        is mapped in stream_ids_key and kept in the entry. As in RedisClient, the
+        last reply is created_at.
+        """
+        self._queue_search_index(pipe, message)
+        self._queue_message_index(pipe, message)
+        
+        # The id is restored from the entry on read, so the payload leaves it out
+        key = stream_key(message.session_id)
+        message_id, message.message_id = message.message_id, None
+        payload = encode_message(message, self.codec)
+        message.message_id = message_id
+        fields = {PAYLOAD_FIELD: payload}
+        if origin and origin != message_id:
+            fields[ORIGIN_FIELD] = origin
+            pipe.hset(stream_ids_key(message.session_id), origin, message_id)
+        pipe.xadd(key, fields, id=message_id)
+        
+        self._queue_session_stats(pipe, message)
+        self._queue_invalidation(pipe, 'store', message.session_id)
+        self._queue_session_metadata(pipe, message.session_id, now)
+    
+    def _queue_tail_reads(self, pipe, counts: Dict[str, int]):
+        """Queue a read of each stream's newest entry and, under STREAM_MAXLEN, its length and oldest entries"""
+        for session_id, count in counts.items():
+            key = stream_key(session_id)
+            pipe.execute_command('XREVRANGE', key, '+', '-', 'COUNT', 1, **{NEVER_DECODE: []})
+            if self.stream_maxlen:
+                pipe.xlen(key)
+                pipe.execute_command('XRANGE', key, '-', '+', 'COUNT', min(count, self.stream_maxlen),
+                                     **{NEVER_DECODE: []})
+    
+    def _tail_replies(self, replies: List[Any]) -> List[Any]:
+        """Each stream's newest-entry reply out of the tail reads"""
+        return replies[0::3] if self.stream_maxlen else replies
+    
+    def _excess(self, length: int, count: int) -> int:
+        """Entries a stream of `length` must give up to take `count` new messages under STREAM_MAXLEN"""
+        return max(length + min(count, self.stream_maxlen) - self.stream_maxlen, 0)
+    
+    def _queue_long_trim_reads(self, pipe, counts: Dict[str, int], replies: List[Any]) -> List[int]:
+        """Queue a full read of the entries to trim where the tail reads fell short; return those streams' positions
+        
+        This only happens after STREAM_MAXLEN was lowered below a stream's length.
+        """
+        short = []
+        for index, (session_id, count) in enumerate(counts.items()):
+            excess = self._excess(replies[3 * index + 1], count)
+            if excess > len(replies[3 * index + 2]):
+                pipe.execute_command('XRANGE', stream_key(session_id), '-', '+', 'COUNT', excess,
+                                     **{NEVER_DECODE: []})
+                short.append(index)
+        return short
+    
+    def _apply_cap(self, messages: List[ChatMessage], counts: Dict[str, int],
+                   replies: List[Any]) -> Tuple[List[ChatMessage], List[Tuple[ChatMessage, Optional[bytes]]]]:
+        """Under STREAM_MAXLEN, the batch messages to add and the stored entries to trim to make room
+        
+        A session's batch keeps only its newest STREAM_MAXLEN messages (older
+        ones would be trimmed on arrival), and its stream gives up as many of
+        its oldest entries as the cap requires; each trimmed entry comes with
+        the original id it maps, if any.
+        """
+        if not self.stream_maxlen:
+            return messages, []
+        
+        dropped = {session_id: max(count - self.stream_maxlen, 0) for session_id, count in counts.items()}
+        kept = []
+        for message in messages:
+            if dropped[message.session_id]:
+                dropped[message.session_id] -= 1
+            else:
+                kept.append(message)
+        
+        trimmed = []
+        for index, (session_id, count) in enumerate(counts.items()):
+            excess = self._excess(replies[3 * index + 1], count)
+            for entry in replies[3 * index + 2][:excess]:
+                trimmed.append((self._entries_to_messages([entry])[0], entry[1].get(ORIGIN_FIELD.encode())))
+        return kept, trimmed
+    
+    def _queue_trim(self, pipe, trimmed: List[Tuple[ChatMessage, Optional[bytes]]]):
+        """Queue XDEL of trimmed entries along with their id mappings, postings, index entries and counters"""
+        for message, origin in trimmed:
+            pipe.xdel(stream_key(message.session_id), message.message_id)
+            if origin:
+                pipe.hdel(stream_ids_key(message.session_id), origin)
+            self._queue_message_removal(pipe, message)
+    
+    def _assign_ids(self, messages: List[ChatMessage], session_ids: List[str], tails: List[Any]):
+        """Give each message an explicit stream id after its stream's newest entry
+        
+        Ids come from next_stream_id, so an id is never earlier than its
+        message timestamp whatever the app and Redis clocks say; _read_since_ts
+        relies on this.
+        """
+        last_ids = {
+            session_id: tuple(int(part) for part in tail[0][0].decode().split('-')) if tail else None
+            for session_id, tail in zip(session_ids, tails)
+        }
+        for message in messages:
+            last_id = next_stream_id(message.timestamp, last_ids[message.session_id])
+            last_ids[message.session_id] = last_id
+            message.message_id = f"{last_id[0]}-{last_id[1]}"
+    
+    def _write_messages(self, messages: List[ChatMessage], now: datetime) -> Tuple[List[Any], List[ChatMessage]]:
+        """Append messages with their index and stats updates in one MULTI/EXEC; return the replies and messages added
+        
+        The streams are WATCHed while their newest ids (and, under STREAM_MAXLEN,
+        the entries to trim) are read, and the write is retried if another
+        writer appended in between.
+        """
+        counts = Counter(message.session_id for message in messages)
+        origins = {id(message): message.message_id for message in messages}
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(*[stream_key(session_id) for session_id in counts])
+                    reads = self.redis_client.pipeline(transaction=False)
+                    self._queue_tail_reads(reads, counts)
+                    replies = reads.execute()
+                    reads = self.redis_client.pipeline(transaction=False)
+                    short = self._queue_long_trim_reads(reads, counts, replies) if self.stream_maxlen else []
+                    for index, entries in zip(short, reads.execute() if short else []):
+                        replies[3 * index + 2] = entries
+                    self._assign_ids(messages, list(counts), self._tail_replies(replies))
+                    kept, trimmed = self._apply_cap(messages, counts, replies)
+                    
+                    pipe.multi()
+                    self._queue_trim(pipe, trimmed)
+                    for message in kept:
+                        self._queue_store_message(pipe, message, now, origins[id(message)])
+                    return pipe.execute(), kept
+                except redis.WatchError:
+                    continue
+    
+    def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Append a chat message to its session stream with its index updates in one MULTI/EXEC"""
+        try:
+            now = datetime.now()
+            results, _ = self._write_messages([message], now)
+            return self._store_result(results, now)
+        except Exception as e:
+            print(f"Error storing message: {e}")
+            return None
+    
+    def _queue_exists_checks(self, pipe, messages: List[ChatMessage]) -> Tuple[List[ChatMessage], List[ChatMessage]]:
+        """Queue a lookup of each message id in its session's id map and, for stream ids, an XRANGE of the entry
+        
+        A message appears in the checked list once per queued check.
+        """
+        unique = {}
+        checked = []
+        for message in messages:
+            if not message.message_id:
+                unique[id(message)] = message
+                continue
+            key = (message.session_id, message.message_id)
+            if key in unique:
+                continue
+            unique[key] = message
+            pipe.hexists(stream_ids_key(message.session_id), message.message_id)
+            checked.append(message)
+            if STREAM_ID_PATTERN.match(message.message_id):
+                pipe.execute_command('XRANGE', stream_key(message.session_id), message.message_id, message.message_id,
+                                     'COUNT', 1, **{NEVER_DECODE: []})
+                checked.append(message)
+        return list(unique.values()), checked
+    
+    def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Append a batch of messages to their streams with their index updates in one MULTI/EXEC
+        
+        Messages whose id is already stored in their stream (as the stream id or
+        as an original id) are skipped, as are batch messages dropped by STREAM_MAXLEN;
+        neither is counted.
+        """
+        try:
+            messages = self._new_messages(messages)
+            if not messages:
+                return 0
+            
+            now = datetime.now()
+            _, kept = self._write_messages(messages, now)
+            return len(kept)
+        except Exception as e:
+            print(f"Error storing messages: {e}")
+            return None
+
+    def _entries_to_messages(self, entries: List[Tuple[bytes, Dict[bytes, bytes]]]) -> List[ChatMessage]:
+        """Decode raw stream entries, taking each message id from its entry id"""
+        messages = []
+        for entry_id, fields in entries:
+            message = self._deserialize_message(fields[PAYLOAD_FIELD.encode()])
+            message.message_id = entry_id.decode()
+            messages.append(message)
+        return messages
+    
+    def _cursor_args(self, session_id: str, since_message_id: str, limit: Optional[int]) -> List[List[Any]]:
+        """XRANGE arguments for the cursor entry itself (is it still stored?) and for the entries after it"""
+        key = stream_key(session_id)
+        count = [] if limit is None else ['COUNT', limit]
+        return [
+            ['XRANGE', key, since_message_id, since_message_id, 'COUNT', 1],
+            ['XRANGE', key, f"({since_message_id}", '+', *count]
+        ]
+    
+    def _range_args(self, session_id: str, offset: int, limit: Optional[int]) -> Tuple[List[Any], slice, bool]:
+        """XRANGE/XREVRANGE arguments for a window, the slice to keep and whether to reverse"""
+        key = stream_key(session_id)
+        
+        if offset < 0:
+            # A negative offset counts back from the newest message; the window is not
+            # shifted when it reaches past the oldest one (same as RedisClient)
+            skip = 0 if limit is None else max(-offset - limit, 0)
+            return ['XREVRANGE', key, '+', '-', 'COUNT', -offset], slice(skip, None), True
+        
+        if limit is None:
+            return ['XRANGE', key, '-', '+'], slice(offset, None), False
+        return ['XRANGE', key, '-', '+', 'COUNT', offset + limit], slice(offset, None), False
+    
+    def _since_ts_args(self, session_id: str, since_ts: datetime, start: Optional[str]) -> List[Any]:
+        """XRANGE page starting at the since_ts millisecond, or after the previous page"""
+        first = f"({start}" if start else str(int(since_ts.timestamp() * 1000))
+        return ['XRANGE', stream_key(session_id), first, '+', 'COUNT', STREAM_PAGE_SIZE]
+    
+    def _read_since_ts(self, session_id: str, since_ts: datetime, limit: Optional[int]) -> List[ChatMessage]:
+        """Messages newer than since_ts: XRANGE from its millisecond, filtered on the exact timestamp
+        
+        Ids are derived from message timestamps and never precede them (see
+        _assign_ids), so the range cannot miss a newer message; Redis and app
+        clocks play no part. Timestamps are compared as epoch seconds, so naive
+        and timezone-aware ones mix.
+        """
+        since = since_ts.timestamp()
+        messages = []
+        start = None
+        while limit is None or len(messages) < limit:
+            entries = self.redis_client.execute_command(
+                *self._since_ts_args(session_id, since_ts, start), **{NEVER_DECODE: []}
+            )
+            messages.extend(m for m in self._entries_to_messages(entries) if m.timestamp.timestamp() > since)
+            if len(entries) < STREAM_PAGE_SIZE:
+                break
+            start = entries[-1][0].decode()
+        return messages if limit is None else messages[:limit]
+    
+    def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                             since_message_id: Optional[str] = None,
+                             since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages in chronological order with a single range read
+        
+        None means since_message_id is not in the stream (deleted, trimmed or
+        expired) and no since_ts was given to fall back on: reload the session.
+        """
+        try:
+            if limit is not None and limit <= 0:
+                return []
+            if since_message_id and STREAM_ID_PATTERN.match(since_message_id):
+                pipe = self.redis_client.pipeline(transaction=False)
+                for args in self._cursor_args(session_id, since_message_id, limit):
+                    pipe.execute_command(*args, **{NEVER_DECODE: []})
+                cursor, entries = pipe.execute()
+                if cursor:
+                    return self._entries_to_messages(entries)
+            if since_ts is not None:
+                return self._read_since_ts(session_id, since_ts, limit)
+            if since_message_id:
+                return None
+            
+            args, keep, reverse = self._range_args(session_id, offset, limit)
+            entries = self.redis_client.execute_command(*args, **{NEVER_DECODE: []})[keep]
+            if reverse:
+                entries.reverse()
+            return self._entries_to_messages(entries)
+        except Exception as e:
+            print(f"Error retrieving session messages: {e}")
+            return []
+    
+    def _queue_fetch_hits(self, pipe, hits: List[Tuple[str, str, float]]):
+        """Queue a single-entry XRANGE per hit message"""
+        for session_id, message_id, _ in hits:
+            pipe.execute_command('XRANGE', stream_key(session_id), message_id, message_id, **{NEVER_DECODE: []})
+    
+    def _decode_hits(self, replies: List[Any]) -> List[Optional[ChatMessage]]:
+        """Decoded hit messages in hit order, None where the entry is gone"""
+        return [self._entries_to_messages(entries)[0] if entries else None for entries in replies]
+    
+    def _queue_delete_session(self, pipe, session_id: str, message_ids: List[str], counters: Dict[str, str],
+                              postings: List[str], entries: List[str]):
+        """Queue deletion of the session stream and metadata and roll its counters out of the global stats"""
+        pipe.delete(stream_key(session_id), stream_ids_key(session_id), f"session_metadata:{session_id}")
+        pipe.zrem(SESSION_INDEX_KEY, session_id)
+        self._queue_search_removal(pipe, session_id, postings, counters)
+        self._queue_index_removal(pipe, session_id, entries)
+        self._queue_invalidation(pipe, 'delete', session_id)
+        
+        decrements = {field: -value for field, value in counter_fields(counters).items()}
+        self._queue_increments(pipe, GLOBAL_STATS_KEY, decrements)
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session: one stream key plus its metadata"""
+        try:
+            key = stream_key(session_id)
+            metadata_key = f"session_metadata:{session_id}"
+            
+            with self.redis_client.pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        pipe.watch(key, metadata_key)
+                        counters = pipe.hgetall(metadata_key)
+                        postings = pipe.smembers(search_postings_key(session_id))
+                        entries = pipe.smembers(index_entries_key(session_id))
+                        
+                        pipe.multi()
+                        self._queue_delete_session(pipe, session_id, [], counters, postings, entries)
+                        pipe.execute()
+                        break
+                    except redis.WatchError:
+                        continue
+            
+            return True
+        except Exception as e:
+            print(f"Error deleting session: {e}")
+            return False
+
+
+class AsyncStreamRedisClient(StreamRedisClient, AsyncRedisClient):
+    """Asyncio variant of StreamRedisClient on the shared connection pool"""
+    
+    async def _write_messages(self, messages: List[ChatMessage], now: datetime) -> Tuple[List[Any], List[ChatMessage]]:
+        """Append messages with their index and stats updates in one MULTI/EXEC; return the replies and messages added"""
+        counts = Counter(message.session_id for message in messages)
+        origins = {id(message): message.message_id for message in messages}
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(*[stream_key(session_id) for session_id in counts])
+                    reads = self.redis_client.pipeline(transaction=False)
+                    self._queue_tail_reads(reads, counts)
+                    replies = await reads.execute()
+                    reads = self.redis_client.pipeline(transaction=False)
+                    short = self._queue_long_trim_reads(reads, counts, replies) if self.stream_maxlen else []
+                    for index, entries in zip(short, await reads.execute() if short else []):
+                        replies[3 * index + 2] = entries
+                    self._assign_ids(messages, list(counts), self._tail_replies(replies))
+                    kept, trimmed = self._apply_cap(messages, counts, replies)
+                    
+                    pipe.multi()
+                    self._queue_trim(pipe, trimmed)
+                    for message in kept:
+                        self._queue_store_message(pipe, message, now, origins[id(message)])
+                    return await pipe.execute(), kept
+                except redis.WatchError:
+                    continue
+    
+    async def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Append a chat message to its session stream with its index updates in one MULTI/EXEC"""
+        try:
+            now = datetime.now()
+            results, _ = await self._write_messages([message], now)
+            return self._store_result(results, now)
+        except Exception as e:
+            print(f"Error storing message: {e}")
+            return None
+    
+    async def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Append a batch of messages to their streams with their index updates in one MULTI/EXEC"""
+        try:
+            messages = await self._new_messages(messages)
+            if not messages:
+                return 0
+            
+            now = datetime.now()
+            _, kept = await self._write_messages(messages, now)
+            return len(kept)
+        except Exception as e:
+            print(f"Error storing messages: {e}")
+            return None
+
+    async def _read_since_ts(self, session_id: str, since_ts: datetime, limit: Optional[int]) -> List[ChatMessage]:
+        """Messages newer than since_ts: XRANGE from its millisecond, filtered on the exact timestamp"""
+        since = since_ts.timestamp()
+        messages = []
+        start = None
+        while limit is None or len(messages) < limit:
+            entries = await self.redis_client.execute_command(
+                *self._since_ts_args(session_id, since_ts, start), **{NEVER_DECODE: []}
+            )
+            messages.extend(m for m in self._entries_to_messages(entries) if m.timestamp.timestamp() > since)
+            if len(entries) < STREAM_PAGE_SIZE:
+                break
+            start = entries[-1][0].decode()
+        return messages if limit is None else messages[:limit]
+    
+    async def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                                   since_message_id: Optional[str] = None,
+                                   since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages in chronological order with a single range read (None: unknown cursor)"""
+        try:
+            if limit is not None and limit <= 0:
+                return []
+            if since_message_id and STREAM_ID_PATTERN.match(since_message_id):
+                pipe = self.redis_client.pipeline(transaction=False)
+                for args in self._cursor_args(session_id, since_message_id, limit):
+                    pipe.execute_command(*args, **{NEVER_DECODE: []})
+                cursor, entries = await pipe.execute()
+                if cursor:
+                    return self._entries_to_messages(entries)
+            if since_ts is not None:
+                return await self._read_since_ts(session_id, since_ts, limit)
+            if since_message_id:
+                return None
+            
+            args, keep, reverse = self._range_args(session_id, offset, limit)
+            entries = (await self.redis_client.execute_command(*args, **{NEVER_DECODE: []}))[keep]
+            if reverse:
+                entries.reverse()
+            return self._entries_to_messages(entries)
+        except Exception as e:
+            print(f"Error retrieving session messages: {e}")
+            return []
+    
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session: one stream key plus its metadata"""
+        try:
+            key = stream_key(session_id)
+            metadata_key = f"session_metadata:{session_id}"
+            
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        await pipe.watch(key, metadata_key)
+                        counters = await pipe.hgetall(metadata_key)
+                        postings = await pipe.smembers(search_postings_key(session_id))
+                        entries = await pipe.smembers(index_entries_key(session_id))
+                        
+                        pipe.multi()
+                        self._queue_delete_session(pipe, session_id, [], counters, postings, entries)
+                        await pipe.execute()
+                        break
+                    except redis.WatchError:
+                        continue
+            
+            return True
+        except Exception as e:
+            print(f"Error deleting session: {e}")
+            return False
@@ -0,0 +1,111 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Runs of letters and digits; matches how SQLite's unicode61 FTS tokenizer splits text
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Frequent words carry no ranking signal and would produce the longest posting lists
+STOPWORDS = frozenset("""
+a an and are as at be but by can do for from has have how i if in is it its just me my no not
+of on or our so that the their them then there these they this to was we were what when which
+who will with you your
+""".split())
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Posting scores pack a term frequency and a message length into one exact integer
+POSTING_SCALE = 2 ** 32
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased index terms of a text, stopwords removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct terms of a search query, in query order"""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def idf(doc_count: int, doc_freq: int) -> float:
+    """BM25 inverse document frequency (never negative)"""
+    return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def term_weight(tf: int, length: int, avg_length: float) -> float:
+    """BM25 term-frequency component for a term occurring tf times in a message of `length` terms"""
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+
+
+def posting_score(tf: int, length: int) -> int:
+    """Sorted-set score of a posting: higher term frequencies first, then shorter messages"""
+    return tf * POSTING_SCALE - min(length, POSTING_SCALE - 1)
+
+
+def posting_counts(score: float) -> Tuple[int, int]:
+    """(term frequency, message length) packed into a posting score"""
+    score = int(score)
+    tf = score // POSTING_SCALE + 1
+    return tf, tf * POSTING_SCALE - score
+
+
+class InvertedIndex:
+    """In-process inverted index over message content with exact BM25 ranking
+    
+    Posting lists map each term to the messages containing it and their term
+    frequency, so a query only touches the postings of its own terms.
+    """
+    
+    def __init__(self):
+        """Create an empty index"""
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {message_id: term frequency}
+        self.lengths: Dict[str, int] = {}  # message_id -> number of indexed terms
+        self.total_length = 0
+    
+    def add(self, doc_id: str, text: str):
+        """Index a message"""
+        counts = Counter(tokenize(text))
+        if not counts:
+            return
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+    
+    def remove(self, doc_id: str, text: str):
+        """Drop a message indexed with the same text"""
+        length = self.lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+    
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[str, float]]]:
+        """Total number of matching messages and one page of (message_id, score), best first"""
+        doc_count = len(self.lengths)
+        if not doc_count:
+            return 0, []
+        avg_length = self.total_length / doc_count
+        
+        scores: Dict[str, float] = {}
+        for term in query_terms(query):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            weight = idf(doc_count, len(postings))
+            for doc_id, tf in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * term_weight(tf, self.lengths[doc_id], avg_length)
+        
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+        return len(scores), top[offset:]
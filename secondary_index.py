@@ -0,0 +1,108 @@
+import heapq
+import math
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Messages are bucketed by the UTC day of their epoch timestamp, so a time-bounded
+# query only reads the buckets it overlaps, whatever the host time zones and DST
+BUCKET_FORMAT = "%Y-%m-%d"
+
+# Length of a bucket in seconds (every UTC day is exactly this long)
+BUCKET_SPAN = 86400
+
+
+def time_bucket(timestamp: datetime) -> str:
+    """Name of the bucket holding messages with this timestamp"""
+    day = int(timestamp.timestamp() // BUCKET_SPAN)
+    return datetime.fromtimestamp(day * BUCKET_SPAN, timezone.utc).strftime(BUCKET_FORMAT)
+
+
+@lru_cache(maxsize=4096)
+def bucket_start(bucket: str) -> float:
+    """Epoch at which a bucket starts (UTC midnight)"""
+    return datetime.strptime(bucket, BUCKET_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+
+def facet_filters(topic: Optional[Any] = None, sentiment: Optional[Any] = None) -> Dict[str, str]:
+    """Indexed facet values (topic, sentiment) as strings, leaving out unset ones"""
+    values = {'topic': topic, 'sentiment': sentiment}
+    return {facet: getattr(value, 'value', value) for facet, value in values.items() if value}
+
+
+def message_facets(message: Any) -> Dict[str, str]:
+    """Indexed facet values set on a message (or message record)"""
+    return facet_filters(message.topic, message.sentiment)
+
+
+def time_bounds(since: Optional[datetime], until: Optional[datetime]) -> Tuple[float, float]:
+    """Inclusive epoch bounds of a query, infinite where unset"""
+    return (
+        -math.inf if since is None else since.timestamp(),
+        math.inf if until is None else until.timestamp()
+    )
+
+
+def overlaps(bucket: str, low: float, high: float) -> bool:
+    """Whether a bucket can hold messages with timestamps in [low, high]"""
+    start = bucket_start(bucket)
+    return low - BUCKET_SPAN < start <= high
+
+
+class SecondaryIndex:
+    """In-process secondary indexes by time bucket, topic and sentiment
+    
+    Each bucket keeps the set of all its messages and one set per facet value,
+    so a query intersects only the sets of the buckets in its time range,
+    smallest first, and never touches other sessions or days.
+    """
+    
+    def __init__(self):
+        """Create empty indexes"""
+        self.buckets: Dict[str, Set[str]] = {}  # bucket -> message ids
+        self.facets: Dict[Tuple[str, str, str], Set[str]] = {}  # (bucket, facet, value) -> message ids
+        self.times: Dict[str, float] = {}  # message id -> timestamp epoch
+    
+    def _sets(self, bucket: str, facets: Dict[str, str]) -> List[Set[str]]:
+        """Existing sets of a bucket for the given facet values (the bucket set when none)"""
+        if not facets:
+            return [self.buckets[bucket]]
+        return [self.facets.get((bucket, facet, value), set()) for facet, value in facets.items()]
+    
+    def add(self, doc_id: str, message: Any):
+        """Index a message"""
+        bucket = time_bucket(message.timestamp)
+        self.times[doc_id] = message.timestamp.timestamp()
+        self.buckets.setdefault(bucket, set()).add(doc_id)
+        for facet, value in message_facets(message).items():
+            self.facets.setdefault((bucket, facet, value), set()).add(doc_id)
+    
+    def remove(self, doc_id: str, message: Any):
+        """Drop a message indexed with the same timestamp and facets"""
+        if self.times.pop(doc_id, None) is None:
+            return
+        bucket = time_bucket(message.timestamp)
+        entries = [(self.buckets, bucket)]
+        entries += [(self.facets, (bucket, facet, value)) for facet, value in message_facets(message).items()]
+        for index, key in entries:
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del index[key]
+    
+    def query(self, facets: Dict[str, str], since: Optional[datetime] = None, until: Optional[datetime] = None,
+              offset: int = 0, limit: int = 50) -> Tuple[int, List[str]]:
+        """Total number of matching messages and one page of their ids, newest first"""
+        low, high = time_bounds(since, until)
+        matches = []
+        for bucket in self.buckets:
+            if not overlaps(bucket, low, high):
+                continue
+            sets = sorted(self._sets(bucket, facets), key=len)
+            for doc_id in sets[0]:
+                if all(doc_id in ids for ids in sets[1:]) and low <= self.times[doc_id] <= high:
+                    matches.append((self.times[doc_id], doc_id))
+        
+        top = heapq.nlargest(offset + limit, matches)
+        return len(matches), [doc_id for _, doc_id in top[offset:]]
@@ -1,25 +1,34 @@
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import torch
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import os
 from dotenv import load_dotenv
 
 from models import Sentiment, SentimentAnalysisResponse
+from inference_cache import InferenceCache
 
 # Load environment variables
 load_dotenv()
 
+# Texts padded together into one forward pass by analyze_batch
+SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', 32))
+
 
 class SentimentAnalyzer:
     """Sentiment analysis using HuggingFace transformers"""
     
-    def __init__(self, model_name: str = "cardiffnlp/twitter-roberta-base-sentiment"):
+    def __init__(self, model_name: str = "cardiffnlp/twitter-roberta-base-sentiment",
+                 batch_size: int = SENTIMENT_BATCH_SIZE):
         """Initialize sentiment analyzer with specified model"""
         self.model_name = model_name
+        self.batch_size = batch_size
         self.analyzer = None
         self.tokenizer = None
         self.model = None
+        self.loaded_model_name = None  # model_name, or the fallback model if that failed to load
         self._load_model()
+        # Results for repeated texts, keyed by normalized text and the loaded model
+        self.cache = InferenceCache('sentiment', str(self.loaded_model_name), SentimentAnalysisResponse)
     
     def _load_model(self):
         """Load the sentiment analysis model"""
@@ -34,6 +43,7 @@ class SentimentAnalyzer:
                 device=0 if torch.cuda.is_available() else -1
             )
             
+            self.loaded_model_name = self.model_name
             print("Sentiment model loaded successfully")
         except Exception as e:
             print(f"Error loading sentiment model: {e}")
@@ -44,6 +54,7 @@ class SentimentAnalyzer:
                     model="nlptown/bert-base-multilingual-uncased-sentiment",
                     device=0 if torch.cuda.is_available() else -1
                 )
+                self.loaded_model_name = "nlptown/bert-base-multilingual-uncased-sentiment"
                 print("Fallback sentiment model loaded")
             except Exception as e2:
                 print(f"Error loading fallback model: {e2}")
@@ -59,9 +70,23 @@ class SentimentAnalyzer:
             )
         
         try:
-            # Perform sentiment analysis
-            result = self.analyzer(text)[0]
+            # Perform sentiment analysis (repeated texts are served from the cache)
+            return self.cache.lookup([text], self._predict)[0]
             
+        except Exception as e:
+            print(f"Error in sentiment analysis: {e}")
+            return SentimentAnalysisResponse(
+                text=text,
+                sentiment=Sentiment.NEUTRAL,
+                confidence=0.0
+            )
+    
+    def _predict(self, texts: List[str]) -> List[SentimentAnalysisResponse]:
+        """Run the model over texts, batch_size per padded forward pass, and map its labels"""
+        results = self.analyzer(texts, batch_size=self.batch_size)
+        
+        responses = []
+        for text, result in zip(texts, results):
             # Map model output to our sentiment enum
             label = result['label'].lower()
             confidence = result['score']
@@ -74,19 +99,13 @@ class SentimentAnalyzer:
             else:
                 sentiment = Sentiment.NEUTRAL
             
-            return SentimentAnalysisResponse(
+            responses.append(SentimentAnalysisResponse(
                 text=text,
                 sentiment=sentiment,
                 confidence=confidence
-            )
-            
-        except Exception as e:
-            print(f"Error in sentiment analysis: {e}")
-            return SentimentAnalysisResponse(
-                text=text,
-                sentiment=Sentiment.NEUTRAL,
-                confidence=0.0
-            )
+            ))
+        
+        return responses
     
     def analyze_batch(self, texts: list) -> list[SentimentAnalysisResponse]:
         """Analyze sentiment for multiple texts"""
@@ -100,28 +119,8 @@ class SentimentAnalyzer:
             ]
         
         try:
-            # Batch processing
-            results = self.analyzer(texts)
-            
-            responses = []
-            for text, result in zip(texts, results):
-                label = result['label'].lower()
-                confidence = result['score']
-                
-                if 'pos' in label or 'positive' in label:
-                    sentiment = Sentiment.POSITIVE
-                elif 'neg' in label or 'negative' in label:
-                    sentiment = Sentiment.NEGATIVE
-                else:
-                    sentiment = Sentiment.NEUTRAL
-                
-                responses.append(SentimentAnalysisResponse(
-                    text=text,
-                    sentiment=sentiment,
-                    confidence=confidence
-                ))
-            
-            return responses
+            # Cached texts are skipped; the rest run in padded batches of batch_size
+            return self.cache.lookup(list(texts), self._predict)
             
         except Exception as e:
             print(f"Error in batch sentiment analysis: {e}")
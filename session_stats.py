@@ -0,0 +1,143 @@
+from typing import Dict, Any, Optional, Iterable, Union
+from datetime import datetime
+
+from models import ChatMessage, Sentiment, Role
+
+# Stats counters live next to the session metadata, one field per counter:
+#   total_messages, role:<role>, sentiment:<sentiment>, topic:<topic>,
+#   sentiment_sum, sentiment_scored, first_message_at, last_message_at
+ROLE_PREFIX = "role:"
+SENTIMENT_PREFIX = "sentiment:"
+TOPIC_PREFIX = "topic:"
+
+
+def signed_sentiment_score(sentiment: Optional[Sentiment], confidence: float = 1.0) -> Optional[float]:
+    """Map a sentiment and its confidence to a score in [-1, 1]"""
+    if sentiment is None:
+        return None
+    if sentiment == Sentiment.POSITIVE:
+        return confidence
+    if sentiment == Sentiment.NEGATIVE:
+        return -confidence
+    return 0.0
+
+
+def message_score(message: ChatMessage) -> Optional[float]:
+    """Signed sentiment score of a message, falling back to +/-1 when no confidence was recorded"""
+    if message.sentiment_score is not None:
+        return message.sentiment_score
+    return signed_sentiment_score(message.sentiment)
+
+
+def stat_increments(message: ChatMessage) -> Dict[str, Union[int, float]]:
+    """Counter increments contributed by a single message"""
+    increments = {
+        'total_messages': 1,
+        f"{ROLE_PREFIX}{message.role.value}": 1
+    }
+    if message.sentiment:
+        increments[f"{SENTIMENT_PREFIX}{message.sentiment.value}"] = 1
+    if message.topic:
+        increments[f"{TOPIC_PREFIX}{message.topic.value}"] = 1
+    
+    score = message_score(message)
+    if score is not None:
+        increments['sentiment_sum'] = score
+        increments['sentiment_scored'] = 1
+    return increments
+
+
+def apply_increments(counters: Dict[str, Any], increments: Dict[str, Union[int, float]], sign: int = 1):
+    """Add (or with sign=-1, subtract) increments into an in-process counter dict"""
+    for field, amount in increments.items():
+        counters[field] = counters.get(field, 0) + sign * amount
+
+
+def counters_for_messages(messages: Iterable[ChatMessage]) -> Dict[str, Any]:
+    """Build the full counter set for existing messages (used to backfill pre-counter sessions)"""
+    counters: Dict[str, Any] = {}
+    for message in messages:
+        apply_increments(counters, stat_increments(message))
+        counters.setdefault('first_message_at', message.timestamp.isoformat())
+        counters['last_message_at'] = message.timestamp.isoformat()
+    return counters
+
+
+def counter_fields(counters: Dict[str, Any]) -> Dict[str, Union[int, float]]:
+    """Numeric counter fields of a session's metadata (timestamps excluded)"""
+    fields = {}
+    for field, value in counters.items():
+        if field == 'sentiment_sum':
+            fields[field] = float(value)
+        elif field in ('total_messages', 'sentiment_scored') or field.startswith((ROLE_PREFIX, SENTIMENT_PREFIX, TOPIC_PREFIX)):
+            fields[field] = int(float(value))
+    return fields
+
+
+def _distributions(counters: Dict[str, Any]):
+    """Split prefixed counters into sentiment and topic distributions"""
+    sentiment_distribution = {}
+    topic_distribution = {}
+    for field, value in counters.items():
+        if field.startswith(SENTIMENT_PREFIX):
+            sentiment_distribution[field[len(SENTIMENT_PREFIX):]] = int(float(value))
+        elif field.startswith(TOPIC_PREFIX):
+            topic_distribution[field[len(TOPIC_PREFIX):]] = int(float(value))
+    return sentiment_distribution, topic_distribution
+
+
+def _parse_time(value: Union[str, datetime, None]) -> Optional[datetime]:
+    """Accept both stored ISO strings (Redis) and native datetimes (memory)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def stats_from_counters(session_id: str, counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the session stats response from stored counters in O(1)"""
+    def number(field: str) -> float:
+        return float(counters.get(field, 0) or 0)
+    
+    total_messages = int(number('total_messages'))
+    if not total_messages:
+        return {}
+    
+    sentiment_distribution, topic_distribution = _distributions(counters)
+    scored = number('sentiment_scored')
+    first_message_at = _parse_time(counters.get('first_message_at'))
+    last_message_at = _parse_time(counters.get('last_message_at'))
+    
+    return {
+        'session_id': session_id,
+        'total_messages': total_messages,
+        'user_messages': int(number(f"{ROLE_PREFIX}{Role.USER.value}")),
+        'assistant_messages': int(number(f"{ROLE_PREFIX}{Role.ASSISTANT.value}")),
+        'sentiment_distribution': sentiment_distribution,
+        'topic_distribution': topic_distribution,
+        'avg_sentiment': number('sentiment_sum') / scored if scored else None,
+        'created_at': first_message_at,
+        'last_activity': last_message_at,
+        'session_duration': (last_message_at - first_message_at).total_seconds() if first_message_at and last_message_at else 0
+    }
+
+
+
+def overview_from_counters(total_sessions: int, counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the /stats/overview response from global rollup counters in O(1)"""
+    def number(field: str) -> float:
+        return float(counters.get(field, 0) or 0)
+    
+    total_messages = int(round(number('total_messages')))
+    sentiment_distribution, topic_distribution = _distributions(counters)
+    scored = number('sentiment_scored')
+    
+    return {
+        'total_sessions': total_sessions,
+        'total_messages': total_messages,
+        'avg_messages_per_session': total_messages / total_sessions if total_sessions > 0 else 0,
+        'user_messages': int(number(f"{ROLE_PREFIX}{Role.USER.value}")),
+        'assistant_messages': int(number(f"{ROLE_PREFIX}{Role.ASSISTANT.value}")),
+        'sentiment_distribution': {k: v for k, v in sentiment_distribution.items() if v},
+        'topic_distribution': {k: v for k, v in topic_distribution.items() if v},
+        'avg_sentiment': number('sentiment_sum') / scored if scored else None
+    }
\ No newline at end of file
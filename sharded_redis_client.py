@@ -0,0 +1,383 @@
+import asyncio
+import bisect
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Optional, Dict, Any, Tuple, Iterable
+from datetime import datetime
+import os
+from dotenv import load_dotenv
+
+from models import ChatMessage, ChatSession
+from redis_client import RedisClient
+from async_redis_client import AsyncRedisClient
+from session_stats import counter_fields, overview_from_counters
+
+# Load environment variables
+load_dotenv()
+
+# Virtual nodes per shard on the hash ring; more points spread sessions more evenly
+DEFAULT_VNODES = 160
+
+
+def parse_shards(spec: Optional[str] = None) -> List[Tuple[str, str, int, int]]:
+    """Parse a comma-separated "host:port[/db]" list into (name, host, port, db) tuples
+    
+    Defaults to REDIS_SHARDS, falling back to the single REDIS_HOST/REDIS_PORT/REDIS_DB
+    node. The name ("host:port/db") places the shard on the ring, so it must be
+    written the same way on every process.
+    """
+    if spec is None:
+        spec = os.getenv('REDIS_SHARDS', '')
+    if not spec.strip():
+        spec = f"{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', 6379)}/{os.getenv('REDIS_DB', 0)}"
+    
+    shards = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        address, _, db = entry.partition('/')
+        host, _, port = address.rpartition(':')
+        if not host:
+            host, port = address, '6379'
+        name = f"{host}:{int(port)}/{int(db or 0)}"
+        shards.append((name, host, int(port), int(db or 0)))
+    if len({name for name, _, _, _ in shards}) != len(shards):
+        raise ValueError(f"Duplicate Redis shard in {spec!r}")
+    return shards
+
+
+class HashRing:
+    """Consistent-hash ring mapping session ids to shard names
+    
+    Each shard owns `vnodes` points; a key belongs to the first point clockwise
+    from its hash. Adding a shard therefore only moves the keys that land on the
+    new shard's points (about 1/N of them).
+    """
+    
+    def __init__(self, nodes: Iterable[str], vnodes: Optional[int] = None):
+        """Place every node on the ring"""
+        self.vnodes = vnodes or int(os.getenv('REDIS_SHARD_VNODES', DEFAULT_VNODES))
+        self.points: List[int] = []  # sorted hash positions
+        self.owners: List[str] = []  # node owning the position at the same index
+        for node in nodes:
+            self.add_node(node)
+    
+    @staticmethod
+    def _hash(key: str) -> int:
+        """Stable 64-bit position of a key (Python's hash() is salted per process)"""
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+    
+    def add_node(self, node: str):
+        """Add a node's virtual points to the ring"""
+        for i in range(self.vnodes):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+    
+    def remove_node(self, node: str):
+        """Remove a node's virtual points from the ring"""
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != node]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+    
+    def node_for(self, key: str) -> str:
+        """Node owning a key"""
+        if not self.points:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+class ShardedRedisClient:
+    """Redis client spreading sessions over several Redis nodes by consistent hashing
+    
+    Every per-session operation goes to the shard owning the session id, and each
+    shard keeps the usual layout (messages, metadata, session index and global
+    rollup) for its own sessions. Cross-shard reads fan out to all shards in
+    parallel and merge: list_sessions merges the per-shard indexes by update time
+    and overview stats sum the per-shard rollups.
+    """
+    
+    def __init__(self, shards: Optional[str] = None, client_class=RedisClient):
+        """Connect to every shard in `shards` (default REDIS_SHARDS) with `client_class`"""
+        self.clients: Dict[str, RedisClient] = {
+            name: client_class(host, port, db) for name, host, port, db in parse_shards(shards)
+        }
+        self.ring = HashRing(self.clients)
+        self.executor = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix="redis-shard")
+    
+    def client_for(self, session_id: str) -> RedisClient:
+        """Client of the shard owning a session"""
+        return self.clients[self.ring.node_for(session_id)]
+    
+    def _fan_out(self, method: str, *args) -> Dict[str, Any]:
+        """Call a client method on every shard in parallel; results keyed by shard name"""
+        futures = {
+            name: self.executor.submit(getattr(client, method), *args)
+            for name, client in self.clients.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+    
+    def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a chat message on its session's shard"""
+        return self.client_for(message.session_id).store_message(message)
+    
+    def _group_by_shard(self, messages: List[ChatMessage]) -> Dict[str, List[ChatMessage]]:
+        """Split a batch by owning shard, keeping each session's messages in order"""
+        groups: Dict[str, List[ChatMessage]] = {}
+        for message in messages:
+            groups.setdefault(self.ring.node_for(message.session_id), []).append(message)
+        return groups
+    
+    def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch, one pipelined write per shard, shards in parallel (None if any shard failed)"""
+        futures = [
+            self.executor.submit(self.clients[name].store_messages, group)
+            for name, group in self._group_by_shard(messages).items()
+        ]
+        counts = [future.result() for future in futures]
+        return None if None in counts else sum(counts)
+
+    def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                             since_message_id: Optional[str] = None,
+                             since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages from its shard"""
+        return self.client_for(session_id).get_session_messages(session_id, offset, limit, since_message_id, since_ts)
+    
+    def get_session(self, session_id: str) -> Optional[ChatSession]:
+        """Retrieve a complete chat session from its shard"""
+        return self.client_for(session_id).get_session(session_id)
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session from its shard"""
+        return self.client_for(session_id).delete_session(session_id)
+    
+    def get_session_stats(self, session_id: str) -> Dict[str, Any]:
+        """Get statistics for a session from its shard"""
+        return self.client_for(session_id).get_session_stats(session_id)
+    
+    def _merge_sessions(self, results: Dict[str, List[Tuple[str, float]]], cursor: int,
+                        limit: Optional[int], order: str) -> List[str]:
+        """Merge per-shard (session_id, score) lists, each already sorted, and cut the requested page"""
+        merged = heapq.merge(*results.values(), key=lambda item: item[1], reverse=order != "asc")
+        end = None if limit is None else cursor + limit
+        return [session_id for session_id, _ in islice(merged, cursor, end)]
+    
+    def list_sessions(self, cursor: int = 0, limit: Optional[int] = None, order: str = "desc") -> List[str]:
+        """List session IDs across all shards by last update, starting at rank `cursor`
+        
+        Each shard returns its first cursor + limit sessions, so deep pages cost
+        O(shards * (cursor + limit)).
+        """
+        try:
+            results = self._fan_out('list_sessions_scored', 0, None if limit is None else cursor + limit, order)
+            return self._merge_sessions(results, cursor, limit, order)
+        except Exception as e:
+            print(f"Error listing sessions: {e}")
+            return []
+    
+    def _merge_overview(self, results: Dict[str, Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Sum per-shard session counts and rollup counters into one overview"""
+        total_sessions = 0
+        totals: Dict[str, float] = {}
+        for sessions, counters in results.values():
+            total_sessions += sessions
+            for field, value in counter_fields(counters).items():
+                totals[field] = totals.get(field, 0) + value
+        return overview_from_counters(total_sessions, totals)
+    
+    def get_overview_stats(self) -> Dict[str, Any]:
+        """Get overview statistics summed over every shard's rollup counters"""
+        try:
+            return self._merge_overview(self._fan_out('overview_counters'))
+        except Exception as e:
+            print(f"Error getting overview stats: {e}")
+            return {}
+    
+    def _merge_search(self, results: Dict[str, Dict[str, Any]], offset: int, limit: int) -> Dict[str, Any]:
+        """Merge per-shard ranked results (each the shard's top offset + limit) into one page"""
+        hits = heapq.nlargest(
+            offset + limit, (hit for result in results.values() for hit in result['results']),
+            key=lambda hit: hit['score']
+        )
+        return {'total': sum(result['total'] for result in results.values()), 'results': hits[offset:]}
+    
+    def search_messages(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Full-text search on every shard in parallel, merged by score
+        
+        Each shard ranks with its own BM25 statistics, which agree closely when
+        sessions are spread evenly.
+        """
+        try:
+            return self._merge_search(self._fan_out('search_messages', query, 0, offset + limit), offset, limit)
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def rebuild_search_index(self) -> int:
+        """Re-index every shard"""
+        return sum(self._fan_out('rebuild_search_index').values())
+    
+    def _merge_query(self, results: Dict[str, Dict[str, Any]], offset: int, limit: int) -> Dict[str, Any]:
+        """Merge per-shard query results (each the shard's newest offset + limit) into one page"""
+        hits = heapq.nlargest(
+            offset + limit, (hit for result in results.values() for hit in result['results']),
+            key=lambda hit: hit['message'].timestamp
+        )
+        return {'total': sum(result['total'] for result in results.values()), 'results': hits[offset:]}
+    
+    def query_messages(self, topic: Optional[str] = None, sentiment: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """Secondary index query on every shard in parallel, merged newest first"""
+        try:
+            results = self._fan_out('query_messages', topic, sentiment, since, until, 0, offset + limit)
+            return self._merge_query(results, offset, limit)
+        except Exception as e:
+            print(f"Error querying messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def rebuild_message_index(self) -> int:
+        """Rebuild the secondary indexes on every shard"""
+        return sum(self._fan_out('rebuild_message_index').values())
+    
+    def expire_sessions(self) -> int:
+        """Run the retention sweep on every shard"""
+        return sum(self._fan_out('expire_sessions').values())
+    
+    def _merge_memory(self, results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Total sessions, keys and memory across shards, with each shard's own report"""
+        def total(field: str) -> Optional[int]:
+            values = [report.get(field) for report in results.values()]
+            return None if any(value is None for value in values) else sum(values)
+        
+        return {
+            'backend': 'redis_sharded',
+            'sessions': total('sessions'),
+            'keys': total('keys'),
+            'used_memory': total('used_memory'),
+            'shards': results
+        }
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Memory accounting per shard and in total"""
+        return self._merge_memory(self._fan_out('memory_usage'))
+    
+    def health_check(self) -> bool:
+        """Healthy only if every shard answers"""
+        return all(self._fan_out('health_check').values())
+    
+    def close(self):
+        """Stop the fan-out threads"""
+        self.executor.shutdown(wait=False)
+
+
+class AsyncShardedRedisClient(ShardedRedisClient):
+    """Asyncio variant of ShardedRedisClient; fan-out runs the shards concurrently with gather"""
+    
+    def __init__(self, shards: Optional[str] = None, client_class=AsyncRedisClient):
+        """Create one pooled asyncio client per shard (no fan-out threads: gather runs the shards)"""
+        self.clients: Dict[str, AsyncRedisClient] = {
+            name: client_class(host, port, db) for name, host, port, db in parse_shards(shards)
+        }
+        self.ring = HashRing(self.clients)
+    
+    async def _fan_out(self, method: str, *args) -> Dict[str, Any]:
+        """Await a client method on every shard concurrently; results keyed by shard name"""
+        results = await asyncio.gather(*(getattr(client, method)(*args) for client in self.clients.values()))
+        return dict(zip(self.clients, results))
+    
+    async def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a chat message on its session's shard"""
+        return await self.client_for(message.session_id).store_message(message)
+    
+    async def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch, one pipelined write per shard, shards concurrently (None if any shard failed)"""
+        counts = await asyncio.gather(*(
+            self.clients[name].store_messages(group) for name, group in self._group_by_shard(messages).items()
+        ))
+        return None if None in counts else sum(counts)
+
+    async def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                                   since_message_id: Optional[str] = None,
+                                   since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages from its shard"""
+        return await self.client_for(session_id).get_session_messages(
+            session_id, offset, limit, since_message_id, since_ts
+        )
+    
+    async def get_session(self, session_id: str) -> Optional[ChatSession]:
+        """Retrieve a complete chat session from its shard"""
+        return await self.client_for(session_id).get_session(session_id)
+    
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session from its shard"""
+        return await self.client_for(session_id).delete_session(session_id)
+    
+    async def get_session_stats(self, session_id: str) -> Dict[str, Any]:
+        """Get statistics for a session from its shard"""
+        return await self.client_for(session_id).get_session_stats(session_id)
+    
+    async def list_sessions(self, cursor: int = 0, limit: Optional[int] = None, order: str = "desc") -> List[str]:
+        """List session IDs across all shards by last update, starting at rank `cursor`"""
+        try:
+            results = await self._fan_out('list_sessions_scored', 0, None if limit is None else cursor + limit, order)
+            return self._merge_sessions(results, cursor, limit, order)
+        except Exception as e:
+            print(f"Error listing sessions: {e}")
+            return []
+    
+    async def get_overview_stats(self) -> Dict[str, Any]:
+        """Get overview statistics summed over every shard's rollup counters"""
+        try:
+            return self._merge_overview(await self._fan_out('overview_counters'))
+        except Exception as e:
+            print(f"Error getting overview stats: {e}")
+            return {}
+    
+    async def search_messages(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Full-text search on every shard concurrently, merged by score"""
+        try:
+            return self._merge_search(await self._fan_out('search_messages', query, 0, offset + limit), offset, limit)
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    async def rebuild_search_index(self) -> int:
+        """Re-index every shard"""
+        return sum((await self._fan_out('rebuild_search_index')).values())
+    
+    async def query_messages(self, topic: Optional[str] = None, sentiment: Optional[str] = None,
+                             since: Optional[datetime] = None, until: Optional[datetime] = None,
+                             offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """Secondary index query on every shard concurrently, merged newest first"""
+        try:
+            results = await self._fan_out('query_messages', topic, sentiment, since, until, 0, offset + limit)
+            return self._merge_query(results, offset, limit)
+        except Exception as e:
+            print(f"Error querying messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    async def rebuild_message_index(self) -> int:
+        """Rebuild the secondary indexes on every shard"""
+        return sum((await self._fan_out('rebuild_message_index')).values())
+    
+    async def expire_sessions(self) -> int:
+        """Run the retention sweep on every shard"""
+        return sum((await self._fan_out('expire_sessions')).values())
+    
+    async def memory_usage(self) -> Dict[str, Any]:
+        """Memory accounting per shard and in total"""
+        return self._merge_memory(await self._fan_out('memory_usage'))
+    
+    async def health_check(self) -> bool:
+        """Healthy only if every shard answers"""
+        return all((await self._fan_out('health_check')).values())
+    
+    async def close(self):
+        """Release every shard's connection pool"""
+        await asyncio.gather(*(client.close() for client in self.clients.values()))
@@ -0,0 +1,526 @@
+import asyncio
+import sqlite3
+import threading
+import uuid
+from typing import List, Optional, Dict, Any, Iterable, Set
+from datetime import datetime, timedelta
+import os
+from dotenv import load_dotenv
+
+from models import ChatMessage, ChatSession
+from message_codec import get_codec, encode_message, decode_message
+from session_stats import (
+    ROLE_PREFIX, SENTIMENT_PREFIX, TOPIC_PREFIX, message_score, counters_for_messages, counter_fields,
+    stats_from_counters, overview_from_counters
+)
+from search_index import query_terms
+from secondary_index import facet_filters
+
+# Load environment variables
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id TEXT NOT NULL UNIQUE,
+    session_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    role TEXT NOT NULL,
+    sentiment TEXT,
+    topic TEXT,
+    score REAL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages (session_id, ts);
+-- Secondary indexes for query_messages: each facet by time, and time alone
+DROP INDEX IF EXISTS idx_messages_topic;
+DROP INDEX IF EXISTS idx_messages_sentiment;
+CREATE INDEX IF NOT EXISTS idx_messages_topic_ts ON messages (topic, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_sentiment_ts ON messages (sentiment, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    updated_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_ts);
+
+-- Full-text index over message content; rowid is messages.seq
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content);
+
+-- Rollup of the shared counters over all messages (see session_stats), updated in the
+-- same transactions as the messages; a built_at row marks the one-time backfill
+CREATE TABLE IF NOT EXISTS global_stats (
+    field TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# Ids per existence lookup, below SQLite's default limit on bound parameters
+EXISTING_IDS_CHUNK = 500
+
+# Statements are module constants so sqlite3's per-connection statement cache reuses them
+INSERT_MESSAGE = (
+    "INSERT OR IGNORE INTO messages (message_id, session_id, ts, role, sentiment, topic, score, payload) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+UPSERT_SESSION = (
+    "INSERT INTO sessions (session_id, created_at, updated_at, updated_ts) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at, updated_ts = excluded.updated_ts"
+)
+SELECT_SESSION = "SELECT created_at, updated_at FROM sessions WHERE session_id = ?"
+# {placeholders} is one "?" per id; batches are chunked to EXISTING_IDS_CHUNK ids
+SELECT_EXISTING_IDS = "SELECT message_id FROM messages WHERE message_id IN ({placeholders})"
+SELECT_CURSOR = "SELECT ts, seq FROM messages WHERE message_id = ? AND session_id = ?"
+SELECT_AFTER_CURSOR = (
+    "SELECT payload FROM messages WHERE session_id = ? AND (ts > ? OR (ts = ? AND seq > ?)) "
+    "ORDER BY ts, seq LIMIT ?"
+)
+SELECT_AFTER_TS = "SELECT payload FROM messages WHERE session_id = ? AND ts > ? ORDER BY ts, seq LIMIT ?"
+SELECT_HEAD = "SELECT payload FROM messages WHERE session_id = ? ORDER BY ts, seq LIMIT ? OFFSET ?"
+SELECT_TAIL = "SELECT payload FROM messages WHERE session_id = ? ORDER BY ts DESC, seq DESC LIMIT ? OFFSET ?"
+LIST_SESSIONS_DESC = "SELECT session_id FROM sessions ORDER BY updated_ts DESC LIMIT ? OFFSET ?"
+LIST_SESSIONS_ASC = "SELECT session_id FROM sessions ORDER BY updated_ts ASC LIMIT ? OFFSET ?"
+DELETE_MESSAGES = "DELETE FROM messages WHERE session_id = ?"
+DELETE_SESSION = "DELETE FROM sessions WHERE session_id = ?"
+SELECT_EXPIRED = "SELECT session_id FROM sessions WHERE updated_ts < ?"
+COUNT_SESSIONS = "SELECT COUNT(*) FROM sessions"
+INSERT_SEARCH = "INSERT INTO messages_fts (rowid, content) SELECT seq, ? FROM messages WHERE message_id = ?"
+DELETE_SEARCH = "DELETE FROM messages_fts WHERE rowid IN (SELECT seq FROM messages WHERE session_id = ?)"
+SEARCH_MESSAGES = (
+    "SELECT m.session_id, m.message_id, -f.rank, m.payload FROM "
+    "(SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?) AS f "
+    "JOIN messages m ON m.seq = f.rowid ORDER BY f.rank"
+)
+COUNT_SEARCH = "SELECT COUNT(*) FROM messages_fts WHERE messages_fts MATCH ?"
+
+# Secondary index queries; {where} combines facet equality and ts range conditions
+# (a handful of distinct texts, so the statement cache still applies)
+QUERY_MESSAGES = (
+    "SELECT session_id, message_id, payload FROM messages{where} ORDER BY ts DESC, seq DESC LIMIT ? OFFSET ?"
+)
+COUNT_QUERY = "SELECT COUNT(*) FROM messages{where}"
+
+UPSERT_GLOBAL_STAT = (
+    "INSERT INTO global_stats (field, value) VALUES (?, ?) "
+    "ON CONFLICT(field) DO UPDATE SET value = global_stats.value + excluded.value"
+)
+SELECT_GLOBAL_STATS = "SELECT field, value FROM global_stats"
+SELECT_GLOBAL_BUILT = "SELECT 1 FROM global_stats WHERE field = 'built_at'"
+CLEAR_GLOBAL_STATS = "DELETE FROM global_stats"
+
+# Counters grouped by role/sentiment/topic; at most a few dozen rows whatever the data size
+AGGREGATE_COLUMNS = (
+    "SELECT role, sentiment, topic, COUNT(*), TOTAL(score), COUNT(score), MIN(ts), MAX(ts) FROM messages"
+)
+SESSION_AGGREGATES = f"{AGGREGATE_COLUMNS} WHERE session_id = ? GROUP BY role, sentiment, topic"
+GLOBAL_AGGREGATES = f"{AGGREGATE_COLUMNS} GROUP BY role, sentiment, topic"
+
+
+def _counters_from_rows(rows: Iterable[tuple]) -> Dict[str, Any]:
+    """Fold grouped aggregate rows into the shared counter layout (see session_stats)"""
+    counters: Dict[str, Any] = {}
+    first_ts = last_ts = None
+    for role, sentiment, topic, count, score_sum, scored, min_ts, max_ts in rows:
+        counters['total_messages'] = counters.get('total_messages', 0) + count
+        for field in (f"{ROLE_PREFIX}{role}",
+                      f"{SENTIMENT_PREFIX}{sentiment}" if sentiment else None,
+                      f"{TOPIC_PREFIX}{topic}" if topic else None):
+            if field:
+                counters[field] = counters.get(field, 0) + count
+        if scored:
+            counters['sentiment_sum'] = counters.get('sentiment_sum', 0.0) + score_sum
+            counters['sentiment_scored'] = counters.get('sentiment_scored', 0) + scored
+        first_ts = min_ts if first_ts is None else min(first_ts, min_ts)
+        last_ts = max_ts if last_ts is None else max(last_ts, max_ts)
+    
+    if first_ts is not None:
+        counters['first_message_at'] = datetime.fromtimestamp(first_ts)
+        counters['last_message_at'] = datetime.fromtimestamp(last_ts)
+    return counters
+
+
+class SQLiteClient:
+    """SQLite (WAL mode) storage client: durable single-node alternative to Redis
+    
+    Each thread gets its own connection, so concurrent readers do not block
+    each other or the writer.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """Open (and if needed create) the database"""
+        self.path = path or os.getenv('SQLITE_PATH', 'chat_summarizer.db')
+        self.codec = get_codec()
+        self.session_ttl = float(os.getenv('SESSION_TTL_SECONDS', 0))
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        if not conn.execute(SELECT_GLOBAL_BUILT).fetchone():
+            self.rebuild_global_stats()
+        if (conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone()
+                and not conn.execute("SELECT 1 FROM messages_fts LIMIT 1").fetchone()):
+            self.rebuild_search_index()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection, configured for WAL on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   cached_statements=128)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _message_row(self, message: ChatMessage) -> tuple:
+        """Indexed columns plus the encoded payload for one message"""
+        if not message.message_id:
+            message.message_id = str(uuid.uuid4())
+        return (
+            message.message_id,
+            message.session_id,
+            message.timestamp.timestamp(),
+            message.role.value,
+            message.sentiment.value if message.sentiment else None,
+            message.topic.value if message.topic else None,
+            message_score(message),
+            encode_message(message, self.codec)
+        )
+    
+    def _existing_ids(self, conn: sqlite3.Connection, message_ids: List[str]) -> Set[str]:
+        """The given message ids that are already stored"""
+        existing = set()
+        for start in range(0, len(message_ids), EXISTING_IDS_CHUNK):
+            chunk = message_ids[start:start + EXISTING_IDS_CHUNK]
+            query = SELECT_EXISTING_IDS.format(placeholders=', '.join('?' * len(chunk)))
+            existing.update(row[0] for row in conn.execute(query, chunk))
+        return existing
+    
+    def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Insert a batch of messages in one transaction and return how many were stored (None on failure)
+        
+        Messages whose message_id is already stored (or repeated in the batch)
+        are skipped, so re-importing a dump is harmless.
+        """
+        if not messages:
+            return 0
+        
+        now = datetime.now()
+        rows = [self._message_row(message) for message in messages]
+        
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # The write lock is held, so ids found missing here are still missing at the insert
+            existing = self._existing_ids(conn, [row[0] for row in rows])
+            new_rows = {}
+            for message, row in zip(messages, rows):
+                if row[0] not in existing:
+                    new_rows.setdefault(row[0], (message, row))
+            inserted = [message for message, _ in new_rows.values()]
+            conn.executemany(INSERT_MESSAGE, [row for _, row in new_rows.values()])
+            conn.executemany(INSERT_SEARCH, [(message.content, message.message_id) for message in inserted])
+            self._add_global_stats(conn, counter_fields(counters_for_messages(inserted)))
+            conn.executemany(UPSERT_SESSION, [
+                (session_id, now.isoformat(), now.isoformat(), now.timestamp())
+                for session_id in dict.fromkeys(message.session_id for message in inserted)
+            ])
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            print(f"Error storing messages: {e}")
+            return None
+        return len(inserted)
+    
+    def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a chat message and return the session's created/updated timestamps"""
+        try:
+            self.expire_sessions()
+            if self.store_messages([message]) is None:
+                return None
+            created_at, updated_at = self._connection().execute(SELECT_SESSION, (message.session_id,)).fetchone()
+            return {
+                'created_at': datetime.fromisoformat(created_at),
+                'updated_at': datetime.fromisoformat(updated_at)
+            }
+        except Exception as e:
+            print(f"Error storing message: {e}")
+            return None
+    
+    def _window_rows(self, session_id: str, offset: int, limit: Optional[int],
+                     since_message_id: Optional[str], since_ts: Optional[datetime]) -> Optional[List[tuple]]:
+        """Payload rows of the requested window in chronological order (None: unknown cursor)"""
+        conn = self._connection()
+        sql_limit = -1 if limit is None else limit
+        
+        if since_message_id:
+            cursor = conn.execute(SELECT_CURSOR, (since_message_id, session_id)).fetchone()
+            if cursor is not None:
+                ts, seq = cursor
+                return conn.execute(SELECT_AFTER_CURSOR, (session_id, ts, ts, seq, sql_limit)).fetchall()
+            if since_ts is None:
+                return None
+        
+        if since_ts is not None:
+            return conn.execute(SELECT_AFTER_TS, (session_id, since_ts.timestamp(), sql_limit)).fetchall()
+        
+        if offset >= 0:
+            return conn.execute(SELECT_HEAD, (session_id, sql_limit, offset)).fetchall()
+        
+        # A negative offset counts back from the newest message; the window is not
+        # shifted when it reaches past the oldest one (same as RedisClient)
+        skip = 0 if limit is None else max(-offset - limit, 0)
+        rows = conn.execute(SELECT_TAIL, (session_id, -offset - skip, skip)).fetchall()
+        rows.reverse()
+        return rows
+    
+    def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                             since_message_id: Optional[str] = None,
+                             since_ts: Optional[datetime] = None) -> Optional[List[ChatMessage]]:
+        """Retrieve a session's messages in chronological order, optionally windowed (None: unknown cursor)"""
+        try:
+            if limit is not None and limit <= 0:
+                return []
+            rows = self._window_rows(session_id, offset, limit, since_message_id, since_ts)
+            if rows is None:
+                return None
+            return [decode_message(payload) for (payload,) in rows]
+        except Exception as e:
+            print(f"Error retrieving session messages: {e}")
+            return []
+    
+    def get_session(self, session_id: str) -> Optional[ChatSession]:
+        """Retrieve a complete chat session"""
+        try:
+            messages = self.get_session_messages(session_id)
+            if not messages:
+                return None
+            
+            row = self._connection().execute(SELECT_SESSION, (session_id,)).fetchone()
+            created_at, updated_at = row if row else (None, None)
+            return ChatSession(
+                session_id=session_id,
+                messages=messages,
+                created_at=datetime.fromisoformat(created_at) if created_at else messages[0].timestamp,
+                updated_at=datetime.fromisoformat(updated_at) if updated_at else messages[-1].timestamp
+            )
+        except Exception as e:
+            print(f"Error retrieving session: {e}")
+            return None
+    
+    def expire_sessions(self) -> int:
+        """Delete sessions idle for longer than the TTL"""
+        if not self.session_ttl:
+            return 0
+        cutoff = (datetime.now() - timedelta(seconds=self.session_ttl)).timestamp()
+        session_ids = [row[0] for row in self._connection().execute(SELECT_EXPIRED, (cutoff,))]
+        for session_id in session_ids:
+            self.delete_session(session_id)
+        return len(session_ids)
+    
+    def list_sessions(self, cursor: int = 0, limit: Optional[int] = None, order: str = "desc") -> List[str]:
+        """List session IDs by last update (newest first by default), starting at rank `cursor`"""
+        try:
+            self.expire_sessions()
+            query = LIST_SESSIONS_ASC if order == "asc" else LIST_SESSIONS_DESC
+            rows = self._connection().execute(query, (-1 if limit is None else limit, cursor))
+            return [row[0] for row in rows]
+        except Exception as e:
+            print(f"Error listing sessions: {e}")
+            return []
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session and all its messages"""
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = _counters_from_rows(conn.execute(SESSION_AGGREGATES, (session_id,)).fetchall())
+                self._add_global_stats(conn, counter_fields(removed), sign=-1)
+                conn.execute(DELETE_SEARCH, (session_id,))
+                conn.execute(DELETE_MESSAGES, (session_id,))
+                deleted = conn.execute(DELETE_SESSION, (session_id,)).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return deleted > 0
+        except Exception as e:
+            print(f"Error deleting session: {e}")
+            return False
+    
+    def get_session_stats(self, session_id: str) -> Dict[str, Any]:
+        """Get statistics for a session from SQL aggregates over its index range"""
+        try:
+            rows = self._connection().execute(SESSION_AGGREGATES, (session_id,)).fetchall()
+            return stats_from_counters(session_id, _counters_from_rows(rows))
+        except Exception as e:
+            print(f"Error getting session stats: {e}")
+            return {}
+    
+    def _add_global_stats(self, conn: sqlite3.Connection, counters: Dict[str, Any], sign: int = 1):
+        """Add (or with sign=-1, subtract) counters into the global_stats rollup"""
+        conn.executemany(UPSERT_GLOBAL_STAT, [(field, sign * value) for field, value in counters.items()])
+    
+    def rebuild_global_stats(self) -> Dict[str, Any]:
+        """Recompute the global_stats rollup with one scan of the messages table (for data stored before it)"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            counters = counter_fields(_counters_from_rows(conn.execute(GLOBAL_AGGREGATES).fetchall()))
+            conn.execute(CLEAR_GLOBAL_STATS)
+            self._add_global_stats(conn, {**counters, 'built_at': datetime.now().timestamp()})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return counters
+    
+    def get_overview_stats(self) -> Dict[str, Any]:
+        """Get overview statistics for all sessions from the global_stats rollup"""
+        try:
+            self.expire_sessions()
+            conn = self._connection()
+            total_sessions = conn.execute(COUNT_SESSIONS).fetchone()[0]
+            counters = counter_fields(dict(conn.execute(SELECT_GLOBAL_STATS).fetchall()))
+            return overview_from_counters(total_sessions, counters)
+        except Exception as e:
+            print(f"Error getting overview stats: {e}")
+            return {}
+    
+    def rebuild_search_index(self) -> int:
+        """Re-index every message's content (for databases created before search existed)"""
+        conn = self._connection()
+        rows = conn.execute("SELECT seq, payload FROM messages").fetchall()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM messages_fts")
+            conn.executemany("INSERT INTO messages_fts (rowid, content) VALUES (?, ?)",
+                             ((seq, decode_message(payload).content) for seq, payload in rows))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+    
+    def search_messages(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Messages matching a full-text query, ranked by FTS5's BM25, with the total match count"""
+        try:
+            terms = query_terms(query)
+            if not terms or limit <= 0:
+                return {'total': 0, 'results': []}
+            
+            # Any-term match like the other backends; terms are letters and digits only
+            match = " OR ".join(f'"{term}"' for term in terms)
+            conn = self._connection()
+            total = conn.execute(COUNT_SEARCH, (match,)).fetchone()[0]
+            results = [
+                {'session_id': session_id, 'message_id': message_id, 'score': score,
+                 'message': decode_message(payload)}
+                for session_id, message_id, score, payload in conn.execute(SEARCH_MESSAGES, (match, limit, offset))
+            ]
+            return {'total': total, 'results': results}
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def query_messages(self, topic: Optional[str] = None, sentiment: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """Messages matching a topic and/or sentiment within [since, until], newest first, with the total
+        
+        The (topic, ts), (sentiment, ts) and (ts) indexes turn each filter into a
+        range scan that is already in time order.
+        """
+        try:
+            if limit <= 0:
+                return {'total': 0, 'results': []}
+            conditions, params = [], []
+            for facet, value in facet_filters(topic, sentiment).items():
+                conditions.append(f"{facet} = ?")
+                params.append(value)
+            if since is not None:
+                conditions.append("ts >= ?")
+                params.append(since.timestamp())
+            if until is not None:
+                conditions.append("ts <= ?")
+                params.append(until.timestamp())
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            
+            conn = self._connection()
+            total = conn.execute(COUNT_QUERY.format(where=where), params).fetchone()[0]
+            results = [
+                {'session_id': session_id, 'message_id': message_id, 'message': decode_message(payload)}
+                for session_id, message_id, payload in
+                conn.execute(QUERY_MESSAGES.format(where=where), (*params, limit, offset))
+            ]
+            return {'total': total, 'results': results}
+        except Exception as e:
+            print(f"Error querying messages: {e}")
+            return {'total': 0, 'results': []}
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Database size and row counts, for sizing"""
+        try:
+            conn = self._connection()
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            wal_path = f"{self.path}-wal"
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'sessions': conn.execute(COUNT_SESSIONS).fetchone()[0],
+                'messages': conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0],
+                'db_bytes': page_count * page_size,
+                'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+                'limits': {'session_ttl': self.session_ttl}
+            }
+        except Exception as e:
+            print(f"Error getting memory usage: {e}")
+            return {}
+    
+    def health_check(self) -> bool:
+        """Check that the database answers queries"""
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except Exception as e:
+            print(f"SQLite health check failed: {e}")
+            return False
+    
+    def close(self):
+        """Close every thread's connection"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class AsyncSQLiteClient:
+    """Awaitable facade over SQLiteClient that runs queries in worker threads"""
+    
+    def __init__(self, client: Optional[SQLiteClient] = None):
+        """Wrap an existing SQLiteClient or open a new one"""
+        self.client = client or SQLiteClient()
+    
+    def __getattr__(self, name: str):
+        """Expose SQLiteClient methods as coroutines so disk I/O stays off the event loop"""
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+    
+    async def close(self):
+        """Close the database connections"""
+        self.client.close()
@@ -0,0 +1,379 @@
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+import os
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+from models import ChatMessage
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between attempts to resubscribe to cache invalidations
+SUBSCRIBER_RETRY_SECONDS = 1.0
+
+
+class SessionCache:
+    """LRU cache of decoded sessions shared by every wrapper around one backend
+    
+    Entries hold a session's full, chronological message list. A message stored
+    through this process is appended to its cached session; any other change
+    (a delete, an overlapping write, or a write announced by another worker)
+    drops the entry. A read that overlapped a write is not cached.
+    """
+    
+    def __init__(self, max_sessions: int):
+        """Create a cache holding at most `max_sessions` sessions"""
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session_id -> list of ChatMessages, least recently used first
+        self.generation = 0  # bumped on every write and invalidation
+        self.writing: Dict[str, int] = {}  # session_id -> stores in flight through this process
+        self.lock = threading.Lock()  # the invalidation subscriber runs on its own thread
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+    
+    def get(self, session_id: str) -> Optional[List[ChatMessage]]:
+        """Return a copy of the cached messages, or None on a miss"""
+        with self.lock:
+            messages = self.sessions.get(session_id)
+            if messages is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.sessions.move_to_end(session_id)
+            return list(messages)
+    
+    def put(self, session_id: str, messages: List[ChatMessage], generation: int):
+        """Cache messages read at `generation` unless a write happened since or is still in flight"""
+        with self.lock:
+            if generation != self.generation or not messages or self.writing.get(session_id):
+                return
+            self.sessions[session_id] = list(messages)
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+    
+    def begin_write(self, session_id: str):
+        """Mark a store as in flight so concurrent reads of the session are not cached"""
+        with self.lock:
+            self.writing[session_id] = self.writing.get(session_id, 0) + 1
+    
+    def end_write(self, session_id: str, message: Optional[ChatMessage]):
+        """Append a successfully stored message to its cached session, or drop the entry
+        
+        Appending is only safe when no other store to the session overlapped and
+        the message sorts last; otherwise the entry is dropped and reloaded.
+        """
+        with self.lock:
+            self.generation += 1
+            remaining = self.writing[session_id] - 1
+            if remaining:
+                self.writing[session_id] = remaining
+            else:
+                del self.writing[session_id]
+            
+            messages = self.sessions.get(session_id)
+            if messages is None:
+                return
+            if message is None or remaining or message.timestamp.timestamp() < messages[-1].timestamp.timestamp():
+                del self.sessions[session_id]
+                self.invalidations += 1
+                return
+            if message.message_id != messages[-1].message_id:
+                messages.append(message.model_copy())
+            self.appends += 1
+    
+    def invalidate(self, session_id: str, remote: bool = False):
+        """Drop a session after it was deleted here or changed by another worker"""
+        with self.lock:
+            self.generation += 1
+            if self.sessions.pop(session_id, None) is not None:
+                if remote:
+                    self.remote_invalidations += 1
+                else:
+                    self.invalidations += 1
+    
+    def clear(self):
+        """Drop every entry (after missing invalidations, e.g. on a pub/sub reconnect)"""
+        with self.lock:
+            self.generation += 1
+            self.sessions.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'sessions': len(self.sessions),
+                'max_sessions': self.max_sessions,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'appends': self.appends,
+                'invalidations': self.invalidations,
+                'remote_invalidations': self.remote_invalidations
+            }
+
+
+class SessionCacheSubscriber:
+    """Applies session changes published by Redis writes to the local SessionCache
+    
+    Listens on one pub/sub connection per Redis node (several with sharding).
+    Stores made by this process are already appended locally and are skipped;
+    deletes, including TTL sweeps run here, always invalidate.
+    """
+    
+    def __init__(self, cache: SessionCache, connections: List[Any], channel: str, origin: str):
+        """Start a daemon listener thread per Redis connection"""
+        self.cache = cache
+        self.channel = channel
+        self.origin = origin
+        self.threads = [
+            threading.Thread(target=self._listen, args=(connection,), daemon=True, name="session-cache-pubsub")
+            for connection in connections
+        ]
+        for thread in self.threads:
+            thread.start()
+    
+    def _handle(self, data: str):
+        """Invalidate the session named in one published "<origin>:<op>:<session_id>" message"""
+        origin, op, session_id = data.split(':', 2)
+        if origin == self.origin and op == 'store':
+            return
+        self.cache.invalidate(session_id, remote=origin != self.origin)
+    
+    def _listen(self, connection):
+        """Subscribe and apply messages, resubscribing (and clearing the cache) after connection loss"""
+        while True:
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._handle(message['data'])
+            except Exception as e:
+                print(f"Session cache subscription lost: {e}")
+            # Invalidations may have been missed while disconnected
+            self.cache.clear()
+            time.sleep(SUBSCRIBER_RETRY_SECONDS)
+
+
+def _is_full_read(offset: int, limit: Optional[int], since_message_id: Optional[str], since_ts) -> bool:
+    """Only unwindowed reads are served from (and fill) the cache"""
+    return offset == 0 and limit is None and since_message_id is None and since_ts is None
+
+
+class CachedStorage:
+    """Read-through session cache in front of a synchronous storage client"""
+    
+    def __init__(self, client, cache: SessionCache):
+        """Wrap a storage client; all methods not overridden pass straight through"""
+        self.client = client
+        self.cache = cache
+    
+    def __getattr__(self, name: str):
+        """Delegate everything else to the wrapped client"""
+        return getattr(self.client, name)
+    
+    def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a message and append it to its cached session"""
+        self.cache.begin_write(message.session_id)
+        result = None
+        try:
+            result = self.client.store_message(message)
+            return result
+        finally:
+            self.cache.end_write(message.session_id, message if result is not None else None)
+    
+    def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch of messages and drop their sessions from the cache"""
+        session_ids = list(dict.fromkeys(message.session_id for message in messages))
+        for session_id in session_ids:
+            self.cache.begin_write(session_id)
+        try:
+            return self.client.store_messages(messages)
+        finally:
+            for session_id in session_ids:
+                self.cache.end_write(session_id, None)
+    
+    def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                             since_message_id: Optional[str] = None, since_ts=None) -> Optional[List[ChatMessage]]:
+        """Serve full-session reads from the cache, loading them on a miss"""
+        if not _is_full_read(offset, limit, since_message_id, since_ts):
+            return self.client.get_session_messages(session_id, offset, limit, since_message_id, since_ts)
+        
+        messages = self.cache.get(session_id)
+        if messages is None:
+            generation = self.cache.generation
+            messages = self.client.get_session_messages(session_id)
+            self.cache.put(session_id, messages, generation)
+        return messages
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session and invalidate it"""
+        try:
+            return self.client.delete_session(session_id)
+        finally:
+            self.cache.invalidate(session_id)
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Backend memory accounting plus the session cache's hit/miss counters"""
+        return {**self.client.memory_usage(), 'session_cache': self.cache.stats()}
+
+
+class AsyncCachedStorage(CachedStorage):
+    """Read-through session cache in front of an awaitable storage client"""
+    
+    async def store_message(self, message: ChatMessage) -> Optional[Dict[str, Any]]:
+        """Store a message and append it to its cached session"""
+        self.cache.begin_write(message.session_id)
+        result = None
+        try:
+            result = await self.client.store_message(message)
+            return result
+        finally:
+            self.cache.end_write(message.session_id, message if result is not None else None)
+    
+    async def store_messages(self, messages: List[ChatMessage]) -> Optional[int]:
+        """Store a batch of messages and drop their sessions from the cache"""
+        session_ids = list(dict.fromkeys(message.session_id for message in messages))
+        for session_id in session_ids:
+            self.cache.begin_write(session_id)
+        try:
+            return await self.client.store_messages(messages)
+        finally:
+            for session_id in session_ids:
+                self.cache.end_write(session_id, None)
+    
+    async def get_session_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None,
+                                   since_message_id: Optional[str] = None, since_ts=None) -> Optional[List[ChatMessage]]:
+        """Serve full-session reads from the cache, loading them on a miss"""
+        if not _is_full_read(offset, limit, since_message_id, since_ts):
+            return await self.client.get_session_messages(session_id, offset, limit, since_message_id, since_ts)
+        
+        messages = self.cache.get(session_id)
+        if messages is None:
+            generation = self.cache.generation
+            messages = await self.client.get_session_messages(session_id)
+            self.cache.put(session_id, messages, generation)
+        return messages
+    
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session and invalidate it"""
+        try:
+            return await self.client.delete_session(session_id)
+        finally:
+            self.cache.invalidate(session_id)
+    
+    async def memory_usage(self) -> Dict[str, Any]:
+        """Backend memory accounting plus the session cache's hit/miss counters"""
+        return {**await self.client.memory_usage(), 'session_cache': self.cache.stats()}
+
+
+def _memory_backend():
+    """One MemoryClient; the async facade wraps the same instance"""
+    from memory_client import MemoryClient, AsyncMemoryClient
+    client = MemoryClient()
+    return client, AsyncMemoryClient(client)
+
+
+def _redis_backend():
+    """Sync client for the summarizer, pooled asyncio client for the API"""
+    from redis_client import RedisClient
+    from async_redis_client import AsyncRedisClient
+    return RedisClient(), AsyncRedisClient()
+
+
+def _redis_streams_backend():
+    """Streams layout: one Redis Stream per session"""
+    from redis_stream_client import StreamRedisClient, AsyncStreamRedisClient
+    return StreamRedisClient(), AsyncStreamRedisClient()
+
+
+def _redis_sharded_backend():
+    """Sessions spread over the REDIS_SHARDS nodes by consistent hashing"""
+    from sharded_redis_client import ShardedRedisClient, AsyncShardedRedisClient
+    return ShardedRedisClient(), AsyncShardedRedisClient()
+
+
+def _sqlite_backend():
+    """One SQLiteClient; the async facade runs its queries in worker threads"""
+    from sqlite_client import SQLiteClient, AsyncSQLiteClient
+    client = SQLiteClient()
+    return client, AsyncSQLiteClient(client)
+
+
+# Storage backends selectable with STORAGE_BACKEND: name -> factory returning (sync, async) clients
+STORAGE_BACKENDS = {
+    'memory': _memory_backend,
+    'redis': _redis_backend,
+    'redis_streams': _redis_streams_backend,
+    'redis_sharded': _redis_sharded_backend,
+    'sqlite': _sqlite_backend,
+}
+
+# Backends that already keep decoded messages in process; a session cache would only duplicate them
+IN_PROCESS_BACKENDS = {'memory'}
+
+_storage = None
+_async_storage = None
+_subscriber = None
+
+
+def _redis_nodes(client) -> List[Any]:
+    """Redis clients behind a backend (one per shard), or none for non-Redis backends"""
+    nodes = list(client.clients.values()) if hasattr(client, 'clients') else [client]
+    return [node for node in nodes if hasattr(node, 'invalidation_channel')]
+
+
+def _subscribe_cache(cache: SessionCache, sync_client, async_client):
+    """Make Redis writes publish session changes and apply other workers' changes to the cache"""
+    global _subscriber
+    channel = os.getenv('SESSION_CACHE_CHANNEL', 'session_cache:invalidate')
+    sync_nodes = _redis_nodes(sync_client)
+    if not channel or not sync_nodes:
+        return
+    
+    origin = uuid.uuid4().hex
+    for node in sync_nodes + _redis_nodes(async_client):
+        node.invalidation_channel = channel
+        node.invalidation_origin = origin
+    _subscriber = SessionCacheSubscriber(cache, [node.redis_client for node in sync_nodes], channel, origin)
+
+
+def _init_storage():
+    """Create the process-wide backend selected by configuration"""
+    global _storage, _async_storage
+    name = os.getenv('STORAGE_BACKEND', 'memory')
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    
+    sync_client, async_client = STORAGE_BACKENDS[name]()
+    cache_size = int(os.getenv('SESSION_CACHE_SIZE', 256))
+    if cache_size > 0 and name not in IN_PROCESS_BACKENDS:
+        cache = SessionCache(cache_size)
+        _subscribe_cache(cache, sync_client, async_client)
+        sync_client = CachedStorage(sync_client, cache)
+        async_client = AsyncCachedStorage(async_client, cache)
+    
+    _storage, _async_storage = sync_client, async_client
+    print(f"Using {name} storage backend")
+
+
+def get_storage():
+    """Process-wide synchronous storage client (used by the summarizer)"""
+    if _storage is None:
+        _init_storage()
+    return _storage
+
+
+def get_async_storage():
+    """Process-wide awaitable storage client (used by the API handlers), sharing get_storage()'s data"""
+    if _async_storage is None:
+        _init_storage()
+    return _async_storage
@@ -9,7 +9,7 @@ import os
 from dotenv import load_dotenv
 
 from models import ChatMessage, SummaryResponse, Role
-from memory_client import MemoryClient
+from storage import get_storage
 
 # Load environment variables
 load_dotenv()
@@ -18,10 +18,10 @@ load_dotenv()
 class ChatSummarizer:
     """Chat summarization using LangChain and OpenAI"""
     
-    def __init__(self):
-        """Initialize the summarizer with OpenAI LLM"""
+    def __init__(self, storage=None):
+        """Initialize the summarizer with OpenAI LLM, reading from the shared storage backend by default"""
         self.llm = None
-        self.redis_client = MemoryClient()
+        self.redis_client = storage if storage is not None else get_storage()
         self._initialize_llm()
     
     def _initialize_llm(self):
@@ -0,0 +1,97 @@
+"""
+Tests for the asyncio Redis client (async_redis_client.py) against the synchronous one on the same data
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from models import ChatMessage
+from redis_client import RedisClient
+from async_redis_client import AsyncRedisClient
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_messages(session_id, count=4):
+    """`count` messages one minute apart"""
+    return [
+        ChatMessage(session_id=session_id, role='user', content=f'refund order {i}', topic='complaint',
+                    timestamp=START + timedelta(minutes=i), message_id=f'{session_id}-m{i}')
+        for i in range(count)
+    ]
+
+def clients():
+    """A synchronous and an asyncio client on one fake server"""
+    server = fakeredis.FakeServer()
+    sync = RedisClient()
+    sync.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    client = AsyncRedisClient()
+    client.redis_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return sync, client
+
+def ids(messages):
+    """Message ids in order"""
+    return [message.message_id for message in messages]
+
+def test_async_writes_read_by_sync_client():
+    """Data written through the asyncio client has the layout the synchronous client reads"""
+    sync, client = clients()
+    
+    async def main():
+        assert await client.store_messages(make_messages('a')) == 4
+        assert await client.store_messages(make_messages('a')) == 0
+        assert await client.store_message(make_messages('b', 1)[0]) is not None
+    
+    asyncio.run(main())
+    assert ids(sync.get_session_messages('a')) == ids(make_messages('a'))
+    assert sync.get_overview_stats()['total_messages'] == 5
+    assert sync.search_messages('refund')['total'] == 5
+
+def test_sync_writes_read_by_async_client():
+    """Windows, listing, stats, search and facet queries agree between the two clients"""
+    sync, client = clients()
+    sync.store_messages(make_messages('a'))
+    sync.store_messages(make_messages('b', 2))
+    
+    async def main():
+        return (
+            await client.get_session_messages('a', offset=-2),
+            await client.get_session_messages('a', since_message_id='a-m1'),
+            await client.get_session_messages('a', since_ts=START + timedelta(minutes=2)),
+            await client.list_sessions(),
+            await client.get_session_stats('a'),
+            await client.get_overview_stats(),
+            await client.search_messages('refund', limit=3),
+            await client.query_messages(topic='complaint', limit=2),
+        )
+    
+    window, after_cursor, after_ts, sessions, stats, overview, search, query = asyncio.run(main())
+    assert ids(window) == ['a-m2', 'a-m3']
+    assert ids(after_cursor) == ['a-m2', 'a-m3']
+    assert ids(after_ts) == ['a-m3']
+    assert sessions == sync.list_sessions()
+    assert stats == sync.get_session_stats('a')
+    assert overview == sync.get_overview_stats()
+    assert search['total'] == sync.search_messages('refund', limit=3)['total']
+    assert [row['message_id'] for row in search['results']] == \
+        [row['message_id'] for row in sync.search_messages('refund', limit=3)['results']]
+    assert [row['message_id'] for row in query['results']] == ['a-m3', 'a-m2']
+
+def test_async_delete_and_expiry():
+    """Deleting and the idle-session sweep remove whole sessions with their stats"""
+    sync, client = clients()
+    sync.store_messages(make_messages('a'))
+    sync.store_messages(make_messages('b', 2))
+    
+    async def main():
+        assert await client.delete_session('a')
+        client.session_ttl = 1
+        await asyncio.sleep(1.1)
+        return await client.list_sessions()
+    
+    assert asyncio.run(main()) == []
+    assert sync.get_overview_stats()['total_messages'] == 0
+    assert sync.redis_client.keys('message:*') == []
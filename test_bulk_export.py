@@ -0,0 +1,66 @@
+"""
+Tests for streaming NDJSON export (bulk_export.py)
+"""
+
+import asyncio
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import bulk_export
+from models import ChatMessage
+from memory_client import AsyncMemoryClient, MemoryClient
+from bulk_export import ExportFilter, export_messages, export_messages_async, ndjson_chunks, write_export
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_storage(sessions=3, per_session=7):
+    """MemoryClient holding `per_session` messages per session, topics alternating"""
+    storage = MemoryClient()
+    for s in range(sessions):
+        storage.store_messages([
+            ChatMessage(session_id=f'session-{s}', role='user', content=f'message {i} of session {s}',
+                        timestamp=START + timedelta(minutes=i), message_id=f'm-{s}-{i}',
+                        topic='complaint' if i % 2 else 'question')
+            for i in range(per_session)
+        ])
+    return storage
+
+def test_pages_cover_every_message_once():
+    """Paging sessions and messages with small pages exports each message exactly once, in session order"""
+    messages = list(export_messages(make_storage(), ExportFilter(), page_size=2))
+    assert len(messages) == 21
+    assert len({message.message_id for message in messages}) == 21
+    session = [message.message_id for message in messages if message.session_id == 'session-1']
+    assert session == [f'm-1-{i}' for i in range(7)]
+
+def test_facet_and_time_filters():
+    """Topic and inclusive time bounds are applied together"""
+    export_filter = ExportFilter(since=START + timedelta(minutes=2), until=START + timedelta(minutes=5),
+                                 topic='complaint')
+    messages = list(export_messages(make_storage(sessions=1), export_filter, page_size=2))
+    assert [message.message_id for message in messages] == ['m-0-3', 'm-0-5']
+
+def test_gzip_output_reads_back():
+    """Gzipped output is one valid gzip stream of NDJSON lines"""
+    output = io.BytesIO()
+    assert write_export(export_messages(make_storage(), ExportFilter()), output, True) == 21
+    lines = gzip.decompress(output.getvalue()).decode('utf-8').splitlines()
+    assert len(lines) == 21
+    assert ChatMessage(**json.loads(lines[0])).content.startswith('message 0')
+
+def test_async_chunks_match_sync_export(monkeypatch):
+    """The /export stream yields the same bytes as the CLI, split into chunks"""
+    monkeypatch.setattr(bulk_export, 'EXPORT_CHUNK_BYTES', 256)
+    storage = make_storage()
+    expected = io.BytesIO()
+    write_export(export_messages(storage, ExportFilter()), expected, False)
+    
+    async def collect():
+        messages = export_messages_async(AsyncMemoryClient(storage), ExportFilter(), page_size=2)
+        return [chunk async for chunk in ndjson_chunks(messages, False)]
+    
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    assert b''.join(chunks) == expected.getvalue()
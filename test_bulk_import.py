@@ -0,0 +1,139 @@
+"""
+Tests for bulk import and export (bulk_import.py, bulk_export.py) on every storage backend
+"""
+
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from memory_client import MemoryClient
+from sqlite_client import SQLiteClient
+from bulk_import import Checkpoint, run_import
+from bulk_export import ExportFilter, export_messages, write_export
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def fake_redis(client_class):
+    """A Redis-backed client on its own fake server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = client_class()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+def sqlite_backend(tmp_path):
+    """SQLiteClient on a new database file"""
+    return SQLiteClient(tempfile.mkdtemp(dir=tmp_path) + '/chat.db')
+
+def redis_backend(tmp_path):
+    """RedisClient on a fake server"""
+    from redis_client import RedisClient
+    return fake_redis(RedisClient)
+
+def streams_backend(tmp_path):
+    """StreamRedisClient on a fake server"""
+    from redis_stream_client import StreamRedisClient
+    return fake_redis(StreamRedisClient)
+
+def sharded_backend(tmp_path):
+    """ShardedRedisClient over three fake servers"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from sharded_redis_client import ShardedRedisClient
+    client = ShardedRedisClient("shard-a:6379,shard-b:6379,shard-c:6379")
+    for node in client.clients.values():
+        node.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+BACKENDS = {
+    'memory': lambda tmp_path: MemoryClient(),
+    'sqlite': sqlite_backend,
+    'redis': redis_backend,
+    'streams': streams_backend,
+    'sharded': sharded_backend,
+}
+
+@pytest.fixture(params=sorted(BACKENDS))
+def make_backend(request, tmp_path):
+    """Factory for fresh clients of one backend"""
+    return lambda: BACKENDS[request.param](tmp_path)
+
+def write_dump(path, sessions=4, per_session=5):
+    """A JSONL dump with uuid-style ids, each session in chronological order"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for s in range(sessions):
+            for i in range(per_session):
+                f.write(json.dumps({
+                    'session_id': f'session-{s}',
+                    'role': 'user' if i % 2 == 0 else 'assistant',
+                    'content': f'message {i} of session {s}',
+                    'timestamp': (START + timedelta(minutes=10 * i + s)).isoformat(),
+                    'message_id': f'uuid-{s}-{i}',
+                    'sentiment': 'neutral',
+                    'topic': 'question'
+                }) + "\n")
+    return str(path)
+
+def import_file(storage, path, batch_size=3):
+    """Import a file from its start and return (stored, skipped, failed)"""
+    progress = run_import(path, storage, 'jsonl', batch_size, Checkpoint(f"{path}.checkpoint"), False, None)
+    state = progress.as_dict()
+    return state['stored'], state['skipped'], state['failed']
+
+def export_file(storage, path):
+    """Export everything from a backend to an NDJSON file; return how many messages were written"""
+    with open(path, 'wb') as f:
+        return write_export(export_messages(storage, ExportFilter(), page_size=2), f, False)
+
+def contents(storage):
+    """Every stored message's (session, content), sorted"""
+    return sorted((m.session_id, m.content) for m in export_messages(storage, ExportFilter()))
+
+def test_reimport_is_idempotent(make_backend, tmp_path):
+    """Importing the same dump twice stores every message once"""
+    storage = make_backend()
+    dump = write_dump(tmp_path / 'dump.jsonl')
+    assert import_file(storage, dump) == (20, 0, 0)
+    assert import_file(storage, dump, batch_size=7) == (0, 20, 0)
+    assert storage.get_overview_stats()['total_messages'] == 20
+    assert len(storage.get_session_messages('session-0')) == 5
+
+def test_export_reimport_round_trip(make_backend, tmp_path):
+    """An export imports into an empty backend unchanged, and back into its source as a no-op"""
+    source = make_backend()
+    import_file(source, write_dump(tmp_path / 'dump.jsonl'))
+    exported = str(tmp_path / 'export.ndjson')
+    assert export_file(source, exported) == 20
+    
+    assert import_file(source, exported) == (0, 20, 0)
+    target = make_backend()
+    assert import_file(target, exported) == (20, 0, 0)
+    assert contents(target) == contents(source)
+
+def test_export_time_range(tmp_path):
+    """since and until are inclusive and applied per session"""
+    storage = MemoryClient()
+    import_file(storage, write_dump(tmp_path / 'dump.jsonl'))
+    export_filter = ExportFilter(since=START + timedelta(minutes=10), until=START + timedelta(minutes=21))
+    messages = list(export_messages(storage, export_filter, page_size=2))
+    assert sorted(m.message_id for m in messages) == [
+        'uuid-0-1', 'uuid-0-2', 'uuid-1-1', 'uuid-1-2', 'uuid-2-1', 'uuid-3-1'
+    ]
+
+def test_resume_from_checkpoint(tmp_path):
+    """A resumed import starts after the last committed record"""
+    dump = write_dump(tmp_path / 'dump.jsonl')
+    checkpoint = Checkpoint(str(tmp_path / 'dump.checkpoint'))
+    checkpoint.save(str(tmp_path / 'dump.jsonl'), 8)
+    storage = MemoryClient()
+    progress = run_import(dump, storage, 'jsonl', 5, checkpoint, True, None)
+    assert progress.as_dict()['stored'] == 12
+    assert checkpoint.load(str(tmp_path / 'dump.jsonl')) == 20
+
+def test_invalid_records_are_counted(tmp_path):
+    """A malformed line fails on its own without stopping the import"""
+    dump = write_dump(tmp_path / 'dump.jsonl', sessions=1, per_session=2)
+    with open(dump, 'a', encoding='utf-8') as f:
+        f.write('{"session_id": "session-0", "role": "robot", "content": "x"}\n')
+        f.write('not json\n')
+    assert import_file(MemoryClient(), dump) == (2, 0, 2)
@@ -0,0 +1,113 @@
+"""
+Tests for caching model results by normalized-text hash (inference_cache.py)
+"""
+
+import pytest
+
+from models import SentimentAnalysisResponse
+from inference_cache import InferenceCache, normalize_text
+
+class FakeModel:
+    """Sentiment model stand-in that records every batch it computes"""
+    
+    def __init__(self):
+        """Start with no calls"""
+        self.calls = []
+    
+    def __call__(self, texts):
+        """'negative' for texts mentioning refunds, otherwise 'positive'"""
+        self.calls.append(list(texts))
+        return [
+            SentimentAnalysisResponse(text=text, confidence=0.9,
+                                      sentiment='negative' if 'refund' in text else 'positive')
+            for text in texts
+        ]
+
+def make_cache(name='sentiment-test', model_key='model-a', max_entries=100):
+    """In-process cache without the Redis tier"""
+    return InferenceCache(name, model_key, SentimentAnalysisResponse, max_entries=max_entries, use_redis=False)
+
+def test_normalize_text():
+    """Whitespace and Unicode composition differences share an entry; case does not"""
+    assert normalize_text('  I want\n a  refund ') == 'I want a refund'
+    assert normalize_text('cafe\u0301') == 'caf\u00e9'
+    cache = make_cache()
+    assert cache.key('A refund') == cache.key(' A  refund')
+    assert cache.key('A refund') != cache.key('a refund')
+
+def test_computes_each_missing_text_once():
+    """Only uncached texts are computed, in one batch with duplicates removed"""
+    model = FakeModel()
+    cache = make_cache()
+    first = cache.lookup(['refund please', 'thanks', 'refund  please'], model)
+    assert model.calls == [['refund please', 'thanks']]
+    assert [result.text for result in first] == ['refund please', 'thanks', 'refund  please']
+    assert [result.sentiment.value for result in first] == ['negative', 'positive', 'negative']
+    
+    second = cache.lookup(['thanks', 'great'], model)
+    assert model.calls[-1] == ['great']
+    assert second[0].sentiment.value == 'positive'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 3)
+
+def test_results_are_copies():
+    """Changing a returned result does not change the cached one"""
+    cache = make_cache()
+    model = FakeModel()
+    cache.lookup(['thanks'], model)[0].confidence = 0.1
+    assert cache.lookup(['thanks'], model)[0].confidence == 0.9
+
+def test_model_key_separates_entries():
+    """Caches for different models never share results"""
+    model = FakeModel()
+    make_cache(model_key='model-a').lookup(['thanks'], model)
+    make_cache(model_key='model-b').lookup(['thanks'], model)
+    assert len(model.calls) == 2
+
+def test_lru_eviction_and_disabled_cache():
+    """The least recently used entry is evicted first; a zero-size cache always computes"""
+    model = FakeModel()
+    cache = make_cache(max_entries=2)
+    cache.lookup(['a'], model)
+    cache.lookup(['b'], model)
+    cache.lookup(['a'], model)
+    cache.lookup(['c'], model)
+    cache.lookup(['a', 'b'], model)
+    assert model.calls[-1] == ['b']
+    
+    disabled = make_cache(max_entries=0)
+    disabled.lookup(['a'], model)
+    disabled.lookup(['a'], model)
+    assert model.calls[-2:] == [['a'], ['a']]
+
+def test_errors_are_not_cached():
+    """A failing computation propagates and the text is computed again next time"""
+    cache = make_cache()
+    
+    def broken(texts):
+        raise RuntimeError("model failed")
+    
+    with pytest.raises(RuntimeError):
+        cache.lookup(['thanks'], broken)
+    model = FakeModel()
+    cache.lookup(['thanks'], model)
+    assert model.calls == [['thanks']]
+
+def test_redis_tier_shared_between_workers():
+    """A result computed by one worker is read from Redis by another"""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    workers = []
+    for _ in range(2):
+        cache = InferenceCache('sentiment-shared', 'model-a', SentimentAnalysisResponse, max_entries=10,
+                               use_redis=True, ttl=60)
+        cache.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        workers.append(cache)
+    
+    model = FakeModel()
+    workers[0].lookup(['refund now'], model)
+    result = workers[1].lookup(['refund now'], model)
+    assert model.calls == [['refund now']]
+    assert result[0].sentiment.value == 'negative'
+    assert workers[1].stats()['redis_hits'] == 1
+    assert 0 < workers[1].redis.ttl(workers[1].key('refund now')) <= 60
@@ -0,0 +1,79 @@
+"""
+Tests for the dedicated model inference pool (inference_pool.py)
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference_pool import InferencePool, ModelMethod
+
+class Doubler:
+    """Stand-in model with a batch method"""
+    
+    def double(self, items):
+        """Each item doubled"""
+        return [item * 2 for item in items]
+
+# Module-level instance, as ModelMethod requires
+DOUBLER = Doubler()
+
+def test_unknown_kind():
+    """Only thread and process pools exist"""
+    with pytest.raises(ValueError):
+        InferencePool('gpu')
+
+def test_model_method_resolves_global():
+    """A ModelMethod calls the module-level instance it names"""
+    method = ModelMethod(DOUBLER, 'double')
+    assert repr(method) == f"{__name__}.DOUBLER.double"
+    assert method([1, 2]) == [2, 4]
+
+def test_run_returns_result():
+    """Calls run on the pool and are counted"""
+    pool = InferencePool('thread', workers=2, timeout=5)
+    assert asyncio.run(pool.run(DOUBLER.double, [3])) == [6]
+    stats = pool.stats()
+    assert (stats['submitted'], stats['completed'], stats['in_flight']) == (1, 1, 0)
+    pool.shutdown()
+
+def test_timeout_and_dropped_queued_call():
+    """A caller stops waiting at the timeout, and a call still queued behind it never runs"""
+    pool = InferencePool('thread', workers=1, timeout=0.1)
+    release = threading.Event()
+    ran = []
+    
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(release.wait, 5)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(ran.append, 'queued')
+    
+    asyncio.run(main())
+    release.set()
+    deadline = time.monotonic() + 5
+    while pool.stats()['in_flight'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ran == []
+    stats = pool.stats()
+    assert stats['timeouts'] == 2
+    assert (stats['in_flight'], stats['completed']) == (0, 1)
+    pool.shutdown()
+
+def test_errors_propagate():
+    """Exceptions raised by the model reach the caller and count as failed"""
+    pool = InferencePool('thread', workers=1, timeout=5)
+    with pytest.raises(TypeError):
+        asyncio.run(pool.run(DOUBLER.double, None))
+    assert pool.stats()['failed'] == 1
+    pool.shutdown()
+
+def test_process_pool_runs_model_method():
+    """A process pool loads the model by reference in its worker"""
+    pool = InferencePool('process', workers=1, timeout=60)
+    try:
+        assert asyncio.run(pool.run(ModelMethod(DOUBLER, 'double'), ['a'])) == ['aa']
+    finally:
+        pool.shutdown()
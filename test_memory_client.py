@@ -0,0 +1,86 @@
+"""
+Tests for bounded in-memory storage and idle-session retention (memory_client.py and the Redis sweep)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ChatMessage
+from memory_client import MemoryClient
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_messages(session_id, count=2, content='refund'):
+    """`count` messages of a session, one minute apart"""
+    return [
+        ChatMessage(session_id=session_id, role='user', content=f'{content} {i}', topic='complaint',
+                    timestamp=START + timedelta(minutes=i), message_id=f'{session_id}-m{i}')
+        for i in range(count)
+    ]
+
+def bounded(**limits):
+    """MemoryClient with only the given limits set"""
+    values = {'max_messages': 0, 'max_bytes': 0, 'max_sessions': 0, 'session_ttl': 0}
+    values.update(limits)
+    return MemoryClient(**values, persist_dir='')
+
+def test_max_sessions_evicts_least_recently_updated():
+    """The session updated longest ago goes first, with its stats and index entries"""
+    client = bounded(max_sessions=2)
+    for session_id in ('a', 'b'):
+        client.store_messages(make_messages(session_id))
+    client.store_message(make_messages('a', 3)[2])
+    client.store_messages(make_messages('c'))
+    
+    assert client.list_sessions() == ['c', 'a']
+    assert client.get_session_messages('b') == []
+    assert client.get_overview_stats()['total_messages'] == 5
+    assert {hit['session_id'] for hit in client.search_messages('refund')['results']} == {'a', 'c'}
+    assert client.query_messages(topic='complaint')['total'] == 5
+    assert client.memory_usage()['evicted_sessions'] == 1
+
+def test_max_messages_never_evicts_current_session():
+    """A single session larger than the cap is kept rather than evicting itself"""
+    client = bounded(max_messages=3)
+    client.store_messages(make_messages('a', 2))
+    client.store_messages(make_messages('b', 5))
+    assert client.list_sessions() == ['b']
+    assert len(client.get_session_messages('b')) == 5
+
+def test_max_bytes():
+    """Byte accounting follows stores and evictions"""
+    client = bounded(max_bytes=1)
+    client.store_messages(make_messages('a'))
+    client.store_messages(make_messages('b'))
+    usage = client.memory_usage()
+    assert usage['sessions'] == 1
+    assert usage['approx_bytes'] > 0
+
+def test_idle_sessions_expire():
+    """Sessions not updated within the TTL disappear from every read"""
+    client = bounded(session_ttl=60)
+    client.store_messages(make_messages('old'))
+    client.store_messages(make_messages('new'))
+    client.session_metadata['old']['updated_at'] = datetime.now() - timedelta(seconds=120)
+    
+    assert client.list_sessions() == ['new']
+    assert client.get_overview_stats()['total_sessions'] == 1
+    assert client.memory_usage()['expired_sessions'] == 1
+
+def test_redis_sweep_drops_whole_sessions():
+    """Redis keys carry no TTL; the sweep removes idle sessions with their indexes and stats"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_client import RedisClient, SESSION_INDEX_KEY
+    client = RedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    client.session_ttl = 60
+    client.store_messages(make_messages('old'))
+    client.store_messages(make_messages('new'))
+    assert all(client.redis_client.ttl(key) == -1 for key in client.redis_client.keys('*'))
+    
+    client.redis_client.zadd(SESSION_INDEX_KEY, {'old': datetime.now().timestamp() - 120})
+    assert client.list_sessions() == ['new']
+    assert client.redis_client.keys('*:old*') == []
+    assert client.get_overview_stats()['total_messages'] == 2
+    assert {hit['session_id'] for hit in client.search_messages('refund')['results']} == {'new'}
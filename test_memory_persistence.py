@@ -0,0 +1,97 @@
+"""
+Tests for the MemoryClient append-only log and snapshots (memory_persistence.py)
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from models import ChatMessage
+from memory_client import MemoryClient
+from memory_persistence import OP_STORE, SEGMENT_SUFFIX, SNAPSHOT_SUFFIX, frame, iter_frames
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_message(i, session_id='s1'):
+    """Message number `i`, one minute after the previous one"""
+    return ChatMessage(session_id=session_id, role='user', content=f'hello {i}',
+                       timestamp=START + timedelta(minutes=i), message_id=f'm{i}')
+
+def open_client(directory, snapshot_every=0):
+    """MemoryClient without eviction limits, persisted to `directory`"""
+    return MemoryClient(0, 0, 0, 0, str(directory), snapshot_every=snapshot_every)
+
+def files(directory, suffix):
+    """Paths in `directory` ending with `suffix`, in order"""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(suffix))
+
+def test_restart_restores_messages(tmp_path):
+    """A reopened client serves the messages and stats written before close"""
+    client = open_client(tmp_path)
+    for i in range(5):
+        client.store_message(make_message(i, session_id=f's{i % 2}'))
+    client.delete_session('s1')
+    client.close()
+    
+    reopened = open_client(tmp_path)
+    assert [m.message_id for m in reopened.get_session_messages('s0')] == ['m0', 'm2', 'm4']
+    assert reopened.get_session_messages('s1') == []
+    assert reopened.get_overview_stats()['total_messages'] == 3
+    reopened.close()
+
+def test_truncated_segment_recovery(tmp_path):
+    """A torn final record is dropped and later appends survive the next restart"""
+    client = open_client(tmp_path)
+    for i in range(3):
+        client.store_message(make_message(i))
+    client.close()
+    
+    segment = files(tmp_path, SEGMENT_SUFFIX)[-1]
+    with open(segment, 'r+b') as f:
+        f.truncate(os.path.getsize(segment) - 5)
+    
+    recovered = open_client(tmp_path)
+    assert [m.message_id for m in recovered.get_session_messages('s1')] == ['m0', 'm1']
+    recovered.store_message(make_message(3))
+    recovered.close()
+    
+    reopened = open_client(tmp_path)
+    assert [m.message_id for m in reopened.get_session_messages('s1')] == ['m0', 'm1', 'm3']
+    reopened.close()
+
+def test_corrupt_record_stops_replay(tmp_path):
+    """Replay stops at the first record whose checksum does not match"""
+    client = open_client(tmp_path)
+    for i in range(3):
+        client.store_message(make_message(i))
+    client.close()
+    
+    segment = files(tmp_path, SEGMENT_SUFFIX)[-1]
+    with open(segment, 'r+b') as f:
+        f.seek(-3, os.SEEK_END)
+        f.write(b'\xff\xff\xff')
+    
+    recovered = open_client(tmp_path)
+    assert [m.message_id for m in recovered.get_session_messages('s1')] == ['m0', 'm1']
+    recovered.close()
+
+def test_snapshot_then_tail(tmp_path):
+    """Recovery loads the snapshot and replays only the records written after it"""
+    client = open_client(tmp_path)
+    for i in range(4):
+        client.store_message(make_message(i))
+    assert client.snapshot()
+    client.store_message(make_message(4))
+    client.close()
+    
+    assert len(files(tmp_path, SNAPSHOT_SUFFIX)) == 1
+    reopened = open_client(tmp_path)
+    assert reopened.recovery['snapshot_records'] > 0
+    assert reopened.recovery['log_records'] == 1
+    assert [m.message_id for m in reopened.get_session_messages('s1')] == ['m0', 'm1', 'm2', 'm3', 'm4']
+    reopened.close()
+
+def test_iter_frames_stops_at_partial_record():
+    """Only complete frames are yielded from a buffer"""
+    buffer = frame(OP_STORE, b'first') + frame(OP_STORE, b'second')
+    records = list(iter_frames(buffer[:-2]))
+    assert [bytes(payload) for _, payload, _ in records] == [b'first']
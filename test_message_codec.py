@@ -0,0 +1,78 @@
+"""
+Tests for the versioned message codecs in message_codec.py
+"""
+
+import json
+import struct
+from datetime import datetime, timezone
+
+import pytest
+
+from models import ChatMessage
+from message_codec import CODECS, BINARY_V1, decode_message, encode_message, get_codec
+
+def make_message(**fields):
+    """Build a fully populated message, overriding any given fields"""
+    values = {
+        'session_id': 'session-é',
+        'role': 'user',
+        'content': 'Where is my refund? 🙂',
+        'timestamp': datetime(2026, 3, 1, 12, 30, 15, 123456),
+        'message_id': 'msg-1',
+        'sentiment': 'negative',
+        'sentiment_score': 0.7,
+        'topic': 'complaint'
+    }
+    values.update(fields)
+    return ChatMessage(**values)
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+@pytest.mark.parametrize("message", [
+    make_message(),
+    make_message(timestamp=datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)),
+    make_message(message_id=None, sentiment=None, sentiment_score=None, topic=None, content=''),
+    make_message(role='assistant', sentiment_score=-0.123456789012345),
+])
+def test_round_trip(name, message):
+    """Every codec decodes back to the message it encoded"""
+    payload = encode_message(message, CODECS[name])
+    assert decode_message(payload) == message
+
+def test_binary_matches_json():
+    """Binary and JSON payloads decode to identical messages"""
+    message = make_message()
+    binary = decode_message(CODECS['binary'].encode(message))
+    legacy = decode_message(CODECS['json'].encode(message))
+    assert binary == legacy
+    assert binary.sentiment_score == 0.7
+
+def test_binary_is_smaller():
+    """Binary payloads are smaller than the JSON ones they replace"""
+    message = make_message()
+    assert len(CODECS['binary'].encode(message)) < len(CODECS['json'].encode(message))
+
+def test_legacy_json_string():
+    """Payloads stored before the codec existed (JSON text) still decode"""
+    message = make_message()
+    stored = json.dumps(message.model_dump(), default=str)
+    assert decode_message(stored) == message
+
+def test_binary_v1_score_rounded():
+    """v1 payloads with a float32 score decode to the value that was stored"""
+    payload = CODECS['binary'].encode(make_message())
+    v2_header = struct.Struct('<BBBBBqd')
+    fields = v2_header.unpack_from(payload, 0)
+    v1 = struct.pack('<BBBBBqf', BINARY_V1, *fields[1:]) + payload[v2_header.size:]
+    assert decode_message(v1) == make_message()
+
+def test_unknown_version_rejected():
+    """An unknown version byte is an error, not garbage fields"""
+    payload = bytearray(CODECS['binary'].encode(make_message()))
+    payload[0] = 0xEE
+    with pytest.raises(ValueError):
+        decode_message(bytes(payload))
+
+def test_unknown_codec_name():
+    """MESSAGE_CODEC must name a registered codec"""
+    with pytest.raises(ValueError):
+        get_codec('msgpack')
@@ -0,0 +1,111 @@
+"""
+Tests for coalescing concurrent inference requests (micro_batcher.py)
+"""
+
+import asyncio
+
+import pytest
+
+from inference_pool import InferencePool
+from micro_batcher import Histogram, MicroBatcher
+
+def run(coroutine):
+    """Run a coroutine on a fresh event loop"""
+    return asyncio.run(coroutine)
+
+class Recorder:
+    """Batch function that upper-cases items and remembers every batch it got"""
+    
+    def __init__(self, fail_on=None):
+        """Fail every batch containing `fail_on`"""
+        self.batches = []
+        self.fail_on = fail_on
+    
+    def __call__(self, items):
+        """Upper-cased items, in order"""
+        self.batches.append(list(items))
+        if self.fail_on in items:
+            raise RuntimeError("model failed")
+        return [item.upper() for item in items]
+
+def test_histogram_buckets():
+    """Values land in the first bucket whose bound they do not exceed"""
+    histogram = Histogram((1, 4))
+    for value in (0, 1, 3, 9):
+        histogram.observe(value)
+    assert histogram.as_dict() == {'buckets': {'<=1': 2, '<=4': 1, '>4': 1}, 'count': 4, 'mean': 3.25}
+
+def test_concurrent_requests_share_batches():
+    """Concurrent submits are computed in batches of at most max_batch_size, each getting its own result"""
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=4, max_wait_ms=50)
+    
+    async def main():
+        results = await asyncio.gather(*(batcher.submit(f'text {i}') for i in range(10)))
+        await batcher.close()
+        return results
+    
+    assert run(main()) == [f'TEXT {i}' for i in range(10)]
+    assert [len(batch) for batch in recorder.batches] == [4, 4, 2]
+    stats = batcher.stats()
+    assert (stats['batches'], stats['requests']) == (3, 10)
+
+def test_failed_batch_fails_its_requests_only():
+    """A failing batch raises in each of its callers and the batcher keeps serving"""
+    recorder = Recorder(fail_on='bad')
+    batcher = MicroBatcher(recorder, max_batch_size=2, max_wait_ms=50)
+    
+    async def main():
+        results = await asyncio.gather(batcher.submit('bad'), batcher.submit('x'), return_exceptions=True)
+        later = await batcher.submit('ok')
+        await batcher.close()
+        return results, later
+    
+    results, later = run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert later == 'OK'
+    assert batcher.stats()['failed_batches'] == 1
+
+def test_cancelled_request_is_not_computed():
+    """A request whose caller went away before its batch started is dropped"""
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=8, max_wait_ms=50)
+    
+    async def main():
+        gone = asyncio.ensure_future(batcher.submit('gone'))
+        kept = asyncio.ensure_future(batcher.submit('kept'))
+        await asyncio.sleep(0)
+        gone.cancel()
+        result = await kept
+        await batcher.close()
+        return result
+    
+    assert run(main()) == 'KEPT'
+    assert recorder.batches == [['kept']]
+
+def test_runs_on_inference_pool():
+    """With a pool, batches run on it and show in its counters"""
+    pool = InferencePool('thread', workers=1, timeout=5)
+    batcher = MicroBatcher(Recorder(), max_batch_size=4, max_wait_ms=10, pool=pool)
+    
+    async def main():
+        results = await asyncio.gather(*(batcher.submit(text) for text in 'abc'))
+        await batcher.close()
+        return results
+    
+    assert run(main()) == ['A', 'B', 'C']
+    assert pool.stats()['completed'] == 1
+    pool.shutdown()
+
+def test_close_fails_pending_requests():
+    """Requests still queued when the batcher closes get an error instead of hanging"""
+    batcher = MicroBatcher(Recorder(), max_batch_size=8, max_wait_ms=10000)
+    
+    async def main():
+        pending = asyncio.ensure_future(batcher.submit('late'))
+        await asyncio.sleep(0)
+        await batcher.close()
+        with pytest.raises(RuntimeError):
+            await pending
+    
+    run(main())
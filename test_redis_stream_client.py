@@ -0,0 +1,113 @@
+"""
+Tests for the Redis Streams session layout (redis_stream_client.py, migrate_to_streams.py)
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from models import ChatMessage
+from redis_client import RedisClient
+from redis_stream_client import AsyncStreamRedisClient, StreamRedisClient, stream_ids_key, stream_key
+from migrate_to_streams import migrate_session
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_message(i, prefix='uuid', **fields):
+    """Message number `i` with an id from another backend, one second after the previous one"""
+    values = {
+        'session_id': 's1',
+        'role': 'user',
+        'content': f'refund request {i}',
+        'timestamp': START + timedelta(seconds=i),
+        'message_id': f'{prefix}-{i}'
+    }
+    values.update(fields)
+    return ChatMessage(**values)
+
+@pytest.fixture
+def server():
+    """One fake Redis server per test"""
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def client(server):
+    """StreamRedisClient on the fake server, without a length cap"""
+    client = StreamRedisClient()
+    client.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    client.stream_maxlen = 0
+    return client
+
+def test_reimport_keeps_original_ids(client):
+    """Storing an export again, by original or by stream id, adds nothing"""
+    dump = [make_message(i) for i in range(4)]
+    assert client.store_messages(dump) == 4
+    assert client.store_messages([make_message(i) for i in range(4)]) == 0
+    
+    stored = client.get_session_messages('s1')
+    assert client.store_messages(stored) == 0
+    assert client.redis_client.xlen(stream_key('s1')) == 4
+    assert sorted(client.redis_client.hkeys(stream_ids_key('s1'))) == [f'uuid-{i}' for i in range(4)]
+    assert client.get_overview_stats()['total_messages'] == 4
+
+def test_stream_ids_follow_timestamps(client):
+    """Stream ids are derived from message timestamps and never precede them"""
+    client.store_messages([make_message(2), make_message(0), make_message(1)])
+    for message in client.get_session_messages('s1'):
+        millis = int(message.message_id.split('-')[0])
+        assert millis >= int(message.timestamp.timestamp() * 1000)
+
+def test_cap_counts_only_kept_messages(client):
+    """STREAM_MAXLEN keeps the newest entries and the count and indexes match what is kept"""
+    client.store_messages([make_message(i) for i in range(4)])
+    client.stream_maxlen = 2
+    batch = [make_message(i, prefix='new', content=f'new message {i}') for i in range(10, 13)]
+    
+    assert client.store_messages(batch) == 2
+    assert client.redis_client.xlen(stream_key('s1')) == 2
+    assert sorted(client.redis_client.hkeys(stream_ids_key('s1'))) == ['new-11', 'new-12']
+    assert client.search_messages('refund')['total'] == 0
+    assert client.get_session_stats('s1')['total_messages'] == 2
+    assert client.get_overview_stats()['total_messages'] == 2
+
+def test_since_ts_window(client):
+    """since_ts returns the messages strictly after it, naive or aware"""
+    client.store_messages([make_message(i) for i in range(4)])
+    since = START + timedelta(seconds=1)
+    for value in (since, since.astimezone(timezone.utc)):
+        messages = client.get_session_messages('s1', since_ts=value)
+        assert [message.content for message in messages] == ['refund request 2', 'refund request 3']
+
+def test_delete_session_removes_stream_keys(client):
+    """Deleting a session drops the stream and its id map"""
+    client.store_messages([make_message(i) for i in range(2)])
+    assert client.delete_session('s1')
+    assert client.redis_client.keys('stream*') == []
+
+def test_migrated_session_is_idempotent(server, client):
+    """Migrated messages keep their legacy ids, so importing the old export again adds nothing"""
+    legacy = RedisClient()
+    legacy.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    legacy.store_messages([make_message(i) for i in range(3)])
+    exported = legacy.get_session_messages('s1')
+    
+    assert migrate_session(legacy, client, 's1') == 3
+    assert migrate_session(legacy, client, 's1') is None
+    assert client.store_messages(exported) == 0
+    assert client.redis_client.xlen(stream_key('s1')) == 3
+
+def test_async_cap(server):
+    """The async client applies the same cap and count"""
+    client = AsyncStreamRedisClient()
+    client.redis_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    client.stream_maxlen = 3
+    
+    async def run():
+        stored = await client.store_messages([make_message(i) for i in range(5)])
+        again = await client.store_messages([make_message(i) for i in range(2, 5)])
+        return stored, again, await client.redis_client.xlen(stream_key('s1'))
+    
+    assert asyncio.run(run()) == (3, 0, 3)
@@ -0,0 +1,120 @@
+"""
+Tests for full-text search with BM25 ranking (search_index.py and the backends using it)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ChatMessage
+from memory_client import MemoryClient
+from search_index import InvertedIndex, posting_counts, posting_score, query_terms, tokenize
+
+START = datetime(2026, 1, 1, 9, 0)
+
+CORPUS = [
+    'refund refund please',
+    'I want a refund for my broken order',
+    'the order arrived late and the box was broken',
+    'thanks for the quick help',
+    'refund status',
+    'where is my order',
+]
+
+def corpus_messages(session_id='s1'):
+    """The corpus as messages d0..d5"""
+    return [
+        ChatMessage(session_id=session_id, role='user', content=content,
+                    timestamp=START + timedelta(minutes=i), message_id=f'd{i}')
+        for i, content in enumerate(CORPUS)
+    ]
+
+def build_index():
+    """InvertedIndex over the corpus"""
+    index = InvertedIndex()
+    for message in corpus_messages():
+        index.add(message.message_id, message.content)
+    return index
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    """Terms are lowercased runs of letters and digits without stopwords"""
+    assert tokenize("Where's my ORDER #42, please?") == ['where', 's', 'order', '42', 'please']
+    assert query_terms('refund Refund order') == ['refund', 'order']
+
+@pytest.mark.parametrize("tf, length", [(1, 1), (1, 500), (3, 7), (250, 100000)])
+def test_posting_score_round_trip(tf, length):
+    """A posting score unpacks to the counts it was built from"""
+    assert posting_counts(float(posting_score(tf, length))) == (tf, length)
+
+def test_posting_score_order():
+    """Higher term frequencies sort first, then shorter messages"""
+    assert posting_score(2, 100) > posting_score(1, 1)
+    assert posting_score(1, 3) > posting_score(1, 10)
+
+def test_bm25_prefers_frequent_and_short():
+    """Repeated terms and shorter messages rank higher; non-matches are left out"""
+    total, hits = build_index().search('refund')
+    assert total == 3
+    assert [doc_id for doc_id, _ in hits] == ['d0', 'd4', 'd1']
+
+def test_bm25_rare_terms_weigh_more():
+    """A message matching the rarer query term outranks one matching the common term"""
+    _, hits = build_index().search('order late')
+    assert hits[0][0] == 'd2'
+
+def test_pagination_and_removal():
+    """Pages continue the ranking and removed messages stop matching"""
+    index = build_index()
+    _, page = index.search('refund', offset=1, limit=1)
+    assert [doc_id for doc_id, _ in page] == ['d4']
+    
+    index.remove('d0', CORPUS[0])
+    total, hits = index.search('refund')
+    assert total == 2
+    assert 'd0' not in [doc_id for doc_id, _ in hits]
+
+def redis_backend():
+    """RedisClient on a fake server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_client import RedisClient
+    client = RedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+def sqlite_backend(tmp_path):
+    """SQLiteClient in a temporary directory"""
+    from sqlite_client import SQLiteClient
+    return SQLiteClient(str(tmp_path / 'chat.db'))
+
+@pytest.mark.parametrize("make_client", [
+    lambda tmp_path: MemoryClient(),
+    lambda tmp_path: redis_backend(),
+    sqlite_backend,
+], ids=['memory', 'redis', 'sqlite'])
+def test_backends_rank_alike(make_client, tmp_path):
+    """Every backend returns the same best matches for the corpus"""
+    client = make_client(tmp_path)
+    client.store_messages(corpus_messages())
+    result = client.search_messages('refund')
+    assert result['total'] == 3
+    assert [hit['message_id'] for hit in result['results']] == ['d0', 'd4', 'd1']
+    assert result['results'][0]['message'].content == CORPUS[0]
+
+def test_redis_scores_match_inverted_index():
+    """Redis computes the same BM25 scores as the in-process index"""
+    client = redis_backend()
+    client.store_messages(corpus_messages())
+    expected = dict(build_index().search('broken order')[1])
+    result = client.search_messages('broken order')
+    assert {hit['message_id']: hit['score'] for hit in result['results']} == pytest.approx(expected)
+
+def test_redis_delete_removes_postings():
+    """Deleting a session removes its messages from search"""
+    client = redis_backend()
+    client.store_messages(corpus_messages('s1'))
+    client.store_messages([
+        ChatMessage(session_id='s2', role='user', content='refund again', timestamp=START, message_id='e0')
+    ])
+    client.delete_session('s1')
+    result = client.search_messages('refund')
+    assert [hit['message_id'] for hit in result['results']] == ['e0']
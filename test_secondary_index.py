@@ -0,0 +1,103 @@
+"""
+Tests for the topic, sentiment and time-bucket indexes (secondary_index.py and the backends using it)
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import ChatMessage
+from memory_client import MemoryClient
+from sqlite_client import SQLiteClient
+from secondary_index import SecondaryIndex, bucket_start, overlaps, time_bounds, time_bucket
+
+# Two hours either side of a UTC midnight, every 30 minutes
+MIDNIGHT = datetime(2026, 3, 29, tzinfo=timezone.utc)
+TIMES = [MIDNIGHT + timedelta(minutes=30 * i) for i in range(-4, 5)]
+
+def make_messages():
+    """Messages m0..m8 at TIMES (stored naive, in local time), alternating topics"""
+    return [
+        ChatMessage(session_id=f's{i % 2}', role='user', content=f'message {i}',
+                    timestamp=ts.astimezone().replace(tzinfo=None), message_id=f'm{i}',
+                    topic='complaint' if i % 2 else 'question',
+                    sentiment='negative' if i % 3 == 0 else 'neutral')
+        for i, ts in enumerate(TIMES)
+    ]
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    """Run with a local time zone far from UTC that has a DST change"""
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_buckets_are_utc_days(local_tz):
+    """Naive local and aware timestamps of one instant land in the same UTC-day bucket"""
+    before = MIDNIGHT - timedelta(microseconds=1)
+    assert time_bucket(before) == '2026-03-28'
+    assert time_bucket(MIDNIGHT) == '2026-03-29'
+    assert time_bucket(MIDNIGHT.astimezone().replace(tzinfo=None)) == '2026-03-29'
+    assert bucket_start('2026-03-29') == MIDNIGHT.timestamp()
+
+def test_overlaps():
+    """A bucket overlaps a range that touches any instant of its day"""
+    low, high = time_bounds(MIDNIGHT - timedelta(seconds=1), MIDNIGHT - timedelta(seconds=1))
+    assert overlaps('2026-03-28', low, high)
+    assert not overlaps('2026-03-29', low, high)
+    assert overlaps('2026-03-29', *time_bounds(None, None))
+
+def test_in_process_index(local_tz):
+    """Facet and time filters intersect, newest first, and removal drops entries"""
+    index = SecondaryIndex()
+    messages = make_messages()
+    for message in messages:
+        index.add(message.message_id, message)
+    
+    total, ids = index.query({'topic': 'complaint'}, since=MIDNIGHT - timedelta(hours=1))
+    assert (total, ids) == (3, ['m7', 'm5', 'm3'])
+    total, ids = index.query({'topic': 'question', 'sentiment': 'negative'})
+    assert (total, ids) == (2, ['m6', 'm0'])
+    
+    index.remove('m7', messages[7])
+    assert index.query({'topic': 'complaint'}, limit=1) == (3, ['m5'])
+
+def redis_backend(tmp_path):
+    """RedisClient on a fake server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_client import RedisClient
+    client = RedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+def streams_backend(tmp_path):
+    """StreamRedisClient on a fake server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_stream_client import StreamRedisClient
+    client = StreamRedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+@pytest.mark.parametrize("make_client", [
+    lambda tmp_path: MemoryClient(),
+    lambda tmp_path: SQLiteClient(str(tmp_path / 'chat.db')),
+    redis_backend,
+    streams_backend,
+], ids=['memory', 'sqlite', 'redis', 'streams'])
+def test_backends_query_across_midnight(make_client, tmp_path, local_tz):
+    """Every backend answers a range spanning UTC midnight with aware bounds alike"""
+    client = make_client(tmp_path)
+    client.store_messages(make_messages())
+    
+    result = client.query_messages(topic='question', since=MIDNIGHT - timedelta(minutes=30),
+                                   until=MIDNIGHT + timedelta(hours=1))
+    assert result['total'] == 2
+    contents = [row['message'].content for row in result['results']]
+    assert contents == ['message 6', 'message 4']
+    
+    page = client.query_messages(sentiment='neutral', offset=1, limit=2)
+    assert page['total'] == 6
+    assert [row['message'].content for row in page['results']] == ['message 7', 'message 5']
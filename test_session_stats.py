@@ -0,0 +1,93 @@
+"""
+Tests for write-time session and overview stats counters (session_stats.py and the backends keeping them)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ChatMessage
+from memory_client import MemoryClient
+from sqlite_client import SQLiteClient
+from session_stats import counters_for_messages, signed_sentiment_score, stats_from_counters
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_messages(session_id='s1'):
+    """A short conversation with sentiments, scores and topics"""
+    rows = [
+        ('user', 'negative', -0.8, 'complaint'),
+        ('assistant', 'neutral', None, 'support_request'),
+        ('user', 'positive', 0.6, 'feedback'),
+        ('user', None, None, None),
+    ]
+    return [
+        ChatMessage(session_id=session_id, role=role, content=f'message {i}', sentiment=sentiment,
+                    sentiment_score=score, topic=topic, timestamp=START + timedelta(minutes=5 * i),
+                    message_id=f'{session_id}-m{i}')
+        for i, (role, sentiment, score, topic) in enumerate(rows)
+    ]
+
+def test_signed_sentiment_score():
+    """Positive maps to +confidence, negative to -confidence, neutral to 0"""
+    assert signed_sentiment_score('positive', 0.7) == 0.7
+    assert signed_sentiment_score('negative', 0.7) == -0.7
+    assert signed_sentiment_score('neutral', 0.7) == 0.0
+    assert signed_sentiment_score(None) is None
+
+def test_stats_from_counters():
+    """Counters built from messages give the session stats response"""
+    stats = stats_from_counters('s1', counters_for_messages(make_messages()))
+    assert stats['total_messages'] == 4
+    assert (stats['user_messages'], stats['assistant_messages']) == (3, 1)
+    assert stats['sentiment_distribution'] == {'negative': 1, 'neutral': 1, 'positive': 1}
+    assert stats['topic_distribution'] == {'complaint': 1, 'support_request': 1, 'feedback': 1}
+    assert stats['avg_sentiment'] == pytest.approx(-0.2 / 3)
+    assert stats['session_duration'] == 900
+    assert stats_from_counters('empty', {}) == {}
+
+def redis_backend(tmp_path):
+    """RedisClient on a fake server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_client import RedisClient
+    client = RedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+def streams_backend(tmp_path):
+    """StreamRedisClient on a fake server"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_stream_client import StreamRedisClient
+    client = StreamRedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return client
+
+@pytest.mark.parametrize("make_client", [
+    lambda tmp_path: MemoryClient(),
+    lambda tmp_path: SQLiteClient(str(tmp_path / 'chat.db')),
+    redis_backend,
+    streams_backend,
+], ids=['memory', 'sqlite', 'redis', 'streams'])
+def test_backends_keep_counters(make_client, tmp_path):
+    """Session and overview stats match the stored messages after writes, duplicates and deletes"""
+    client = make_client(tmp_path)
+    client.store_messages(make_messages('s1'))
+    client.store_messages(make_messages('s1'))
+    for message in make_messages('s2'):
+        client.store_message(message)
+    
+    expected = stats_from_counters('s1', counters_for_messages(make_messages('s1')))
+    stats = client.get_session_stats('s1')
+    for field in ('total_messages', 'user_messages', 'assistant_messages', 'sentiment_distribution',
+                  'topic_distribution', 'session_duration'):
+        assert stats[field] == expected[field]
+    assert stats['avg_sentiment'] == pytest.approx(expected['avg_sentiment'])
+    
+    overview = client.get_overview_stats()
+    assert (overview['total_sessions'], overview['total_messages']) == (2, 8)
+    assert overview['topic_distribution'] == {'complaint': 2, 'support_request': 2, 'feedback': 2}
+    
+    assert client.delete_session('s1')
+    overview = client.get_overview_stats()
+    assert (overview['total_sessions'], overview['total_messages']) == (1, 4)
+    assert overview['avg_sentiment'] == pytest.approx(expected['avg_sentiment'])
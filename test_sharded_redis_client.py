@@ -0,0 +1,112 @@
+"""
+Tests for consistent-hash sharding and shard rebalancing (sharded_redis_client.py, rebalance_shards.py)
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from models import ChatMessage
+from redis_client import RedisClient, SESSION_INDEX_KEY
+from redis_stream_client import StreamRedisClient
+from sharded_redis_client import HashRing, ShardedRedisClient, parse_shards
+from rebalance_shards import move_session
+
+START = datetime(2026, 1, 1, 9, 0)
+OLD_SHARDS = "shard-a:6379,shard-b:6379"
+NEW_SHARDS = "shard-a:6379,shard-b:6379,shard-c:6379"
+
+def make_messages(sessions=12, per_session=3):
+    """`per_session` messages in each of `sessions` sessions, later sessions holding later messages"""
+    return [
+        ChatMessage(session_id=f'session-{s}', role='user', content=f'refund {s} {i}',
+                    timestamp=START + timedelta(minutes=s, seconds=i), message_id=f'uuid-{s}-{i}',
+                    topic='complaint')
+        for s in range(sessions) for i in range(per_session)
+    ]
+
+def sharded(spec, servers, client_class=RedisClient):
+    """ShardedRedisClient whose shards are fake servers, one per shard name"""
+    client = ShardedRedisClient(spec, client_class)
+    for name, node in client.clients.items():
+        server = servers.setdefault(name, fakeredis.FakeServer())
+        node.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return client
+
+def test_parse_shards():
+    """Shard specs normalise to host:port/db names"""
+    assert parse_shards("localhost:6380/2, redis-b") == [
+        ('localhost:6380/2', 'localhost', 6380, 2),
+        ('redis-b:6379/0', 'redis-b', 6379, 0),
+    ]
+
+def test_ring_moves_only_keys_of_new_node():
+    """Adding a node moves keys only onto it, roughly 1/N of them"""
+    keys = [f'session-{i}' for i in range(3000)]
+    ring = HashRing(['a', 'b', 'c'])
+    before = {key: ring.node_for(key) for key in keys}
+    ring.add_node('d')
+    after = {key: ring.node_for(key) for key in keys}
+    
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(after[key] == 'd' for key in moved)
+    assert 0.15 < len(moved) / len(keys) < 0.35
+    assert min(Counter(after.values()).values()) > len(keys) / 8
+
+def test_sessions_live_on_their_owner():
+    """Each session is stored only on the shard the ring assigns it"""
+    servers = {}
+    client = sharded(NEW_SHARDS, servers)
+    assert client.store_messages(make_messages()) == 36
+    for name, node in client.clients.items():
+        for session_id in node.redis_client.zrange(SESSION_INDEX_KEY, 0, -1):
+            assert client.ring.node_for(session_id) == name
+    assert len(client.get_session_messages('session-5')) == 3
+    client.close()
+
+def test_cross_shard_reads_merge():
+    """Listing, overview, search and facet queries cover every shard"""
+    client = sharded(NEW_SHARDS, {})
+    messages = make_messages()
+    # Sessions are listed by last update, so write them one after another
+    for start in range(0, len(messages), 3):
+        client.store_messages(messages[start:start + 3])
+    assert client.list_sessions(limit=3) == ['session-11', 'session-10', 'session-9']
+    assert client.list_sessions(cursor=10) == ['session-1', 'session-0']
+    assert client.get_overview_stats()['total_sessions'] == 12
+    assert client.get_overview_stats()['total_messages'] == 36
+    assert client.search_messages('refund', limit=5)['total'] == 36
+    result = client.query_messages(topic='complaint', limit=2)
+    assert result['total'] == 36
+    assert [row['message_id'] for row in result['results']] == ['uuid-11-2', 'uuid-11-1']
+    client.close()
+
+@pytest.mark.parametrize("client_class", [RedisClient, StreamRedisClient], ids=['list', 'streams'])
+def test_rebalance_moves_sessions_with_their_stats(client_class):
+    """After moving every reassigned session the new ring serves all data and totals are unchanged"""
+    servers = {}
+    old = sharded(OLD_SHARDS, servers, client_class)
+    old.store_messages(make_messages())
+    before = old.get_overview_stats()
+    new = sharded(NEW_SHARDS, servers, client_class)
+    
+    moved = 0
+    for name, source in old.clients.items():
+        for session_id, score in source.redis_client.zrange(SESSION_INDEX_KEY, 0, -1, withscores=True):
+            target = new.ring.node_for(session_id)
+            if target != name:
+                move_session(source, new.clients[target], session_id, score)
+                moved += 1
+    
+    assert moved > 0
+    after = new.get_overview_stats()
+    assert (after['total_sessions'], after['total_messages']) == (before['total_sessions'], before['total_messages'])
+    assert all(len(new.get_session_messages(f'session-{s}')) == 3 for s in range(12))
+    assert new.search_messages('refund', limit=1)['total'] == 36
+    assert new.query_messages(topic='complaint')['total'] == 36
+    assert new.clients['shard-c:6379/0'].redis_client.zcard(SESSION_INDEX_KEY) == moved
+    old.close()
+    new.close()
@@ -0,0 +1,102 @@
+"""
+Tests for the SQLite storage backend (sqlite_client.py)
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import ChatMessage
+from sqlite_client import EXISTING_IDS_CHUNK, SQLiteClient
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_message(i, session_id='s1', **fields):
+    """Message number `i`, one minute after the previous one"""
+    values = {
+        'session_id': session_id,
+        'role': 'user' if i % 2 == 0 else 'assistant',
+        'content': f'hello {i}',
+        'timestamp': START + timedelta(minutes=i),
+        'message_id': f'{session_id}-m{i}'
+    }
+    values.update(fields)
+    return ChatMessage(**values)
+
+@pytest.fixture
+def client(tmp_path):
+    """A fresh database per test"""
+    client = SQLiteClient(str(tmp_path / 'chat.db'))
+    yield client
+    client.close()
+
+def ids(messages):
+    """Message ids in order"""
+    return [message.message_id for message in messages]
+
+def test_reimport_is_idempotent(client):
+    """Stored and in-batch duplicate ids are skipped and not counted"""
+    batch = [make_message(i) for i in range(4)] + [make_message(2)]
+    assert client.store_messages(batch) == 4
+    assert client.store_messages(batch) == 0
+    assert ids(client.get_session_messages('s1')) == ['s1-m0', 's1-m1', 's1-m2', 's1-m3']
+    assert client.get_overview_stats()['total_messages'] == 4
+    assert client.get_session_stats('s1')['total_messages'] == 4
+
+def test_large_batch_across_id_chunks(client):
+    """Duplicate detection works past one chunk of looked-up ids"""
+    count = EXISTING_IDS_CHUNK * 2 + 10
+    batch = [make_message(i) for i in range(count)]
+    assert client.store_messages(batch[:EXISTING_IDS_CHUNK + 3]) == EXISTING_IDS_CHUNK + 3
+    assert client.store_messages(batch) == count - EXISTING_IDS_CHUNK - 3
+    assert client.get_overview_stats()['total_messages'] == count
+
+def test_session_windows(client):
+    """Offset, tail, cursor and time windows all come back oldest first"""
+    client.store_messages([make_message(i) for i in range(6)])
+    assert ids(client.get_session_messages('s1', offset=1, limit=2)) == ['s1-m1', 's1-m2']
+    assert ids(client.get_session_messages('s1', offset=-2)) == ['s1-m4', 's1-m5']
+    assert ids(client.get_session_messages('s1', since_message_id='s1-m3')) == ['s1-m4', 's1-m5']
+    assert ids(client.get_session_messages('s1', since_ts=START + timedelta(minutes=3))) == ['s1-m4', 's1-m5']
+    assert client.get_session_messages('s1', since_message_id='missing') is None
+
+def test_since_ts_timezone_aware(client):
+    """An aware since_ts is compared by instant against naive stored times (exclusive)"""
+    client.store_messages([make_message(i) for i in range(3)])
+    since = START.astimezone(timezone.utc)
+    assert ids(client.get_session_messages('s1', since_ts=since)) == ['s1-m1', 's1-m2']
+
+def test_overview_rollup_matches_rebuild(client):
+    """The incremental rollup agrees with a full rescan after stores and deletes"""
+    client.store_messages([make_message(i, sentiment='positive', sentiment_score=0.5) for i in range(3)])
+    client.store_messages([make_message(i, session_id='s2', topic='complaint') for i in range(2)])
+    assert client.delete_session('s1')
+    
+    overview = client.get_overview_stats()
+    assert overview['total_sessions'] == 1
+    assert overview['total_messages'] == 2
+    assert overview['sentiment_distribution'] == {}
+    assert overview['topic_distribution'] == {'complaint': 2}
+    
+    client.rebuild_global_stats()
+    assert client.get_overview_stats() == overview
+
+def test_query_by_topic_and_time(client):
+    """Facet queries filter by topic within the time range, newest first"""
+    client.store_messages([
+        make_message(i, topic='complaint' if i % 2 else 'question') for i in range(6)
+    ])
+    result = client.query_messages(topic='complaint', since=START + timedelta(minutes=2))
+    assert result['total'] == 2
+    assert [row['message_id'] for row in result['results']] == ['s1-m5', 's1-m3']
+
+def test_search_ranks_matches(client):
+    """Full-text search returns every matching message, the best match first"""
+    client.store_messages([
+        make_message(0, content='refund refund please'),
+        make_message(1, content='refund my order and the shipping fee for my order'),
+        make_message(2, content='thanks for the help'),
+    ])
+    result = client.search_messages('refund')
+    assert result['total'] == 2
+    assert result['results'][0]['message_id'] == 's1-m0'
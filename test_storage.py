@@ -0,0 +1,121 @@
+"""
+Tests for the session cache in front of the storage backends (storage.py)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ChatMessage
+from sqlite_client import SQLiteClient
+from storage import CachedStorage, SessionCache, SessionCacheSubscriber
+
+START = datetime(2026, 1, 1, 9, 0)
+
+def make_message(i, session_id='s1'):
+    """Message number `i`, one minute after the previous one"""
+    return ChatMessage(session_id=session_id, role='user', content=f'hello {i}',
+                       timestamp=START + timedelta(minutes=i), message_id=f'{session_id}-m{i}')
+
+def ids(messages):
+    """Message numbers in order"""
+    return [message.message_id.rsplit('-', 1)[1] for message in messages]
+
+@pytest.fixture
+def backend(tmp_path):
+    """A SQLite backend shared by the cached wrapper and "other workers" in a test"""
+    client = SQLiteClient(str(tmp_path / 'chat.db'))
+    yield client
+    client.close()
+
+@pytest.fixture
+def storage(backend):
+    """CachedStorage with room for two sessions"""
+    return CachedStorage(backend, SessionCache(2))
+
+def test_miss_then_hit(storage):
+    """The first full read loads the session, the second is served from the cache"""
+    storage.store_messages([make_message(i) for i in range(3)])
+    assert ids(storage.get_session_messages('s1')) == ['m0', 'm1', 'm2']
+    assert ids(storage.get_session_messages('s1')) == ['m0', 'm1', 'm2']
+    stats = storage.memory_usage()['session_cache']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+def test_windowed_reads_bypass_cache(storage):
+    """Windowed reads go to the backend and leave the cache untouched"""
+    storage.store_messages([make_message(i) for i in range(3)])
+    assert ids(storage.get_session_messages('s1', offset=-1)) == ['m2']
+    assert storage.cache.stats()['sessions'] == 0
+
+def test_store_appends_to_cached_session(storage, backend):
+    """A message stored through the wrapper is appended without reloading"""
+    storage.store_messages([make_message(i) for i in range(2)])
+    storage.get_session_messages('s1')
+    storage.store_message(make_message(2))
+    assert storage.cache.stats()['appends'] == 1
+    assert ids(storage.get_session_messages('s1')) == ids(backend.get_session_messages('s1'))
+
+def test_out_of_order_store_invalidates(storage):
+    """A message older than the cached tail drops the entry so order is reloaded"""
+    storage.store_messages([make_message(i) for i in (0, 2)])
+    storage.get_session_messages('s1')
+    storage.store_message(make_message(1))
+    assert storage.cache.stats()['invalidations'] == 1
+    assert ids(storage.get_session_messages('s1')) == ['m0', 'm1', 'm2']
+
+def test_batch_store_and_delete_invalidate(storage):
+    """Batch stores and deletes drop the cached session"""
+    storage.store_messages([make_message(0)])
+    storage.get_session_messages('s1')
+    storage.store_messages([make_message(1)])
+    assert ids(storage.get_session_messages('s1')) == ['m0', 'm1']
+    assert storage.delete_session('s1')
+    assert storage.get_session_messages('s1') == []
+
+def test_read_during_write_not_cached(storage):
+    """A read that overlaps a store through this process is not cached"""
+    storage.store_messages([make_message(0)])
+    storage.cache.begin_write('s1')
+    storage.get_session_messages('s1')
+    assert storage.cache.stats()['sessions'] == 0
+    storage.cache.end_write('s1', None)
+
+def test_lru_eviction(storage):
+    """Only the most recently used sessions stay cached"""
+    for session_id in ('a', 'b', 'c'):
+        storage.store_messages([make_message(0, session_id)])
+        storage.get_session_messages(session_id)
+    assert list(storage.cache.sessions) == ['b', 'c']
+
+def test_remote_invalidation(storage, backend):
+    """Another worker's change is picked up once its invalidation arrives"""
+    storage.store_messages([make_message(0)])
+    storage.get_session_messages('s1')
+    backend.store_message(make_message(1))
+    assert ids(storage.get_session_messages('s1')) == ['m0']
+    
+    subscriber = SessionCacheSubscriber(storage.cache, [], 'channel', 'local')
+    subscriber._handle('local:store:s1')
+    assert ids(storage.get_session_messages('s1')) == ['m0']
+    subscriber._handle('remote:store:s1')
+    assert ids(storage.get_session_messages('s1')) == ['m0', 'm1']
+    assert storage.cache.stats()['remote_invalidations'] == 1
+
+def test_redis_writes_publish_invalidations():
+    """Redis stores and deletes announce the session on the invalidation channel"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_client import RedisClient
+    
+    client = RedisClient()
+    client.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    client.invalidation_channel = 'session_cache:invalidate'
+    client.invalidation_origin = 'worker1'
+    pubsub = client.redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(client.invalidation_channel)
+    
+    client.store_message(make_message(0))
+    client.delete_session('s1')
+    # get_message returns None for the (ignored) subscribe confirmation too
+    replies = [pubsub.get_message(timeout=0.1) for _ in range(4)]
+    published = [reply['data'] for reply in replies if reply is not None]
+    assert published == ['worker1:store:s1', 'worker1:delete:s1']